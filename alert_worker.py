@@ -1,18 +1,22 @@
 
 # alerts.py
 import time
-import sqlite3
-import datetime as dt
+import bisect
+import argparse
+import calendar
+
+import numpy as np
+
+import metrics
+from storage import is_postgres, open_storage
 
 DB = "reviews.db"
 
-FIND = """
-SELECT product_id, COUNT(*) AS c
-FROM reviews
-WHERE sentiment='negative' AND ts_utc BETWEEN ? AND ?
-GROUP BY product_id
-HAVING c >= 5;
-"""
+RULE = "neg>=5_in_10m"
+THRESHOLD = 5
+WINDOW_SEC = 600      # 10m detection window
+COOLDOWN_SEC = 600    # no repeat alert for a product within 10m of the last one
+ISO = "%Y-%m-%dT%H:%M:%SZ"
 
 INSERT = """
 INSERT OR IGNORE INTO alerts
@@ -20,41 +24,319 @@ INSERT OR IGNORE INTO alerts
 VALUES (?, 'neg>=5_in_10m', ?, ?, ?, ?);
 """
 
-# cooldown: suppress repeats if an alert for the same product was created in the last 10 minutes
-RECENT_ALERT_EXISTS = """
-SELECT 1
-FROM alerts
-WHERE product_id = ?
-  AND rule = 'neg>=5_in_10m'
-  AND created_at_utc >= ?
-LIMIT 1;
-"""
-
-def check_once(conn):
-    now = dt.datetime.utcnow()
-    start = now - dt.timedelta(minutes=10)
-    s = start.strftime("%Y-%m-%dT%H:%M:%SZ")
-    e = now.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-    rows = conn.execute(FIND, (s, e)).fetchall()
-    for product_id, cnt in rows:
-        # cooldown window: 10 minutes back from now
-        cooldown_start = (now - dt.timedelta(minutes=10)).strftime("%Y-%m-%dT%H:%M:%SZ")
-        recent = conn.execute(RECENT_ALERT_EXISTS, (product_id, cooldown_start)).fetchone()
-        if recent:
-            continue  # suppress duplicate alert within cooldown window
-
-        conn.execute(INSERT, (product_id, s, e, cnt, e))
+@metrics.ALERT_CYCLE.time(mode="periodic")
+def check_once(store, now=None):
+    """One pass of the rule on either backend: a single set-based statement (storage.py)."""
+    now = int(now or time.time())
+    s = time.strftime(ISO, time.gmtime(now - WINDOW_SEC))
+    e = time.strftime(ISO, time.gmtime(now))
+    # cooldown: suppress repeats if an alert for the same product was created in the last 10 minutes
+    fired = store.raise_alerts(RULE, THRESHOLD, now - WINDOW_SEC, now, now - COOLDOWN_SEC)
+    for product_id, cnt in fired:
         print(f"[ALERT] product={product_id} negatives={cnt} window=[{s},{e}]")
+    return len(fired)
+
+# ---------- streaming mode ----------
+# Same rule as check_once, evaluated as rows arrive: tail reviews by rowid and keep
+# the negative timestamps of the last 10 minutes per product in memory.
+TAIL = """
+SELECT id, product_id, sentiment, ts_epoch
+FROM reviews
+WHERE id > ?
+ORDER BY id
+LIMIT ?;
+"""
+
+WINDOW_NEGATIVES = """
+SELECT product_id, ts_epoch
+FROM reviews
+WHERE sentiment='negative' AND ts_epoch BETWEEN ? AND ?;
+"""
+
+LAST_ALERTS = """
+SELECT product_id, MAX(created_at_utc)
+FROM alerts
+WHERE rule = 'neg>=5_in_10m' AND created_at_utc >= ?
+GROUP BY product_id;
+"""
+
+def iso_to_epoch(s):
+    return calendar.timegm(time.strptime(s, ISO))
+
+class StreamAlerter:
+    """Sliding-window neg>=5_in_10m detector fed by an id watermark.
+
+    `poll()` reads only rows above the last id seen, so each new review costs
+    one append to its product's window; alerts fire on the poll after the row
+    that crosses the threshold.
+    """
+
+    def __init__(self, conn, tail_batch=5000):
+        self.conn = conn
+        self.tail_batch = tail_batch
+        self.last_id = 0
+        self.negs = {}        # product_id -> sorted ts_epoch of negatives in the window
+        self.last_alert = {}  # product_id -> epoch of the last alert (cooldown)
+        self.hot = set()      # products at/over threshold but held back by cooldown
+
+    def rebuild(self, now=None):
+        """Reset state from the last 10 minutes of reviews and alerts."""
+        now = int(now or time.time())
+        self.last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM reviews").fetchone()[0]
+        self.negs, self.last_alert, self.hot = {}, {}, set()
+        for product_id, ts in self.conn.execute(WINDOW_NEGATIVES, (now - WINDOW_SEC, now)):
+            self.negs.setdefault(product_id, []).append(ts)
+        for ts in self.negs.values():
+            ts.sort()
+        cooldown_start = time.strftime(ISO, time.gmtime(now - COOLDOWN_SEC))
+        for product_id, created in self.conn.execute(LAST_ALERTS, (cooldown_start,)):
+            self.last_alert[product_id] = iso_to_epoch(created)
+        self.evaluate(self.negs, now)
+
+    def count(self, product_id, now):
+        ts = self.negs.get(product_id)
+        if not ts:
+            return 0
+        # drop what slid out of the window; rows stamped in the future wait their turn
+        del ts[:bisect.bisect_left(ts, now - WINDOW_SEC)]
+        if not ts:
+            del self.negs[product_id]
+            return 0
+        return bisect.bisect_right(ts, now)
+
+    @metrics.ALERT_CYCLE.time(mode="stream")
+    def poll(self, now=None):
+        now = int(now or time.time())
+        touched = set()
+        while True:
+            rows = metrics.fetchall(self.conn, "alert tail", TAIL, (self.last_id, self.tail_batch))
+            for rid, product_id, sentiment, ts in rows:
+                self.last_id = rid
+                if sentiment != "negative" or ts is None or ts < now - WINDOW_SEC:
+                    continue
+                ts_list = self.negs.setdefault(product_id, [])
+                if not ts_list or ts >= ts_list[-1]:
+                    ts_list.append(ts)
+                else:
+                    bisect.insort(ts_list, ts)
+                touched.add(product_id)
+            if len(rows) < self.tail_batch:
+                break
+        # products already over the threshold re-fire once their cooldown ends, like check_once
+        return self.evaluate(touched | self.hot, now)
+
+    def evaluate(self, products, now):
+        s = time.strftime(ISO, time.gmtime(now - WINDOW_SEC))
+        e = time.strftime(ISO, time.gmtime(now))
+        fired = 0
+        for product_id in list(products):
+            cnt = self.count(product_id, now)
+            if cnt < THRESHOLD:
+                self.hot.discard(product_id)
+                continue
+            if self.last_alert.get(product_id, -COOLDOWN_SEC) >= now - COOLDOWN_SEC:
+                self.hot.add(product_id)
+                continue  # suppress duplicate alert within cooldown window
+            self.hot.discard(product_id)
+            self.conn.execute(INSERT, (product_id, s, e, cnt, e))
+            self.last_alert[product_id] = now
+            fired += 1
+            print(f"[ALERT] product={product_id} negatives={cnt} window=[{s},{e}]")
+        self.conn.commit()
+        return fired
+
+def run_stream(conn, interval=0.5, resync_every=300, engine=None, rules_every=60):
+    alerter = StreamAlerter(conn)
+    alerter.rebuild()
+    print(f"[alerts] streaming from id>{alerter.last_id}, {sum(map(len, alerter.negs.values()))} negatives in window")
+    synced = ruled = time.monotonic()
+    while True:
+        try:
+            # the id tail misses rows whose sentiment is filled in later (enrichment); an
+            # occasional rebuild from the indexed window query picks those up
+            if time.monotonic() - synced >= resync_every:
+                alerter.rebuild()
+                synced = time.monotonic()
+            alerter.poll()
+            if engine and time.monotonic() - ruled >= rules_every:
+                engine.cycle()
+                ruled = time.monotonic()
+        except Exception as ex:
+            print("alert error:", ex)
+            try:
+                conn.rollback()
+                alerter.rebuild()
+            except Exception:
+                pass
+        time.sleep(interval)
+
+# ---------- rule engine ----------
+# Per-product rules over the rollup tables, evaluated for every product at once:
+# one query loads the last `history` buckets into (products x buckets) arrays and
+# each rule is a handful of array operations. Each rule type writes its own
+# `rule` string to alerts, so ux_alert and the cooldown apply per rule.
+# product_watermark is the product list: walking it and range-searching each
+# product's primary key reads the window in key order, without another index
+# on the rollups (which would cost every insert)
+BUCKETS_SQL = """
+SELECT sentiment_minute.product_id, (bucket - :start) / :width AS b,
+       SUM(positive + neutral + negative) AS total, SUM(negative) AS negative
+FROM product_watermark
+CROSS JOIN sentiment_minute ON sentiment_minute.product_id = product_watermark.product_id
+WHERE bucket >= :start AND bucket < :end
+GROUP BY sentiment_minute.product_id, b;
+"""
+
+TERM_BUCKETS_SQL = """
+SELECT term_minute.product_id, (bucket - :start) / :width AS b, SUM(n) AS n
+FROM product_watermark
+CROSS JOIN term_minute ON term_minute.product_id = product_watermark.product_id
+WHERE kind = 'keyword' AND bucket >= :start AND bucket < :end AND term = :term
+GROUP BY term_minute.product_id, b;
+"""
+
+RECENT_RULE_ALERTS = """
+SELECT product_id, rule
+FROM alerts
+WHERE created_at_utc >= ?;
+"""
+
+RULE_INSERT = """
+INSERT OR IGNORE INTO alerts
+(product_id, rule, window_start_utc, window_end_utc, count, created_at_utc)
+VALUES (?, ?, ?, ?, ?, ?);
+"""
+
+def ewma(x, alpha):
+    """EWMA mean and variance along the last axis (every row at once)."""
+    mu = x[..., 0].astype(float)
+    var = np.zeros_like(mu)
+    for i in range(1, x.shape[-1]):
+        diff = x[..., i] - mu
+        incr = alpha * diff
+        mu = mu + incr
+        var = (1 - alpha) * (var + diff * incr)
+    return mu, var
+
+class RuleEngine:
+    def __init__(self, conn, bucket_sec=600, history=36, alpha=0.3,
+                 ratio=0.5, ratio_min_total=10,
+                 z=3.0, z_min_neg=5,
+                 keywords=("refund", "broken"), surge=3.0, surge_min=5,
+                 cooldown_sec=COOLDOWN_SEC):
+        self.conn = conn
+        self.bucket_sec = bucket_sec      # width of one evaluation bucket (the last one is "now")
+        self.history = history            # buckets loaded per cycle, current one included
+        self.alpha = alpha
+        self.ratio, self.ratio_min_total = ratio, ratio_min_total
+        self.z, self.z_min_neg = z, z_min_neg
+        self.keywords = [k.strip().lower() for k in keywords if k.strip()]
+        self.surge, self.surge_min = surge, surge_min
+        self.cooldown_sec = cooldown_sec
+        w = bucket_sec // 60
+        self.rule_ratio = f"neg_ratio>={ratio:g}_in_{w}m"
+        self.rule_z = f"neg_z>={z:g}_ewma_{w}m"
+        self.rule_surge = f"kw_surge>={surge:g}x_in_{w}m:{{kw}}"
+
+    def window(self, now):
+        end = now // 60 * 60 + 60             # include the current minute
+        return end - self.history * self.bucket_sec, end
+
+    def load(self, now):
+        """(product_ids, counts[P, 2, B] as total/negative, keyword_counts[K, P, B])."""
+        start, end = self.window(now)
+        params = {"start": start, "end": end, "width": self.bucket_sec}
+        rows = metrics.fetchall(self.conn, "alert rule buckets", BUCKETS_SQL, params)
+        term_rows = [(k, *r) for k, kw in enumerate(self.keywords)
+                     for r in metrics.fetchall(self.conn, "alert rule terms", TERM_BUCKETS_SQL, {**params, "term": kw})]
+        products = sorted({r[0] for r in rows} | {r[1] for r in term_rows})
+        pidx = {p: i for i, p in enumerate(products)}
 
-    conn.commit()
+        B = self.history
+        counts = np.zeros((len(products), 2, B), dtype=np.int64)
+        if rows:
+            p, b, total, neg = zip(*rows)
+            p = np.fromiter(map(pidx.__getitem__, p), np.int64, len(rows))
+            counts[p, 0, b] = total      # (product, bucket) pairs are unique after GROUP BY
+            counts[p, 1, b] = neg
+        kw_counts = np.zeros((len(self.keywords), len(products), B), dtype=np.int64)
+        if term_rows:
+            k, p, b, n = zip(*term_rows)
+            kw_counts[k, np.fromiter(map(pidx.__getitem__, p), np.int64, len(term_rows)), b] = n
+        return np.array(products, dtype=object), counts, kw_counts
+
+    def evaluate(self, counts, kw_counts):
+        """[(rule, product_index, count)] for every rule that fires on the last bucket."""
+        hits = []
+        neg = counts[:, 1, :]
+        cur_neg = neg[:, -1]
+        total = counts[:, 0, -1]
+
+        # share of negatives in the current bucket
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(total > 0, cur_neg / total, 0.0)
+        for i in np.flatnonzero((total >= self.ratio_min_total) & (share >= self.ratio)):
+            hits.append((self.rule_ratio, int(i), int(cur_neg[i])))
+
+        # negatives now vs an EWMA baseline of the previous buckets (variance floored at 1)
+        if neg.shape[1] > 1:
+            mu, var = ewma(neg[:, :-1], self.alpha)
+            z = (cur_neg - mu) / np.sqrt(np.maximum(var, 1.0))
+            for i in np.flatnonzero((cur_neg >= self.z_min_neg) & (z >= self.z)):
+                hits.append((self.rule_z, int(i), int(cur_neg[i])))
+
+        # per watched keyword: current rate vs its own EWMA baseline (floored at 1/bucket)
+        for k, kw in enumerate(self.keywords):
+            x = kw_counts[k]
+            cur = x[:, -1]
+            base = ewma(x[:, :-1], self.alpha)[0] if x.shape[1] > 1 else np.zeros(len(cur))
+            for i in np.flatnonzero((cur >= self.surge_min) & (cur >= self.surge * np.maximum(base, 1.0))):
+                hits.append((self.rule_surge.format(kw=kw), int(i), int(cur[i])))
+        return hits
+
+    @metrics.ALERT_CYCLE.time(mode="rules")
+    def cycle(self, now=None):
+        """Load, evaluate all rules, write alerts outside their cooldown. Returns alerts written."""
+        now = int(now or time.time())
+        products, counts, kw_counts = self.load(now)
+        hits = self.evaluate(counts, kw_counts)
+        if not hits:
+            return 0
+        e = time.strftime(ISO, time.gmtime(now))
+        s = time.strftime(ISO, time.gmtime(self.window(now)[1] - self.bucket_sec))
+        cooldown_start = time.strftime(ISO, time.gmtime(now - self.cooldown_sec))
+        recent = set(self.conn.execute(RECENT_RULE_ALERTS, (cooldown_start,)).fetchall())
+        out = [(str(products[i]), rule, s, e, cnt, e) for rule, i, cnt in hits
+               if (str(products[i]), rule) not in recent]
+        with self.conn:
+            self.conn.executemany(RULE_INSERT, out)
+        for product_id, rule, _, _, cnt, _ in out:
+            print(f"[ALERT] product={product_id} rule={rule} count={cnt} window=[{s},{e}]")
+        return len(out)
 
 def main():
-    conn = sqlite3.connect(DB)
-    conn.execute("PRAGMA busy_timeout=30000;")
+    ap = argparse.ArgumentParser(description="Raise neg>=5_in_10m alerts.")
+    ap.add_argument("--db", default=DB, help="SQLite path or postgresql:// URL")
+    ap.add_argument("--stream", action="store_true", help="tail new reviews instead of rescanning every 60s")
+    ap.add_argument("--interval", type=float, default=0.5, help="poll interval in --stream mode (seconds)")
+    ap.add_argument("--rules", action="store_true", help="also run the ratio/EWMA/keyword rule engine each cycle")
+    ap.add_argument("--keywords", default="refund,broken", help="keywords watched for rate surges")
+    ap.add_argument("--metrics-port", type=int, help="serve Prometheus /metrics on this port")
+    a = ap.parse_args()
+    if is_postgres(a.db) and (a.stream or a.rules):
+        ap.error("--stream and --rules read the SQLite rollups; on Postgres only the periodic rule runs")
+
+    if a.metrics_port:
+        metrics.serve(a.metrics_port)
+    store = open_storage(a.db)
+    engine = RuleEngine(store.conn, keywords=a.keywords.split(",")) if a.rules else None
+    if a.stream:
+        run_stream(store.conn, a.interval, engine=engine)
     while True:
         try:
-            check_once(conn)
+            check_once(store)
+            if engine:
+                engine.cycle()
         except Exception as ex:
             print("alert error:", ex)
         time.sleep(60)
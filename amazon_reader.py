@@ -0,0 +1,136 @@
+# amazon_reader.py
+"""Stream a raw Amazon review dump (JSON lines, .gz or plain) into reviews.db.
+
+    python amazon_reader.py data/Grocery_and_Gourmet_Food_5.json.gz
+    python amazon_reader.py dump.json.gz --workers 8 --limit 100000 --enrich
+
+No temporary decompressed copy and no DataFrame: the file is decompressed
+as a stream, cut into ~chunk-mb blocks on line boundaries, parsed on a
+process pool (only reviewText, overall, asin, unixReviewTime, reviewerID),
+and handed to the ingest_worker BatchWriter. Blocks in flight and the
+writer queue are both bounded, so memory stays flat for any file size.
+
+Rows are stored with keywords/entities NULL, i.e. pending for enrich.py;
+`--enrich` drains that once the load is done. Sentiment is the notebook's
+star-rating label (`--sentiment label`) or left for the model (`none`).
+"""
+import argparse, gzip, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+
+from ingest_worker import DB, BatchWriter
+
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+
+def label_sentiment(rating):
+    # same mapping the notebook used to label the dataset
+    if rating <= 2:
+        return "negative"
+    elif rating == 3:
+        return "neutral"
+    return "positive"
+
+def open_dump(path):
+    with open(path, "rb") as f:
+        gz = f.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rb") if gz else open(path, "rb")
+
+def iter_blocks(path, chunk_bytes):
+    """Yield bytes blocks of whole lines, about chunk_bytes each (decompressed)."""
+    with open_dump(path) as f:
+        tail = b""
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                break
+            data = tail + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                tail = data          # a single line longer than chunk_bytes; keep reading
+                continue
+            tail = data[cut:]
+            yield data[:cut]
+        if tail.strip():
+            yield tail
+
+def parse_block(block, with_label=True):
+    """JSON lines -> (review dicts for BatchWriter, rows skipped)."""
+    rows, skipped = [], 0
+    for line in block.splitlines():
+        if not line.strip():
+            continue
+        # one malformed line (not an object, wrong field types) is skipped, never fatal to the load
+        try:
+            o = json.loads(line)
+            text, asin, t = o.get("reviewText"), o["asin"], int(o["unixReviewTime"])
+            overall = o.get("overall")
+            sentiment = label_sentiment(overall) if with_label and overall is not None else None
+        except (ValueError, KeyError, TypeError, AttributeError):
+            skipped += 1
+            continue
+        if not isinstance(text, str) or not isinstance(asin, str) or not text.strip():
+            skipped += 1     # the notebook drops rows without reviewText too
+            continue
+        rows.append({
+            "review_id": f"{o.get('reviewerID', '')}-{asin}",
+            "product_id": asin,
+            "review_text": text,
+            "sentiment": sentiment,
+            "keywords": None,
+            "entities": None,
+            "ts_utc": time.strftime(ISO, time.gmtime(t)),
+            "ts_epoch": t,
+        })
+    return rows, skipped
+
+def stream_reviews(path, workers=os.cpu_count() or 1, chunk_mb=4, with_label=True, counters=None):
+    """Yield parsed review dicts in file order with at most 2*workers blocks in flight."""
+    counters = counters if counters is not None else {}
+    counters.setdefault("skipped", 0)
+    with ProcessPoolExecutor(workers) as pool:
+        pending = []
+        for block in iter_blocks(path, int(chunk_mb * (1 << 20))):
+            pending.append(pool.submit(parse_block, block, with_label))
+            if len(pending) >= 2 * workers:
+                yield from _done(pending.pop(0), counters)
+        while pending:
+            yield from _done(pending.pop(0), counters)
+
+def _done(fut, counters):
+    rows, skipped = fut.result()
+    counters["skipped"] += skipped
+    return rows
+
+def load(path, db=DB, workers=os.cpu_count() or 1, chunk_mb=4, with_label=True, limit=None):
+    t0 = time.perf_counter()
+    n, counters = 0, {}
+    with BatchWriter(db, max_rows=5000, max_delay=0.5, verbose=False) as w:
+        for r in stream_reviews(path, workers, chunk_mb, with_label, counters):
+            if limit and n >= limit:
+                break
+            w.put(r)
+            n += 1
+            if n % 100_000 == 0:
+                dt = time.perf_counter() - t0
+                print(f"[reader] {n:,} rows, {n / dt:,.0f} rows/s, writer {w.stats()}")
+    dt = time.perf_counter() - t0
+    print(f"[reader] done: {n:,} rows in {dt:.1f}s ({n / dt if dt else 0:,.0f} rows/s), "
+          f"skipped {counters['skipped']:,}, written {w.rows_written:,}, failed {w.rows_failed:,}")
+    return n
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Stream an Amazon JSON(.gz) review dump into reviews.db.")
+    ap.add_argument("path")
+    ap.add_argument("--db", default=DB)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk-mb", type=float, default=4, help="decompressed bytes per parse task")
+    ap.add_argument("--limit", type=int, help="stop after this many reviews")
+    ap.add_argument("--sentiment", choices=("label", "none"), default="label",
+                    help="label: from star rating; none: leave NULL for the model/enrichment")
+    ap.add_argument("--enrich", action="store_true", help="run enrich.py over the new rows afterwards")
+    a = ap.parse_args()
+
+    load(a.path, a.db, a.workers, a.chunk_mb, a.sentiment == "label", a.limit)
+    if a.enrich:
+        from enrich import Enricher
+        with Enricher(a.db, workers=a.workers) as e:
+            print("[enrich] done:", e.run(once=True))
@@ -1,11 +1,35 @@
 from __future__ import annotations
-import sqlite3, json, math
+import asyncio, sqlite3, json, math, os, queue, threading, time, hashlib, base64, csv, io
+from collections import OrderedDict
+from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
 
+import live
+import metrics
+import sentiment_model
+from archive import FREQS, Archive
+from partitions import Router
+from ingest_worker import ALLOWED, ISO, BatchWriter
+
 DB_PATH = "reviews.db"
+POOL_SIZE = int(os.getenv("API_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("API_POOL_TIMEOUT", "5"))        # seconds to wait for a free connection
+DB_MMAP_SIZE = int(os.getenv("API_MMAP_SIZE", str(256 << 20)))  # bytes
+DB_CACHE_KIB = int(os.getenv("API_CACHE_KIB", "65536"))         # page cache per connection
+RESPONSE_CACHE_ENTRIES = int(os.getenv("API_RESPONSE_CACHE_ENTRIES", "2048"))
+RESPONSE_CACHE_BYTES = int(os.getenv("API_RESPONSE_CACHE_BYTES", str(64 << 20)))
+CLASSIFY_MAX_TEXTS = int(os.getenv("API_CLASSIFY_MAX_TEXTS", "10000"))
+EXPORT_PAGE_ROWS = int(os.getenv("API_EXPORT_PAGE_ROWS", "5000"))      # rows per pooled-connection checkout
+EXPORT_CHUNK_BYTES = 64 * 1024
+BULK_BATCH_ROWS = int(os.getenv("API_BULK_BATCH_ROWS", "1000"))        # rows per accepted/rejected report
+BULK_MAX_LINE = int(os.getenv("API_BULK_MAX_LINE", str(1 << 20)))      # bytes per NDJSON line
+BULK_FLUSH_TIMEOUT = float(os.getenv("API_BULK_FLUSH_TIMEOUT", "60"))  # seconds to wait for the commit
 
 # ---------- Pydantic models ----------
 class Review(BaseModel):
@@ -18,6 +42,24 @@ class Review(BaseModel):
     entities: List[str] = Field(default_factory=list)
     ts_utc: str
 
+class ReviewPage(BaseModel):
+    items: List[Review]
+    next_cursor: Optional[str] = None   # pass back as ?cursor= for the next (older) page
+
+class SearchHit(BaseModel):
+    id: int
+    review_id: Optional[str]
+    product_id: str
+    sentiment: Optional[str]
+    ts_utc: str
+    score: float                        # bm25, lower is a better match
+    snippet: str                        # matched terms wrapped in <mark>...</mark>
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None   # pass back as ?cursor= for the next (worse-ranked) page
+    hot_from: Optional[str] = None      # set when older weeks are sealed: those are not searched
+
 class TrendPoint(BaseModel):
     bucket_utc: str
     positive: int
@@ -28,14 +70,323 @@ class KeywordStat(BaseModel):
     keyword: str
     count: int
 
+class EntityStat(BaseModel):
+    entity: str
+    count: int
+
+class ClassifyRequest(BaseModel):
+    texts: List[str]
+    probabilities: bool = False
+
+class ClassifyResponse(BaseModel):
+    model: str
+    labels: List[str]
+    probabilities: Optional[List[Dict[str, float]]] = None
+
+# ---------- SQL ----------
+# plain range predicates on ts_epoch so idx_reviews_product_epoch_id is used
+# (see check_query_plans.py)
+REVIEWS_SQL = """
+SELECT id, review_id, product_id, review_text, sentiment, keywords, entities, ts_utc
+FROM reviews
+WHERE product_id = :product_id
+  AND ts_epoch BETWEEN :start AND :end
+ORDER BY ts_epoch DESC
+LIMIT :limit
+"""
+
+# keyset pagination, newest first: the caller narrows :end/:start to the cursor's
+# ts_epoch, so every page is a fresh range seek on idx_reviews_product_epoch_id,
+# read in (ts_epoch, id) index order with no sort, and page N costs the same as
+# page 1 (the row-value test only settles ties on ts_epoch); sentiment is
+# filtered inside the same index
+PAGE_SQL = """
+SELECT id, review_id, product_id, review_text, sentiment, keywords, entities, ts_utc, ts_epoch
+FROM reviews
+WHERE product_id = :product_id
+  AND ts_epoch BETWEEN :start AND :end
+  AND (ts_epoch, id) < (:c_ts, :c_id)
+  AND (:sentiments IS NULL OR instr(:sentiments, ',' || sentiment || ',') > 0)
+ORDER BY ts_epoch DESC, id DESC
+LIMIT :limit
+"""
+
+# same walk oldest first, for /export
+EXPORT_SQL = """
+SELECT id, review_id, product_id, review_text, sentiment, keywords, entities, ts_utc, ts_epoch
+FROM reviews
+WHERE product_id = :product_id
+  AND ts_epoch BETWEEN :start AND :end
+  AND (ts_epoch, id) > (:c_ts, :c_id)
+  AND (:sentiments IS NULL OR instr(:sentiments, ',' || sentiment || ',') > 0)
+ORDER BY ts_epoch, id
+LIMIT :limit
+"""
+
+# full-text search over init_db.REVIEWS_FTS instead of a LIKE scan of the
+# table: MATCH (see search_match) yields candidate rowids from the index, each
+# joined back by primary key and filtered; ranked by bm25 on review_text
+# alone, with keyset on (score, id), which holds across pages as long as the
+# index doesn't change underneath
+SEARCH_SQL = """
+SELECT r.id, r.review_id, r.product_id, r.sentiment, r.ts_utc,
+       snippet(reviews_fts, 0, '<mark>', '</mark>', '…', :tokens) AS snippet,
+       bm25(reviews_fts, 1.0, 0.0) AS score
+FROM reviews_fts
+JOIN reviews r ON r.id = reviews_fts.rowid
+WHERE reviews_fts MATCH :q
+  AND (:product_id IS NULL OR r.product_id = :product_id)
+  AND r.ts_epoch BETWEEN :start AND :end
+  AND (:sentiments IS NULL OR instr(:sentiments, ',' || r.sentiment || ',') > 0)
+  AND (bm25(reviews_fts, 1.0, 0.0), r.id) > (:c_score, :c_id)
+ORDER BY score, r.id
+LIMIT :limit
+"""
+
+# per-minute rollup rows summed into bucket_minutes-wide buckets
+TREND_SQL = """
+SELECT bucket / :b * :b AS bucket,
+       SUM(positive) AS positive, SUM(neutral) AS neutral, SUM(negative) AS negative
+FROM sentiment_minute
+WHERE product_id = :product_id
+  AND bucket BETWEEN :start AND :end
+GROUP BY 1
+"""
+
+# top terms from the per-minute keyword/entity index, already trimmed + lowercased
+TERMS_SQL = """
+SELECT term, SUM(n) AS count
+FROM term_minute
+WHERE product_id = :product_id
+  AND kind = :kind
+  AND bucket BETWEEN :start AND :end
+GROUP BY term
+HAVING SUM(n) > 0
+ORDER BY count DESC, term
+LIMIT :topk
+"""
+
+WATERMARK_SQL = "SELECT version FROM product_watermark WHERE product_id = ?"
+
+ALERTS_SQL = """
+SELECT id, product_id, rule, window_start_utc, window_end_utc, count, created_at_utc
+FROM alerts
+WHERE product_id = ?
+ORDER BY id DESC
+LIMIT ?
+"""
+
+# ---------- DB pool ----------
+class ReadPool:
+    """Read-only SQLite connections kept open across requests.
+
+    The pool never writes: the API's only write path is the bulk ingest
+    BatchWriter thread (below), with its own connection, and alerts keep
+    theirs. So every connection is opened with mode=ro + query_only and
+    keeps its page cache, mmap and statement cache warm between requests.
+    Safe to share across FastAPI's threadpool; callers wait up to `timeout`
+    seconds when all `size` connections are checked out.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.uri = Path(path).resolve().as_uri() + "?mode=ro"
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        # keep reads reliable under concurrent writer/alert process
+        conn.execute("PRAGMA busy_timeout=30000;")
+        conn.execute("PRAGMA query_only=ON;")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE};")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KIB};")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        t0 = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._opened < self.size
+                if grow:
+                    self._opened += 1
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                with self._lock:
+                    self.waits += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self.timeouts += 1
+                    metrics.POOL_ACQUIRE.observe(time.perf_counter() - t0, pool="api")
+                    raise HTTPException(status_code=503, detail="database busy, try again")
+        waited = time.perf_counter() - t0
+        metrics.POOL_ACQUIRE.observe(waited, pool="api")
+        with self._lock:
+            self._in_use += 1
+            self.checkouts += 1
+            self.wait_total_s += waited
+            self.wait_max_s = max(self.wait_max_s, waited)
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # broken connection: drop it, the next acquire opens a fresh one
+            with self._lock:
+                self._opened -= 1
+            return
+        self._idle.put(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "avg_checkout_ms": round(1000 * self.wait_total_s / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_checkout_ms": round(1000 * self.wait_max_s, 3),
+            }
+
+pool = ReadPool(DB_PATH)
+metrics.POOL_IN_USE.set_function(lambda: pool.stats()["in_use"], pool="api")
+# range queries reaching back past the hot weeks also read the sealed partitions
+router = Router(DB_PATH)
+# long-horizon aggregates come from the columnar archive, not from reviews.db
+archive = Archive(DB_PATH)
+# one id tail for every /stream client (started by the first one)
+tailer = live.Tailer(DB_PATH, name="api live")
+
 # ---------- DB dependency ----------
 def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    # keep reads reliable under concurrent writer/alert process
-    conn.execute("PRAGMA busy_timeout=30000;")
-    yield conn
-    conn.close()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+# ---------- response cache ----------
+class ResponseCache:
+    """Size-bounded LRU of serialized endpoint results.
+
+    Entries are tagged with the product's watermark (product_watermark.version,
+    bumped by trigger on every write); a lookup with a newer watermark is a
+    miss, so results are reused only while no review for that product has
+    changed, not for a fixed TTL.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_ENTRIES, max_bytes: int = RESPONSE_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()   # key -> (watermark, etag, body)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    def get(self, key: tuple, watermark: int) -> Optional[tuple]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] != watermark:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, watermark: int, body: bytes) -> tuple:
+        entry = (watermark, '"%s"' % hashlib.sha1(body).hexdigest()[:20], body)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._data[key] = entry
+            self._bytes += len(body)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, ev = self._data.popitem(last=False)
+                self._bytes -= len(ev[2])
+                self.evictions += 1
+        return entry
+
+    def count_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "not_modified": self.not_modified,
+            }
+
+response_cache = ResponseCache()
+
+def watermark(conn: sqlite3.Connection, product_id: str) -> int:
+    rows = metrics.fetchall(conn, "api watermark", WATERMARK_SQL, (product_id,))
+    return rows[0][0] if rows else 0
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def cached(request: Request, conn: sqlite3.Connection, endpoint: str, product_id: str,
+           params: Dict[str, Any], compute) -> Response:
+    """Serve `compute()` through the response cache, with ETag / 304 support.
+
+    Windows are relative to now and the rollups have minute resolution, so the
+    current minute is part of the key as well as the parameters.
+    """
+    key = (endpoint, product_id, tuple(sorted(params.items())), int(time.time()) // 60)
+    wm = watermark(conn, product_id)
+    entry = response_cache.get(key, wm)
+    if entry is None:
+        body = json.dumps(jsonable_encoder(compute()), separators=(",", ":")).encode()
+        entry = response_cache.put(key, wm, body)
+    _, etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # ---------- helpers ----------
 def parse_json_list(txt: Optional[str]) -> List[str]:
@@ -52,14 +403,179 @@ def parse_json_list(txt: Optional[str]) -> List[str]:
 def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
+def epoch(ts: datetime) -> int:
+    return int(ts.timestamp())
+
 def floor_to_bucket(ts: datetime, bucket_minutes: int) -> datetime:
     sec = int(ts.timestamp())
     b = bucket_minutes * 60
     floored = (sec // b) * b
     return datetime.fromtimestamp(floored, tz=timezone.utc)
 
+def top_terms(conn: sqlite3.Connection, product_id: str, kind: str,
+              start: datetime, end: datetime, topk: int) -> List[sqlite3.Row]:
+    # top-k by count desc, then alphabetically; minute resolution like the trend
+    return metrics.fetchall(conn, f"api {kind} terms", TERMS_SQL, {
+        "product_id": product_id, "kind": kind,
+        "start": epoch(start) // 60 * 60, "end": epoch(end), "topk": topk,
+    })
+
+# ---------- keyset pagination / export ----------
+MAX_EPOCH = 2 ** 62
+EXPORT_COLUMNS = ["id", "review_id", "product_id", "ts_utc", "sentiment", "keywords", "entities", "review_text"]
+
+def encode_cursor(ts_epoch: int, rid: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts_epoch}:{rid}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, first=int) -> tuple:
+    try:
+        ts, rid = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return first(ts), int(rid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def search_match(q: str, product_id: Optional[str]) -> str:
+    """FTS5 MATCH expression: `q` against review_text, AND the product's token when filtering by one."""
+    m = "{review_text} : (" + q + ")"
+    if product_id is not None:
+        m += ' AND product_id : "' + product_id.replace('"', '""') + '"'
+    return m
+
+def parse_ts(value: Optional[str], default: int) -> int:
+    if value is None:
+        return default
+    try:
+        return epoch(datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"timestamps must look like 2024-01-31T00:00:00Z, got {value!r}")
+
+def keyset_params(product_id: str, start_ts: Optional[str], end_ts: Optional[str],
+                  sentiment: Optional[List[str]], limit: int) -> Dict[str, Any]:
+    if sentiment and not set(sentiment) <= ALLOWED:
+        raise HTTPException(status_code=400, detail="sentiment must be positive, neutral or negative")
+    return {
+        "product_id": product_id,
+        "start": parse_ts(start_ts, 0),
+        "end": parse_ts(end_ts, MAX_EPOCH),
+        "sentiments": "," + ",".join(sorted(set(sentiment))) + "," if sentiment else None,
+        "limit": limit,
+    }
+
+def review_dict(r: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": r["id"], "review_id": r["review_id"], "product_id": r["product_id"],
+        "review_text": r["review_text"], "sentiment": r["sentiment"],
+        "keywords": parse_json_list(r["keywords"]), "entities": parse_json_list(r["entities"]),
+        "ts_utc": r["ts_utc"],
+    }
+
+def export_rows(params: Dict[str, Any]):
+    """Every matching row, oldest first, one pooled connection checkout per page.
+
+    Short checkouts keep the export from pinning a pool slot (or an old WAL
+    snapshot) for its whole duration; the cursor makes each page a fresh seek.
+    """
+    c_ts, c_id = -1, 0
+    while True:
+        conn = pool.acquire()
+        try:
+            rows = router.fetch(conn, EXPORT_SQL, {**params, "start": max(params["start"], c_ts),
+                                                   "c_ts": c_ts, "c_id": c_id}, desc=False, name="api export")
+        finally:
+            pool.release(conn)
+        yield from rows
+        if len(rows) < params["limit"]:
+            return
+        c_ts, c_id = rows[-1]["ts_epoch"], rows[-1]["id"]
+
+def export_ndjson(params: Dict[str, Any]):
+    buf = bytearray()
+    for r in export_rows(params):
+        buf += json.dumps(review_dict(r), ensure_ascii=False).encode()
+        buf += b"\n"
+        if len(buf) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+
+def export_csv(params: Dict[str, Any]):
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(EXPORT_COLUMNS)
+    for r in export_rows(params):
+        w.writerow([r["id"], r["review_id"], r["product_id"], r["ts_utc"], r["sentiment"],
+                    r["keywords"] or "[]", r["entities"] or "[]", r["review_text"]])
+        if out.tell() >= EXPORT_CHUNK_BYTES:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+# ---------- bulk ingest ----------
+# The only writer in the API process: every upload feeds this one group-commit
+# thread, so concurrent uploaders never contend for the SQLite write lock.
+writer = BatchWriter(DB_PATH, max_rows=2000, max_delay=0.1, max_queue=50_000, verbose=False)
+
+MAX_REJECT_DETAILS = 20
+
+def _str_list(v: Any) -> bool:
+    return v is None or (isinstance(v, list) and all(isinstance(x, str) for x in v))
+
+def validate_row(o: Any) -> Optional[str]:
+    """Cheap structural checks on one decoded NDJSON row; returns an error or None.
+
+    Fills ts_utc/ts_epoch from each other in place. Deliberately no Pydantic
+    model here: this runs once per row on large uploads.
+    """
+    if not isinstance(o, dict):
+        return "not a JSON object"
+    pid = o.get("product_id")
+    if not isinstance(pid, str) or not pid or len(pid) > 64:
+        return "product_id must be a non-empty string"
+    if not isinstance(o.get("review_text"), str) or not o["review_text"].strip():
+        return "review_text must be a non-empty string"
+    rid = o.get("review_id")
+    if rid is not None and not isinstance(rid, str):
+        return "review_id must be a string"
+    s = o.get("sentiment")
+    if s is not None and s not in ALLOWED:
+        return "sentiment must be positive, neutral, negative or null"
+    if not _str_list(o.get("keywords")) or not _str_list(o.get("entities")):
+        return "keywords/entities must be lists of strings or null"
+    ts, te = o.get("ts_utc"), o.get("ts_epoch")
+    try:
+        if isinstance(te, int) and not isinstance(te, bool):
+            ts = time.strftime(ISO, time.gmtime(te))
+        elif isinstance(ts, str):
+            te = epoch(datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc))
+        else:
+            return "ts_utc (YYYY-MM-DDTHH:MM:SSZ) or ts_epoch (int) required"
+    except (ValueError, OverflowError, OSError):
+        return "bad timestamp"
+    o["ts_utc"], o["ts_epoch"] = ts, te
+    o.setdefault("review_id", None)
+    o.setdefault("sentiment", None)
+    # missing lists are left NULL so enrich.py fills them in
+    o.setdefault("keywords", None)
+    o.setdefault("entities", None)
+    return None
+
+# ---------- sentiment model ----------
+def warm_model() -> None:
+    # load in the background so startup isn't blocked; /classify waits on the same lock
+    def load():
+        try:
+            print("[api] sentiment model loaded:", sentiment_model.get_model().version)
+        except Exception as ex:
+            print("[api] sentiment model not loaded:", ex)
+    threading.Thread(target=load, name="model-warmup", daemon=True).start()
+
 # ---------- FastAPI ----------
-app = FastAPI(title="Amazon Reviews API", version="1.0")
+app = FastAPI(title="Amazon Reviews API", version="1.0",
+              on_startup=[warm_model, writer.start], on_shutdown=[writer.close, tailer.close])
+app.add_middleware(metrics.ASGIMetrics, app_name="api")
 
 @app.get("/healthz")
 def healthz(conn: sqlite3.Connection = Depends(get_conn)) -> Dict[str, Any]:
@@ -67,124 +583,245 @@ def healthz(conn: sqlite3.Connection = Depends(get_conn)) -> Dict[str, Any]:
     _ = conn.execute("SELECT 1").fetchone()
     return {"ok": True}
 
+@app.get("/pool")
+def pool_stats() -> Dict[str, Any]:
+    # connection pool size, wait counts and checkout latency for monitoring
+    return pool.stats()
+
+@app.get("/cache")
+def cache_stats() -> Dict[str, Any]:
+    # response cache hit/miss/eviction counters
+    return response_cache.stats()
+
+@app.get("/writer")
+def writer_stats() -> Dict[str, Any]:
+    # bulk ingest queue depth and flush throughput
+    return writer.stats()
+
+@app.get("/metrics")
+def metrics_text(conn: sqlite3.Connection = Depends(get_conn)) -> Response:
+    # Prometheus text: request/SQL/pool/ingest histograms for this process
+    metrics.update_ingest_lag(conn)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/slow_queries")
+def slow_queries() -> List[Dict[str, Any]]:
+    # recent queries over SLOW_QUERY_MS with their EXPLAIN QUERY PLAN
+    return metrics.slow_queries()
+
+@app.get("/live")
+def live_stats() -> Dict[str, Any]:
+    # server-push subscribers and the shared tail behind them
+    return tailer.stats()
+
+@app.get("/partitions")
+def partition_stats() -> Dict[str, Any]:
+    # sealed weeks known to the router and how often reads reached them
+    return router.stats()
+
 # 1) Latest reviews for a product
 @app.get("/reviews/{product_id}", response_model=List[Review])
 def get_reviews(
+    request: Request,
     product_id: str,
     limit: int = Query(50, ge=1, le=500),
     since_minutes: int = Query(1440, ge=1, description="Lookback window in minutes")
 , conn: sqlite3.Connection = Depends(get_conn)):
-    now = utcnow()
-    start = now - timedelta(minutes=since_minutes)
-    rows = conn.execute(
-        """
-        SELECT id, review_id, product_id, review_text, sentiment, keywords, entities, ts_utc
-        FROM reviews
-        WHERE product_id = ?
-          AND datetime(ts_utc) BETWEEN datetime(?) AND datetime(?)
-        ORDER BY datetime(ts_utc) DESC
-        LIMIT ?
-        """,
-        (product_id, start.strftime("%Y-%m-%dT%H:%M:%SZ"), now.strftime("%Y-%m-%dT%H:%M:%SZ"), limit),
-    ).fetchall()
-
-    out: List[Review] = []
-    for r in rows:
-        out.append(Review(
-            id=r["id"],
-            review_id=r["review_id"],
-            product_id=r["product_id"],
-            review_text=r["review_text"],
-            sentiment=r["sentiment"],
-            keywords=parse_json_list(r["keywords"]),
-            entities=parse_json_list(r["entities"]),
-            ts_utc=r["ts_utc"],
-        ))
-    return out
+    def compute():
+        now = utcnow()
+        start = now - timedelta(minutes=since_minutes)
+        rows = router.fetch(conn, REVIEWS_SQL, {"product_id": product_id, "start": epoch(start),
+                                                "end": epoch(now), "limit": limit}, name="api reviews")
+
+        out: List[Review] = []
+        for r in rows:
+            out.append(Review(
+                id=r["id"],
+                review_id=r["review_id"],
+                product_id=r["product_id"],
+                review_text=r["review_text"],
+                sentiment=r["sentiment"],
+                keywords=parse_json_list(r["keywords"]),
+                entities=parse_json_list(r["entities"]),
+                ts_utc=r["ts_utc"],
+            ))
+        return out
+    return cached(request, conn, "reviews", product_id, {"limit": limit, "since_minutes": since_minutes}, compute)
+
+# 1b) Full history, a page at a time: keyset cursor instead of OFFSET
+@app.get("/reviews/{product_id}/page", response_model=ReviewPage)
+def get_reviews_page(
+    product_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    start_ts: Optional[str] = Query(None, description="inclusive, e.g. 2024-01-01T00:00:00Z"),
+    end_ts: Optional[str] = Query(None, description="inclusive"),
+    sentiment: Optional[List[str]] = Query(None),
+    conn: sqlite3.Connection = Depends(get_conn),
+):
+    params = keyset_params(product_id, start_ts, end_ts, sentiment, limit)
+    c_ts, c_id = decode_cursor(cursor) if cursor else (MAX_EPOCH, 0)
+    params["end"] = min(params["end"], c_ts)
+    rows = router.fetch(conn, PAGE_SQL, {**params, "c_ts": c_ts, "c_id": c_id}, name="api reviews page")
+    nxt = encode_cursor(rows[-1]["ts_epoch"], rows[-1]["id"]) if len(rows) == limit else None
+    return {"items": [review_dict(r) for r in rows], "next_cursor": nxt}
+
+# 1c) Stream every matching review as NDJSON or CSV, in constant memory
+@app.get("/reviews/{product_id}/export")
+def export_reviews(
+    product_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_ts: Optional[str] = Query(None),
+    end_ts: Optional[str] = Query(None),
+    sentiment: Optional[List[str]] = Query(None),
+):
+    params = keyset_params(product_id, start_ts, end_ts, sentiment, EXPORT_PAGE_ROWS)
+    if format == "csv":
+        body, media = export_csv(params), "text/csv"
+    else:
+        body, media = export_ndjson(params), "application/x-ndjson"
+    filename = f"reviews_{product_id}.{format}"
+    return StreamingResponse(body, media_type=media,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# 1d) Full-text search, best matches first
+@app.get("/search", response_model=SearchPage)
+def search_reviews(
+    q: str = Query(..., min_length=1, description='FTS5 query: battery, "stopped working", refund OR return, charg*'),
+    product_id: Optional[str] = Query(None),
+    start_ts: Optional[str] = Query(None, description="inclusive, e.g. 2024-01-01T00:00:00Z"),
+    end_ts: Optional[str] = Query(None, description="inclusive"),
+    sentiment: Optional[List[str]] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    snippet_tokens: int = Query(16, ge=1, le=64),
+    conn: sqlite3.Connection = Depends(get_conn),
+):
+    params = keyset_params(product_id, start_ts, end_ts, sentiment, limit)
+    c_score, c_id = decode_cursor(cursor, float) if cursor else (-math.inf, 0)
+    try:
+        rows = metrics.fetchall(conn, "api search", SEARCH_SQL, {**params, "q": search_match(q, product_id),
+                                                                 "tokens": snippet_tokens,
+                                                                 "c_score": c_score, "c_id": c_id})
+    except sqlite3.OperationalError as ex:
+        if "no such table: reviews_fts" in str(ex):
+            raise HTTPException(status_code=503, detail="no search index; run python init_db.py")
+        if "locked" in str(ex) or "I/O" in str(ex):
+            raise
+        # anything else comes from parsing the MATCH expression: syntax, quotes, unknown column
+        raise HTTPException(status_code=400, detail=f"bad search query {q!r}: {ex}")
+    nxt = encode_cursor(rows[-1]["score"], rows[-1]["id"]) if len(rows) == limit else None
+    hot = max((p.end_epoch for p in router.catalog(conn)), default=0)
+    return {"items": [dict(r) for r in rows], "next_cursor": nxt,
+            "hot_from": datetime.fromtimestamp(hot, tz=timezone.utc).strftime(ISO) if hot else None}
 
 # 2) Sentiment trend in time buckets
 @app.get("/sentiment_trend/{product_id}", response_model=List[TrendPoint])
 def get_sentiment_trend(
+    request: Request,
     product_id: str,
     window_minutes: int = Query(120, ge=5, le=24*60),
     bucket_minutes: int = Query(5, ge=1, le=60)
 , conn: sqlite3.Connection = Depends(get_conn)):
-    now = utcnow()
-    start = now - timedelta(minutes=window_minutes)
-
-    rows = conn.execute(
-        """
-        SELECT sentiment, ts_utc
-        FROM reviews
-        WHERE product_id = ?
-          AND sentiment IN ('positive','neutral','negative')
-          AND datetime(ts_utc) BETWEEN datetime(?) AND datetime(?)
-        """,
-        (product_id, start.strftime("%Y-%m-%dT%H:%M:%SZ"), now.strftime("%Y-%m-%dT%H:%M:%SZ")),
-    ).fetchall()
-
-    # pre-build empty buckets
-    buckets: Dict[str, Dict[str, int]] = {}
-    t = floor_to_bucket(start, bucket_minutes)
-    end_bucket = floor_to_bucket(now, bucket_minutes)
-    while t <= end_bucket:
-        key = t.strftime("%Y-%m-%dT%H:%M:%SZ")
-        buckets[key] = {"positive": 0, "neutral": 0, "negative": 0}
-        t += timedelta(minutes=bucket_minutes)
-
-    # fill buckets
-    for r in rows:
-        try:
-            ts = datetime.strptime(r["ts_utc"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-        except Exception:
-            # skip malformed timestamps
-            continue
-        key = floor_to_bucket(ts, bucket_minutes).strftime("%Y-%m-%dT%H:%M:%SZ")
-        if key in buckets:
-            buckets[key][r["sentiment"]] += 1
-
-    # format
-    out: List[TrendPoint] = []
-    for key in sorted(buckets.keys()):
-        counts = buckets[key]
-        out.append(TrendPoint(
-            bucket_utc=key,
-            positive=counts["positive"],
-            neutral=counts["neutral"],
-            negative=counts["negative"],
-        ))
-    return out
+    def compute():
+        now = utcnow()
+        start = now - timedelta(minutes=window_minutes)
+
+        b = bucket_minutes * 60
+        rows = metrics.fetchall(conn, "api trend", TREND_SQL, {
+            "b": b, "product_id": product_id,
+            # minute resolution: the rollup row holding `start` is included
+            "start": epoch(start) // 60 * 60, "end": epoch(now),
+        })
+
+        # pre-build empty buckets, keyed by bucket start in epoch seconds
+        buckets: Dict[int, Dict[str, int]] = {}
+        for key in range((epoch(start) // b) * b, (epoch(now) // b) * b + 1, b):
+            buckets[key] = {"positive": 0, "neutral": 0, "negative": 0}
+
+        # fill buckets
+        for r in rows:
+            if r["bucket"] in buckets:
+                buckets[r["bucket"]] = {"positive": r["positive"], "neutral": r["neutral"], "negative": r["negative"]}
+
+        # format
+        out: List[TrendPoint] = []
+        for key in sorted(buckets.keys()):
+            counts = buckets[key]
+            out.append(TrendPoint(
+                bucket_utc=datetime.fromtimestamp(key, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                positive=counts["positive"],
+                neutral=counts["neutral"],
+                negative=counts["negative"],
+            ))
+        return out
+    return cached(request, conn, "sentiment_trend", product_id,
+                  {"window_minutes": window_minutes, "bucket_minutes": bucket_minutes}, compute)
 
 # 3) Recent keywords (frequency) for a product
 @app.get("/keywords/{product_id}", response_model=List[KeywordStat])
 def get_keywords(
+    request: Request,
     product_id: str,
     since_minutes: int = Query(1440, ge=5, le=7*24*60),
     topk: int = Query(20, ge=1, le=200)
 , conn: sqlite3.Connection = Depends(get_conn)):
-    now = utcnow()
-    start = now - timedelta(minutes=since_minutes)
-    rows = conn.execute(
-        """
-        SELECT keywords
-        FROM reviews
-        WHERE product_id = ?
-          AND datetime(ts_utc) BETWEEN datetime(?) AND datetime(?)
-        """,
-        (product_id, start.strftime("%Y-%m-%dT%H:%M:%SZ"), now.strftime("%Y-%m-%dT%H:%M:%SZ")),
-    ).fetchall()
-
-    freq: Dict[str, int] = {}
-    for r in rows:
-        for kw in parse_json_list(r["keywords"]):
-            k = kw.strip().lower()
-            if not k:
-                continue
-            freq[k] = freq.get(k, 0) + 1
-
-    # top-k by count desc, then alphabetically
-    items = sorted(freq.items(), key=lambda kv: (-kv[1], kv[0]))[:topk]
-    return [KeywordStat(keyword=k, count=v) for k, v in items]
+    def compute():
+        now = utcnow()
+        start = now - timedelta(minutes=since_minutes)
+        rows = top_terms(conn, product_id, "keyword", start, now, topk)
+        return [KeywordStat(keyword=r["term"], count=r["count"]) for r in rows]
+    return cached(request, conn, "keywords", product_id, {"since_minutes": since_minutes, "topk": topk}, compute)
+
+# 3b) Recent entities (frequency) for a product
+@app.get("/entities/{product_id}", response_model=List[EntityStat])
+def get_entities(
+    request: Request,
+    product_id: str,
+    since_minutes: int = Query(1440, ge=5, le=7*24*60),
+    topk: int = Query(20, ge=1, le=200)
+, conn: sqlite3.Connection = Depends(get_conn)):
+    def compute():
+        now = utcnow()
+        start = now - timedelta(minutes=since_minutes)
+        rows = top_terms(conn, product_id, "entity", start, now, topk)
+        return [EntityStat(entity=r["term"], count=r["count"]) for r in rows]
+    return cached(request, conn, "entities", product_id, {"since_minutes": since_minutes, "topk": topk}, compute)
+
+# 3c) Long-horizon history from the columnar archive (sealed, archived weeks only)
+@app.get("/history/sentiment_trend", response_model=List[TrendPoint])
+def get_history_trend(
+    product_id: Optional[str] = Query(None, description="all products if omitted"),
+    freq: str = Query("month", pattern=f"^({'|'.join(FREQS)})$"),
+    start_ts: Optional[str] = Query(None),
+    end_ts: Optional[str] = Query(None),
+):
+    rows = archive.trend(product_id, parse_ts(start_ts, 0), parse_ts(end_ts, MAX_EPOCH), freq)
+    return [TrendPoint(bucket_utc=time.strftime(ISO, time.gmtime(b)), positive=p, neutral=u, negative=n)
+            for b, p, u, n in rows]
+
+@app.get("/history/keywords", response_model=List[KeywordStat])
+def get_history_keywords(
+    product_id: Optional[str] = Query(None),
+    start_ts: Optional[str] = Query(None),
+    end_ts: Optional[str] = Query(None),
+    topk: int = Query(20, ge=1, le=200),
+):
+    rows = archive.terms(product_id, "keyword", parse_ts(start_ts, 0), parse_ts(end_ts, MAX_EPOCH), topk)
+    return [KeywordStat(keyword=k, count=n) for k, n in rows]
+
+@app.get("/history/sentiment_distribution")
+def get_history_distribution(
+    product_id: Optional[str] = Query(None),
+    start_ts: Optional[str] = Query(None),
+    end_ts: Optional[str] = Query(None),
+) -> Dict[str, int]:
+    return archive.distribution(product_id, parse_ts(start_ts, 0), parse_ts(end_ts, MAX_EPOCH))
+
+@app.get("/archive")
+def archive_stats() -> Dict[str, Any]:
+    # archived weeks and rows behind the /history endpoints
+    return archive.stats()
 
 # 4) Optional: recent alerts
 @app.get("/alerts/{product_id}", response_model=List[Dict[str, Any]])
@@ -192,14 +829,109 @@ def get_alerts(
     product_id: str,
     limit: int = Query(20, ge=1, le=200)
 , conn: sqlite3.Connection = Depends(get_conn)):
-    rows = conn.execute(
-        """
-        SELECT id, product_id, rule, window_start_utc, window_end_utc, count, created_at_utc
-        FROM alerts
-        WHERE product_id = ?
-        ORDER BY id DESC
-        LIMIT ?
-        """,
-        (product_id, limit),
-    ).fetchall()
+    rows = metrics.fetchall(conn, "api alerts", ALERTS_SQL, (product_id, limit))
     return [dict(r) for r in rows]
+
+# 4b) Push new reviews, trend deltas and alerts as they are written (Server-Sent Events)
+@app.get("/stream/{product_id}")
+async def stream_product(
+    request: Request,
+    product_id: str,
+    since: Optional[int] = Query(None, description="last review id the client already has; default now"),
+):
+    # the first subscribe starts the tailer (sqlite reads, backlog prefill); keep it off the event loop
+    sub = await run_in_threadpool(tailer.subscribe_async, product_id,
+                                  live.resume_from(since, request.headers.get("last-event-id")),
+                                  asyncio.get_running_loop())
+    return StreamingResponse(live.sse_async(sub, tailer), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# 5) Batch sentiment classification with the trained model
+@app.post("/classify", response_model=ClassifyResponse)
+def classify(req: ClassifyRequest) -> ClassifyResponse:
+    if len(req.texts) > CLASSIFY_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"at most {CLASSIFY_MAX_TEXTS} texts per call")
+    try:
+        model = sentiment_model.get_model()
+    except FileNotFoundError as ex:
+        raise HTTPException(status_code=503, detail=str(ex))
+    # one vectorized transform + predict over the whole batch
+    labels = model.predict(req.texts)
+    probs = model.predict_proba(req.texts) if req.probabilities else None
+    return ClassifyResponse(model=model.version, labels=labels, probabilities=probs)
+
+# 6) Bulk ingest: NDJSON request body, one review object per line
+@app.post("/reviews/bulk")
+async def bulk_ingest(request: Request, response: Response) -> Dict[str, Any]:
+    batches: List[Dict[str, Any]] = []
+    tickets = []
+    batch: List[dict] = []
+    cur = {"batch": 0, "accepted": 0, "rejected": 0, "errors": []}
+    line_no = 0
+
+    async def submit():
+        nonlocal batch, cur
+        # put() blocks while the writer queue is full; keep that off the event loop, and
+        # bounded, so a wedged or dead writer can't pin a threadpool worker for good
+        try:
+            tickets.append(await run_in_threadpool(writer.put_many, batch, BULK_FLUSH_TIMEOUT))
+        except (queue.Full, RuntimeError) as ex:
+            # rows queued before this point (earlier batches, part of this one) may still land
+            raise HTTPException(status_code=503, detail=f"ingest writer unavailable: {str(ex) or 'queue full'}; "
+                                                        f"{len(batches)} earlier batches were already queued")
+        batches.append(cur)
+        batch, cur = [], {"batch": len(batches), "accepted": 0, "rejected": 0, "errors": []}
+
+    def take(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        if not line.strip():
+            return
+        try:
+            o = json.loads(line)
+            err = validate_row(o)
+        except ValueError:
+            err = "invalid JSON"
+        if err:
+            cur["rejected"] += 1
+            if len(cur["errors"]) < MAX_REJECT_DETAILS:
+                cur["errors"].append({"line": line_no, "error": err})
+        else:
+            cur["accepted"] += 1
+            batch.append(o)
+
+    buf = b""
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        if len(buf) > BULK_MAX_LINE:
+            raise HTTPException(status_code=413, detail=f"line {line_no + len(lines) + 1} longer than {BULK_MAX_LINE} bytes")
+        for line in lines:
+            take(line)
+            if cur["accepted"] + cur["rejected"] >= BULK_BATCH_ROWS:
+                await submit()
+    take(buf)
+    if cur["accepted"] + cur["rejected"]:
+        await submit()
+
+    # acknowledge only once every row accepted here is committed or known to have failed;
+    # the tickets count this request's rows only, not other uploads sharing the writer
+    def settle():
+        deadline = time.monotonic() + BULK_FLUSH_TIMEOUT
+        return all(t.wait(max(deadline - time.monotonic(), 0)) for t in tickets)
+    settled = await run_in_threadpool(settle)
+    for b, t in zip(batches, tickets):
+        b["committed"], b["failed"] = t.written, t.failed
+    failed = sum(t.failed for t in tickets)
+    if not settled:
+        response.status_code = 504      # still queued or being written; the rows may yet land
+    elif failed:
+        response.status_code = 500
+    return {
+        "accepted": sum(b["accepted"] for b in batches),
+        "rejected": sum(b["rejected"] for b in batches),
+        "committed": sum(t.written for t in tickets),
+        "failed": failed,
+        "complete": settled and not failed,
+        "batches": batches,
+    }
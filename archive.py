@@ -0,0 +1,290 @@
+# archive.py
+"""Columnar cold-tier archive of sealed weeks, scanned as memory-mapped NumPy arrays.
+
+    python archive.py build                          # every sealed partition not archived yet
+    python archive.py build --seal --hot-weeks 2     # seal old weeks out of reviews.db first
+    python archive.py trend --freq month             # all products, like the notebook's monthly plot
+    python archive.py trend --product B00X --freq week
+    python archive.py keywords --product B00X --topk 20
+
+Each sealed partition (partitions.py) becomes archive/<partition name>/, one
+.npy file per column, rows sorted by (product, ts):
+
+    id.npy, ts.npy              int64
+    product.npy                 int32 codes into products.json; product_offsets.npy
+                                gives each product's contiguous row range
+    sentiment.npy               int8 codes into SENTIMENTS, -1 = not classified
+    text_offsets.npy, text.npy  int64 offsets (rows + 1) into the UTF-8 bytes of all texts
+    keyword_offsets.npy, keyword.npy, keywords.json   per-row code lists, same layout
+    entity_offsets.npy, entity.npy, entities.json
+
+Everything is opened with np.load(mmap_mode="r"), so a scan reads only the
+columns and row ranges it touches, and never goes near the live reviews.db.
+A segment is rebuilt when its partition gained late rows since it was written.
+"""
+import argparse, bisect, json, os, shutil, sqlite3, threading, time
+from collections import Counter
+
+import numpy as np
+
+import init_db
+import partitions
+from review_store import norm_terms
+
+DB = init_db.DB
+ARCHIVE_DIR = "archive"
+SENTIMENTS = ("positive", "neutral", "negative")    # rollup column order
+FREQS = ("day", "week", "month", "year")
+TERM_KINDS = {"keyword": "keywords", "entity": "entities"}    # kind -> column, also its dictionary file
+
+SEGMENT_COLUMNS = ("id", "product_id", "ts_epoch", "sentiment", "keywords", "entities", "review_text")
+SEGMENT_SQL = f"""
+SELECT {", ".join(SEGMENT_COLUMNS)}
+FROM reviews
+WHERE ts_epoch IS NOT NULL
+ORDER BY product_id, ts_epoch, id
+"""
+
+def archive_dir(db):
+    return os.path.join(os.path.dirname(os.path.abspath(db)), ARCHIVE_DIR)
+
+def _encode(values):
+    """Dictionary-encode a list of strings: (codes int32, sorted dictionary)."""
+    labels = sorted(set(values))
+    index = {v: i for i, v in enumerate(labels)}
+    return np.fromiter((index[v] for v in values), np.int32, len(values)), labels
+
+def _ragged(lists):
+    """Per-row lists of strings -> (offsets int64, codes int32, dictionary)."""
+    offsets = np.zeros(len(lists) + 1, np.int64)
+    np.cumsum([len(x) for x in lists], out=offsets[1:])
+    codes, labels = _encode([t for x in lists for t in x])
+    return offsets, codes, labels
+
+def write_segment(part_path, out_dir, meta):
+    src = sqlite3.connect(f"file:{part_path}?mode=ro", uri=True)
+    try:
+        rows = src.execute(SEGMENT_SQL).fetchall()
+    finally:
+        src.close()
+    tmp = out_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    save = lambda name, arr: np.save(os.path.join(tmp, name + ".npy"), arr)
+
+    save("id", np.fromiter((r[0] for r in rows), np.int64, len(rows)))
+    save("ts", np.fromiter((r[2] for r in rows), np.int64, len(rows)))
+    product, products = _encode([r[1] for r in rows])
+    save("product", product)
+    # rows are sorted by product, so each product is one slice
+    save("product_offsets", np.searchsorted(product, np.arange(len(products) + 1)).astype(np.int64))
+    code = {s: i for i, s in enumerate(SENTIMENTS)}
+    save("sentiment", np.fromiter((code.get(r[3], -1) for r in rows), np.int8, len(rows)))
+
+    texts = [(r[6] or "").encode("utf-8") for r in rows]
+    offsets = np.zeros(len(rows) + 1, np.int64)
+    np.cumsum([len(t) for t in texts], out=offsets[1:])
+    save("text_offsets", offsets)
+    save("text", np.frombuffer(b"".join(texts), np.uint8))
+
+    dictionaries = {"products": products}
+    for kind, col in TERM_KINDS.items():
+        pos = SEGMENT_COLUMNS.index(col)
+        offs, codes, labels = _ragged([norm_terms(r[pos]) for r in rows])
+        save(kind + "_offsets", offs)
+        save(kind, codes)
+        dictionaries[col] = labels
+    for name, labels in dictionaries.items():
+        with open(os.path.join(tmp, name + ".json"), "w") as f:
+            json.dump(labels, f)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({**meta, "rows": len(rows), "products": len(products),
+                   "text_bytes": int(offsets[-1]), "built_at_utc": time.strftime(partitions.ISO, time.gmtime())}, f)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+    return len(rows)
+
+def build(db=DB, force=False):
+    """Write a segment for every sealed partition that has none or an outdated one."""
+    conn = sqlite3.connect(db)
+    conn.execute(init_db.PARTITIONS)
+    catalog = conn.execute("SELECT name, path, start_epoch, end_epoch, reviews FROM partitions "
+                           "ORDER BY start_epoch").fetchall()
+    conn.close()
+    root = archive_dir(db)
+    os.makedirs(root, exist_ok=True)
+    base = os.path.dirname(os.path.abspath(db))
+    built = 0
+    for name, path, start, end, n in catalog:
+        out = os.path.join(root, name)
+        meta = {"name": name, "start_epoch": start, "end_epoch": end, "source_reviews": n}
+        try:
+            with open(os.path.join(out, "meta.json")) as f:
+                current = json.load(f).get("source_reviews") == n
+        except (OSError, ValueError):
+            current = False
+        if current and not force:
+            continue
+        if not os.path.exists(os.path.join(base, path)):
+            print(f"[archive] {name}: partition file is gone, keeping the existing segment")
+            continue
+        t0 = time.perf_counter()
+        rows = write_segment(os.path.join(base, path), out, meta)
+        built += 1
+        print(f"[archive] {name}: {rows:,} rows in {time.perf_counter() - t0:.1f}s")
+    return built
+
+class Segment:
+    """One archived week, columns memory-mapped on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self.built = os.path.getmtime(os.path.join(path, "meta.json"))
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.start_epoch = self.meta["start_epoch"]
+        self.end_epoch = self.meta["end_epoch"]
+        self._cols = {}
+        self._dicts = {}
+
+    def col(self, name):
+        arr = self._cols.get(name)
+        if arr is None:
+            arr = self._cols[name] = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+        return arr
+
+    def labels(self, name):
+        labels = self._dicts.get(name)
+        if labels is None:
+            with open(os.path.join(self.path, name + ".json")) as f:
+                labels = self._dicts[name] = json.load(f)
+        return labels
+
+    def rows(self, product_id, start, end):
+        """Row selection for one product (a slice) or all products (a bool mask) in [start, end]."""
+        ts = self.col("ts")
+        if product_id is None:
+            return (ts >= start) & (ts <= end)
+        products = self.labels("products")
+        i = bisect.bisect_left(products, product_id)
+        if i == len(products) or products[i] != product_id:
+            return slice(0, 0)
+        lo, hi = self.col("product_offsets")[i:i + 2]
+        # ts is sorted within a product
+        return slice(int(lo + np.searchsorted(ts[lo:hi], start, "left")),
+                     int(lo + np.searchsorted(ts[lo:hi], end, "right")))
+
+    def text(self, i):
+        o = self.col("text_offsets")
+        return bytes(self.col("text")[o[i]:o[i + 1]]).decode("utf-8")
+
+def _bucket(ts, freq):
+    if freq == "week":
+        return ts - (ts - partitions.MONDAY) % partitions.WEEK
+    unit = {"day": "D", "month": "M", "year": "Y"}[freq]
+    return ts.astype("datetime64[s]").astype(f"datetime64[{unit}]").astype("datetime64[s]").astype(np.int64)
+
+class Archive:
+    def __init__(self, db=DB, refresh=60.0):
+        self.root = archive_dir(db)
+        self.refresh = refresh
+        self._segments = {}
+        self._listed_at = -refresh
+        self._lock = threading.Lock()
+
+    def segments(self, start=0, end=2 ** 62):
+        with self._lock:
+            return self._list(start, end)
+
+    def _list(self, start, end):
+        if time.monotonic() - self._listed_at >= self.refresh:
+            names = os.listdir(self.root) if os.path.isdir(self.root) else []
+            built = {n: os.path.getmtime(os.path.join(self.root, n, "meta.json")) for n in names
+                     if os.path.exists(os.path.join(self.root, n, "meta.json"))}
+            # reopen rebuilt segments, forget removed ones
+            self._segments = {n: s for n, s in self._segments.items()
+                              if n in built and s.built == built[n]}
+            for n in built.keys() - self._segments.keys():
+                self._segments[n] = Segment(os.path.join(self.root, n))
+            self._listed_at = time.monotonic()
+        return [s for _, s in sorted(self._segments.items())
+                if s.end_epoch > start and s.start_epoch <= end]
+
+    def trend(self, product_id=None, start=0, end=2 ** 62, freq="month"):
+        """[(bucket_epoch, positive, neutral, negative)] over the archived weeks."""
+        totals = {}
+        for seg in self.segments(start, end):
+            sel = seg.rows(product_id, start, end)
+            ts, s = seg.col("ts")[sel], seg.col("sentiment")[sel]
+            keep = s >= 0
+            # one int64 key per (bucket, sentiment), counted in a single pass
+            keys = _bucket(ts[keep], freq) * 4 + s[keep]
+            uniq, counts = np.unique(keys, return_counts=True)
+            for k, c in zip(uniq.tolist(), counts.tolist()):
+                totals.setdefault(k // 4, [0, 0, 0])[k % 4] += c
+        return [(b, *v) for b, v in sorted(totals.items())]
+
+    def distribution(self, product_id=None, start=0, end=2 ** 62):
+        """{sentiment: count} over the archived weeks ('unlabeled' for NULL)."""
+        out = np.zeros(4, np.int64)
+        for seg in self.segments(start, end):
+            out += np.bincount(seg.col("sentiment")[seg.rows(product_id, start, end)] + 1, minlength=4)
+        return dict(zip(("unlabeled",) + SENTIMENTS, out.tolist()))
+
+    def terms(self, product_id=None, kind="keyword", start=0, end=2 ** 62, topk=20):
+        """Top [(term, count)] over the archived weeks, like the rollup-backed /keywords."""
+        dict_name = TERM_KINDS[kind]
+        total = Counter()
+        for seg in self.segments(start, end):
+            sel = seg.rows(product_id, start, end)
+            offs, codes = seg.col(kind + "_offsets"), seg.col(kind)
+            if isinstance(sel, slice):
+                picked = codes[offs[sel.start]:offs[sel.stop]]
+            else:
+                picked = codes[np.repeat(sel, np.diff(offs))]
+            if not len(picked):
+                continue
+            counts = np.bincount(picked)
+            labels = seg.labels(dict_name)
+            top = np.nonzero(counts)[0]
+            total.update(dict(zip((labels[i] for i in top), counts[top].tolist())))
+        return sorted(total.items(), key=lambda kv: (-kv[1], kv[0]))[:topk]
+
+    def stats(self):
+        segs = self.segments()
+        return {"segments": len(segs), "rows": sum(s.meta["rows"] for s in segs),
+                "first": segs[0].meta["name"] if segs else None, "last": segs[-1].meta["name"] if segs else None}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Build and query the columnar review archive.")
+    ap.add_argument("--db", default=DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--seal", action="store_true", help="run partitions.py seal first")
+    b.add_argument("--hot-weeks", type=int, default=2)
+    b.add_argument("--force", action="store_true", help="rewrite every segment")
+    for name in ("trend", "keywords"):
+        q = sub.add_parser(name)
+        q.add_argument("--product")
+        q.add_argument("--start", type=int, default=0, help="epoch seconds")
+        q.add_argument("--end", type=int, default=2 ** 62)
+    sub.choices["trend"].add_argument("--freq", choices=FREQS, default="month")
+    sub.choices["keywords"].add_argument("--kind", choices=tuple(TERM_KINDS), default="keyword")
+    sub.choices["keywords"].add_argument("--topk", type=int, default=20)
+    a = ap.parse_args()
+
+    if a.cmd == "build":
+        if a.seal:
+            partitions.seal(a.db, a.hot_weeks)
+        print(f"[archive] built {build(a.db, a.force)} segments")
+    else:
+        arc = Archive(a.db)
+        t0 = time.perf_counter()
+        if a.cmd == "trend":
+            for b_, p, u, n in arc.trend(a.product, a.start, a.end, a.freq):
+                print(f"{time.strftime('%Y-%m-%d', time.gmtime(b_))}  positive {p:>9,}  neutral {u:>9,}  negative {n:>9,}")
+        else:
+            for term, n in arc.terms(a.product, a.kind, a.start, a.end, a.topk):
+                print(f"{n:>9,}  {term}")
+        print(f"({time.perf_counter() - t0:.3f}s over {arc.stats()['rows']:,} archived rows)")
@@ -0,0 +1,173 @@
+// assets/live.js -- apply live.py deltas to the Review Monitor in the browser.
+//
+// The server callback renders a full view and writes {product, since, bucket,
+// window, topk, limit, recent} into the "live" store; connect() then opens
+// /live/<product>?since=<id> and every `delta` event is folded into the
+// figures and the table already on the page (via set_props, so dcc.Graph
+// redraws with Plotly.react). A `resync` event, or a delta the page can't
+// place, asks the server callback for a fresh render by bumping "refresh".
+(function () {
+    var source = null, state = null, lastResync = 0;
+    var SENTIMENTS = ["positive", "neutral", "negative"];
+
+    function iso(sec) {
+        return new Date(sec * 1000).toISOString().replace(".000Z", "Z");
+    }
+
+    function plot(id) {
+        var el = document.getElementById(id);
+        return el && el.querySelector(".js-plotly-plot");
+    }
+
+    // plotly.py 6 ships numeric columns base64-encoded; _fullData holds the decoded arrays
+    function values(gd, t, key) {
+        var i = gd.data.indexOf(t);
+        var full = gd._fullData && gd._fullData[i];
+        return Array.from((full && full[key]) || t[key] || []);
+    }
+
+    function h(type, children) {
+        return {type: type, namespace: "dash_html_components", props: {children: children}};
+    }
+
+    function resync() {
+        var now = Date.now();
+        if (now - lastResync < 5000) {
+            return;
+        }
+        lastResync = now;
+        if (source) {
+            source.close();
+            source = null;
+        }
+        dash_clientside.set_props("refresh", {n_intervals: now});
+    }
+
+    function applyTrend(rows) {
+        var gd = plot("trend_graph");
+        var traces = gd && gd.data ? gd.data.filter(function (t) { return SENTIMENTS.indexOf(t.name) >= 0; }) : [];
+        if (traces.length !== SENTIMENTS.length) {
+            return false;               // "no data" figure: needs a server render
+        }
+        var b = state.bucket * 60;
+        var oldest = iso(Date.now() / 1000 - state.window * 60);
+        var data = traces.map(function (t) {
+            return {t: t, x: values(gd, t, "x"), y: values(gd, t, "y")};
+        });
+        rows.forEach(function (r) {
+            var key = iso(Math.floor(r[0] / b) * b);
+            data.forEach(function (d) {
+                var i = d.x.indexOf(key);
+                if (i < 0) {
+                    // ISO strings sort by time; buckets usually land at the end
+                    i = d.x.length;
+                    while (i > 0 && d.x[i - 1] > key) {
+                        i--;
+                    }
+                    d.x.splice(i, 0, key);
+                    d.y.splice(i, 0, 0);
+                }
+                d.y[i] += r[1 + SENTIMENTS.indexOf(d.t.name)];
+            });
+        });
+        var figure = {
+            data: data.map(function (d) {
+                var keep = d.x.map(function (x) { return x >= oldest; });
+                return Object.assign({}, d.t, {
+                    x: d.x.filter(function (_, i) { return keep[i]; }),
+                    y: d.y.filter(function (_, i) { return keep[i]; })
+                });
+            }),
+            layout: gd.layout
+        };
+        dash_clientside.set_props("trend_graph", {figure: figure});
+        return true;
+    }
+
+    function applyKeywords(rows) {
+        var gd = plot("kw_graph");
+        var t = gd && gd.data && gd.data[0];
+        if (!t || !t.x) {
+            return false;
+        }
+        var counts = {}, ys = values(gd, t, "y");
+        values(gd, t, "x").forEach(function (k, i) { counts[k] = ys[i]; });
+        rows.forEach(function (r) { counts[r[0]] = (counts[r[0]] || 0) + r[1]; });
+        var top = Object.keys(counts).sort(function (a, b) {
+            return counts[b] - counts[a] || (a < b ? -1 : a > b ? 1 : 0);
+        }).slice(0, state.topk);
+        var figure = {
+            data: [Object.assign({}, t, {x: top, y: top.map(function (k) { return counts[k]; })})],
+            layout: gd.layout
+        };
+        dash_clientside.set_props("kw_graph", {figure: figure});
+        return true;
+    }
+
+    function applyRecent(rows) {
+        // rows come oldest first; the table is newest first
+        rows.forEach(function (r) { state.recent.unshift([r[1], r[2], r[3]]); });
+        state.recent = state.recent.slice(0, state.limit);
+        var body = state.recent.map(function (r) {
+            return h("Tr", [h("Td", r[0]), h("Td", r[1]), h("Td", r[2])]);
+        });
+        dash_clientside.set_props("table_div", {children: h("Table", [
+            h("Thead", h("Tr", [h("Th", "ts_utc"), h("Th", "sentiment"), h("Th", "snippet")])),
+            h("Tbody", body)
+        ])});
+    }
+
+    function applyAlerts(alerts) {
+        alerts.forEach(function (a) {
+            state.alerts.unshift(a.created_at_utc + "  " + a.rule + "  count=" + a.count);
+        });
+        state.alerts = state.alerts.slice(0, 20);
+        dash_clientside.set_props("alerts_list", {children: state.alerts.map(function (s) { return h("Li", s); })});
+    }
+
+    function onDelta(ev) {
+        var d = JSON.parse(ev.data);
+        var ok = true;
+        if (d.trend.length) {
+            ok = applyTrend(d.trend) && ok;
+        }
+        if (d.keywords.length) {
+            ok = applyKeywords(d.keywords) && ok;
+        }
+        if (d.reviews.length) {
+            applyRecent(d.reviews);
+        }
+        if (d.alerts.length) {
+            applyAlerts(d.alerts);
+        }
+        dash_clientside.set_props("live_status", {children: "live, last review #" + d.last_id});
+        if (!ok) {
+            resync();
+        }
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        live: {
+            connect: function (cfg) {
+                if (!cfg || !window.EventSource) {
+                    return "live updates off";
+                }
+                if (source) {
+                    source.close();
+                }
+                state = Object.assign({}, cfg, {
+                    recent: cfg.recent.slice(),
+                    alerts: state && state.product === cfg.product ? state.alerts : []
+                });
+                source = new EventSource("/live/" + encodeURIComponent(cfg.product) + "?since=" + cfg.since);
+                source.addEventListener("delta", onDelta);
+                source.addEventListener("resync", resync);
+                source.onerror = function () {
+                    // EventSource reconnects by itself, resuming from the last event id
+                    dash_clientside.set_props("live_status", {children: "reconnecting..."});
+                };
+                return "live since review #" + cfg.since;
+            }
+        }
+    });
+})();
@@ -1,9 +1,24 @@
 # backfill_from_csv.py
-import csv, json, sqlite3, datetime as dt, ast
+"""Bulk-load a CSV export (plain or .gz) into reviews.db or Postgres.
+
+    python backfill_from_csv.py [CSV] [--product P001] [--batch 50000] [--restart]
+    python backfill_from_csv.py data.csv.gz --db postgresql://user:pw@host/reviews
+
+Rows go in large batches through storage.py: executemany with load-time
+PRAGMAs and the ts_utc indexes dropped (rebuilt at the end) on SQLite,
+COPY FROM STDIN into the month partitions on Postgres. Progress is
+checkpointed per source file in the same transaction as each batch, so an
+interrupted load resumes where it stopped when re-run with the same CSV.
+"""
+import argparse, ast, calendar, csv, gzip, itertools, json, os, time, datetime as dt
+import storage
 
 DB, CSV = "reviews.db", "stream_output.csv"
 DEFAULT_PRODUCT = "P001"
+ALLOWED = {"positive", "neutral", "negative"}
+SNIFF_ROWS = 200
 
+# ---------- list columns ----------
 def parse_list(s):
     if s is None:
         return "[]"
@@ -27,42 +42,148 @@ def parse_list(s):
     # comma fallback
     return json.dumps([x.strip() for x in s.split(",") if x.strip()])
 
-conn = sqlite3.connect(DB)
-conn.execute("PRAGMA busy_timeout=30000;")
+def _as_json(loader):
+    def parse(s):
+        if s is None or not s.strip():
+            return "[]"
+        try:
+            v = loader(s)
+        except Exception:
+            return parse_list(s)
+        return json.dumps(v) if isinstance(v, list) else parse_list(s)
+    return parse
+
+def _json_passthrough(s):
+    # already a JSON list: store the cell as-is and skip the re-encode; still decoded,
+    # so a Python-repr or broken cell later in the file goes through parse_list
+    if s is None or not s.strip():
+        return "[]"
+    s = s.strip()
+    try:
+        if isinstance(json.loads(s), list):
+            return s
+    except ValueError:
+        pass
+    return parse_list(s)
+
+def _comma(s):
+    if s is None or not s.strip():
+        return "[]"
+    return json.dumps([x.strip() for x in s.split(",") if x.strip()])
+
+def sniff_list_format(samples):
+    """Pick one parser for a column from its first non-empty cells."""
+    cells = [s.strip() for s in samples if s and s.strip()]
+    if not cells:
+        return "json", _json_passthrough
 
-# generate increasing UTC timestamps for determinism
-now = dt.datetime.utcnow()
-delta = dt.timedelta(seconds=2)
+    def all_lists(loader):
+        for s in cells:
+            try:
+                if not isinstance(loader(s), list):
+                    return False
+            except Exception:
+                return False
+        return True
 
-with open(CSV, newline="", encoding="utf-8") as f:
-    rdr = csv.DictReader(f)
+    if all_lists(json.loads):
+        return "json", _json_passthrough
+    if all_lists(ast.literal_eval):
+        return "python", _as_json(ast.literal_eval)
+    return "comma", _comma
+
+def norm_sentiment(s):
+    s = (s or "").strip().lower()
+    return s if s in ALLOWED else None
+
+# ---------- input ----------
+def open_csv(path):
+    with open(path, "rb") as f:
+        gz = f.read(2) == b"\x1f\x8b"
+    if gz:
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    return open(path, newline="", encoding="utf-8")
+
+def chunks(it, size):
+    it = iter(it)
+    while True:
+        block = list(itertools.islice(it, size))
+        if not block:
+            return
+        yield block
+
+# ---------- load ----------
+def backfill(csv_path=CSV, db=DB, product_id=DEFAULT_PRODUCT, batch=50_000, restart=False):
+    source = os.path.abspath(csv_path)
+    store = storage.open_storage(db)
+    if restart:
+        store.clear_progress(source)
+
+    cp = store.load_progress(source)
+    if cp:
+        done, base_s = cp
+        now = dt.datetime.strptime(base_s, "%Y-%m-%dT%H:%M:%SZ")
+        print(f"Resuming {csv_path} after {done} rows")
+    else:
+        done, now = 0, dt.datetime.utcnow().replace(microsecond=0)
+        base_s = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    store.bulk_begin()
+
+    t0 = time.perf_counter()
     n = 0
-    for i, r in enumerate(rdr):
-        ts = (now - delta * (len(rdr.fieldnames) == 0))  # keep linter quiet
-        # recompute ts using row index to ensure monotonic order
-        ts = now - dt.timedelta(seconds=2*(len(list(())) if False else 0))  # dummy
-        ts = now - dt.timedelta(seconds=max(0, (len([0])*0)))               # dummy
-        ts = now - dt.timedelta(seconds=max(0, 2*i))                        # final
-
-        review_id = r.get("review_id")
-        review_text = r.get("reviewText") or r.get("review_text") or ""
-        sentiment = r.get("sentiment")
-        keywords = parse_list(r.get("keywords"))
-        entities = parse_list(r.get("entities"))
-
-        conn.execute("""
-        INSERT INTO reviews (review_id, product_id, review_text, sentiment, keywords, entities, ts_utc)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            review_id,
-            DEFAULT_PRODUCT,  # single product for this backfill
-            review_text,
-            sentiment,
-            keywords,
-            entities,
-            ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        ))
-        n += 1
-
-conn.commit(); conn.close()
-print(f"Inserted {n} rows from {CSV} with product_id='{DEFAULT_PRODUCT}'")
+    try:
+        with open_csv(csv_path) as f:
+            rdr = csv.DictReader(f)
+            rows = iter(rdr)
+            head = list(itertools.islice(rows, SNIFF_ROWS))
+            kw_fmt, kw_parse = sniff_list_format(r.get("keywords") for r in head)
+            en_fmt, en_parse = sniff_list_format(r.get("entities") for r in head)
+            print(f"list formats: keywords={kw_fmt} entities={en_fmt}")
+
+            rows = itertools.islice(itertools.chain(head, rows), done, None)
+            i = done
+            for block in chunks(rows, batch):
+                params = []
+                for r in block:
+                    # decreasing UTC timestamps (row i is 2*i s before the run's base time), for determinism
+                    ts = now - dt.timedelta(seconds=2 * i)
+                    params.append((
+                        r.get("review_id"),
+                        product_id,
+                        r.get("reviewText") or r.get("review_text") or "",
+                        norm_sentiment(r.get("sentiment")),
+                        kw_parse(r.get("keywords")),
+                        en_parse(r.get("entities")),
+                        ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        calendar.timegm(ts.timetuple()),
+                    ))
+                    i += 1
+                store.insert_reviews(params, progress=(source, i, base_s))
+                n += len(params)
+                el = time.perf_counter() - t0
+                print(f"  {i} rows checkpointed ({n / el:.0f} rows/s)")
+    except BaseException:
+        print(f"Load interrupted after {done + n} rows; re-run to resume and rebuild indexes.")
+        store.bulk_end(rebuild=False)
+        store.close()
+        raise
+
+    print("Rebuilding indexes ..." if store.backend == "sqlite" else "Analyzing ...")
+    t1 = time.perf_counter()
+    store.bulk_end()
+    print(f"  done in {time.perf_counter() - t1:.1f}s")
+    store.close()
+    print(f"Inserted {n} rows from {csv_path} with product_id='{product_id}' "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return n
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Bulk-load a review CSV (plain or gzip) into SQLite or Postgres.")
+    ap.add_argument("csv", nargs="?", default=CSV)
+    ap.add_argument("--db", default=DB, help="SQLite path or postgresql:// URL")
+    ap.add_argument("--product", default=DEFAULT_PRODUCT, help="product_id for every row")
+    ap.add_argument("--batch", type=int, default=50_000, help="rows per executemany/commit")
+    ap.add_argument("--restart", action="store_true", help="ignore any checkpoint for this CSV")
+    a = ap.parse_args()
+    backfill(a.csv, db=a.db, product_id=a.product, batch=a.batch, restart=a.restart)
@@ -0,0 +1,81 @@
+# bench/alert_rules.py
+"""Cycle time of the alert_worker rule engine for many products.
+
+    python bench/alert_rules.py --products 10000 --history 36 --fill 0.5
+
+Builds a throwaway database with synthetic sentiment_minute/term_minute rows
+(`fill` = share of minutes with any activity per product), then times
+RuleEngine.load (SQL -> arrays), RuleEngine.evaluate (all rules, all
+products) and a full cycle including the alert writes.
+"""
+import argparse, os, random, sqlite3, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import init_db
+from alert_worker import RuleEngine
+
+def populate(conn, products, minutes, fill, keywords, now, seed=7):
+    rnd = random.Random(seed)
+    end = now // 60 * 60
+    sent, terms = [], []
+    for p in range(products):
+        pid = f"P{p:06d}"
+        spike = rnd.random() < 0.01          # ~1% of products misbehave in the last 10 minutes
+        for m in range(minutes):
+            if rnd.random() > fill:
+                continue
+            bucket = end - m * 60
+            neg = rnd.randint(0, 1) + (6 if spike and m < 10 else 0)
+            sent.append((pid, bucket, rnd.randint(0, 4), rnd.randint(0, 2), neg))
+            for kw in keywords:
+                n = (3 if spike and m < 10 else 0) + (rnd.random() < 0.1)
+                if n:
+                    terms.append((pid, "keyword", bucket, kw, n))
+    with conn:
+        conn.executemany("INSERT INTO sentiment_minute VALUES (?,?,?,?,?)", sent)
+        conn.executemany("INSERT INTO term_minute VALUES (?,?,?,?,?)", terms)
+        # normally maintained by the reviews triggers; the rule engine walks it
+        conn.executemany("INSERT INTO product_watermark VALUES (?, 1)",
+                         [(f"P{p:06d}",) for p in range(products)])
+    return len(sent), len(terms)
+
+def timed(fn, repeat):
+    xs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        xs.append(time.perf_counter() - t0)
+    return statistics.median(xs) * 1000, out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--products", type=int, default=10_000)
+    ap.add_argument("--history", type=int, default=36, help="10-minute buckets per product")
+    ap.add_argument("--fill", type=float, default=0.5)
+    ap.add_argument("--keywords", default="refund,broken")
+    ap.add_argument("--repeat", type=int, default=5)
+    a = ap.parse_args()
+
+    keywords = a.keywords.split(",")
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as d:
+        conn = sqlite3.connect(os.path.join(d, "bench_rules.db"))
+        init_db.init(conn)
+        t0 = time.perf_counter()
+        n_sent, n_terms = populate(conn, a.products, a.history * 10, a.fill, keywords, now)
+        print(f"populated {n_sent} sentiment_minute + {n_terms} term_minute rows in {time.perf_counter() - t0:.1f}s")
+
+        eng = RuleEngine(conn, history=a.history, keywords=keywords)
+        load_ms, (products, counts, kw) = timed(lambda: eng.load(now), a.repeat)
+        eval_ms, hits = timed(lambda: eng.evaluate(counts, kw), a.repeat)
+        t0 = time.perf_counter()
+        written = eng.cycle(now)
+        cycle_ms = (time.perf_counter() - t0) * 1000
+        print(f"products={len(products)} arrays={counts.shape} keywords={kw.shape}")
+        print(f"load      {load_ms:8.1f} ms (median of {a.repeat})")
+        print(f"evaluate  {eval_ms:8.1f} ms (median of {a.repeat}), {len(hits)} hits")
+        print(f"cycle     {cycle_ms:8.1f} ms, {written} alerts written")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
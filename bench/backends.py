@@ -0,0 +1,95 @@
+# bench/backends.py
+"""SQLite vs Postgres through storage.py: ingest rows/s and the alert rule.
+
+    python bench/backends.py --sqlite /tmp/bench/reviews.db --rows 200000
+    python bench/backends.py --pg postgresql://user:pw@host/reviews --rows 200000 --writers 8
+    python bench/backends.py --sqlite /tmp/bench/reviews.db --pg postgresql://... --batch 100 --writers 4
+
+Each backend gets the same synthetic reviews (spread over the last 90 days,
+so Postgres writes into several month partitions), split across `--writers`
+threads with one store (connection) each, committed `--batch` rows at a
+time: small batches look like BatchWriter under live traffic, large ones like
+a backfill. Then the neg>=5_in_10m rule (store.raise_alerts) is timed
+`--repeat` times. Point both at empty databases; the schema is created first.
+"""
+import argparse, os, random, statistics, sys, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import storage
+
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+TEXTS = ["Stopped charging after a week.", "Great value, works as described.",
+         "Arrived late but fine.", "Battery drains overnight, asking for a refund."]
+SENTIMENTS = ("positive", "neutral", "negative")
+DAYS = 90
+
+def make_rows(n, products, seed=7):
+    rnd = random.Random(seed)
+    now = int(time.time())
+    rows = []
+    for i in range(n):
+        # a tenth of the rows land in the last 10 minutes so the rule has work to do
+        t = now - (rnd.randrange(600) if i % 10 == 0 else rnd.randrange(DAYS * 86400))
+        rows.append((f"sb-{i}", f"B{rnd.randrange(products):05d}", rnd.choice(TEXTS), rnd.choice(SENTIMENTS),
+                     '["battery", "refund"]', '["Amazon"]', time.strftime(ISO, time.gmtime(t)), t))
+    return rows
+
+def writer(target, rows, batch, lat):
+    store = storage.open_storage(target)
+    try:
+        for i in range(0, len(rows), batch):
+            t0 = time.perf_counter()
+            store.insert_reviews(rows[i:i + batch])
+            lat.append(time.perf_counter() - t0)
+    finally:
+        store.close()
+
+def bench(target, rows, batch, writers, repeat):
+    store = storage.open_storage(target)
+    store.init()
+    name = store.backend
+    lats = [[] for _ in range(writers)]
+    threads = [threading.Thread(target=writer, args=(target, rows[k::writers], batch, lats[k]))
+               for k in range(writers)]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+    lat = sorted(x for xs in lats for x in xs)
+    print(f"{name:8s} ingest  {len(rows):,} rows, batch {batch}, writers {writers}: "
+          f"{len(rows) / wall:,.0f} rows/s  commit p50 {statistics.median(lat) * 1000:.1f} ms  "
+          f"p99 {lat[min(len(lat) - 1, int(0.99 * (len(lat) - 1)))] * 1000:.1f} ms")
+
+    now = int(time.time())
+    times, fired = [], 0
+    for k in range(repeat):
+        t0 = time.perf_counter()
+        # distinct rule names so the cooldown doesn't hide the insert after the first pass
+        fired = len(store.raise_alerts(f"bench-{k}", 5, now - 600, now, now - 600))
+        times.append(time.perf_counter() - t0)
+    print(f"{name:8s} alerts  {fired} products over threshold: "
+          f"p50 {statistics.median(times) * 1000:.1f} ms  max {max(times) * 1000:.1f} ms")
+    store.close()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sqlite", help="SQLite path")
+    ap.add_argument("--pg", help="postgresql:// URL")
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--products", type=int, default=500)
+    ap.add_argument("--batch", type=int, default=1000, help="rows per commit")
+    ap.add_argument("--writers", type=int, default=1, help="concurrent writer threads")
+    ap.add_argument("--repeat", type=int, default=20, help="alert rule passes")
+    a = ap.parse_args()
+    if not (a.sqlite or a.pg):
+        ap.error("give --sqlite and/or --pg")
+
+    rows = make_rows(a.rows, a.products)
+    for target in (a.sqlite, a.pg):
+        if target:
+            bench(target, rows, a.batch, a.writers, a.repeat)
+
+if __name__ == "__main__":
+    main()
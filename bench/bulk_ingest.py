@@ -0,0 +1,81 @@
+# bench/bulk_ingest.py
+"""Concurrent NDJSON uploaders against POST /reviews/bulk.
+
+    uvicorn app:app --port 8000 &
+    python bench/bulk_ingest.py --url http://127.0.0.1:8000 --uploaders 16 --rows 5000 --requests 20
+
+Each uploader sends `--requests` bodies of `--rows` reviews over one
+keep-alive connection (chunked, as a streaming producer would). Reports
+rows/s overall, per-request latency percentiles, and any non-200 response or
+rejected row, e.g. a `database is locked` surfacing as a 500.
+"""
+import argparse, http.client, json, random, statistics, threading, time
+from urllib.parse import urlsplit
+
+TEXTS = ["Stopped charging after a week.", "Great value, works as described.",
+         "Arrived late but fine.", "Battery drains overnight, asking for a refund."]
+
+def body(rows, uploader, seq):
+    now = int(time.time())
+    for i in range(rows):
+        yield (json.dumps({"review_id": f"bulk-{uploader}-{seq}-{i}", "product_id": f"B{random.randrange(200):04d}",
+                           "review_text": random.choice(TEXTS), "ts_epoch": now - random.randrange(3600)})
+               + "\n").encode()
+
+def uploader(base, k, n_requests, rows, out):
+    u = urlsplit(base)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=120)
+    for seq in range(n_requests):
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", "/reviews/bulk", body=body(rows, k, seq),
+                         headers={"Content-Type": "application/x-ndjson"}, encode_chunked=True)
+            resp = conn.getresponse()
+            payload = resp.read()
+            status = resp.status
+        except Exception as ex:
+            status, payload = 0, str(ex).encode()
+            conn.close()
+            conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=120)
+        dt = time.perf_counter() - t0
+        if status == 200:
+            r = json.loads(payload)
+            out.append((dt, r["accepted"], r["rejected"], None))
+        else:
+            out.append((dt, 0, 0, f"{status}: {payload[:200]!r}"))
+    conn.close()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--uploaders", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=10, help="bodies per uploader")
+    ap.add_argument("--rows", type=int, default=5000, help="reviews per body")
+    a = ap.parse_args()
+
+    results = [[] for _ in range(a.uploaders)]
+    threads = [threading.Thread(target=uploader, args=(a.url, k, a.requests, a.rows, results[k]))
+               for k in range(a.uploaders)]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+
+    flat = [r for rs in results for r in rs]
+    lat = sorted(r[0] for r in flat)
+    accepted = sum(r[1] for r in flat)
+    rejected = sum(r[2] for r in flat)
+    errors = [r[3] for r in flat if r[3]]
+    print(f"uploaders={a.uploaders} requests={len(flat)} rows/request={a.rows}")
+    print(f"accepted {accepted:,}  rejected {rejected:,}  failed requests {len(errors)}")
+    print(f"throughput {accepted / wall:,.0f} rows/s over {wall:.1f}s")
+    if lat:
+        print(f"request latency p50 {statistics.median(lat) * 1000:.0f} ms  "
+              f"p99 {lat[min(len(lat) - 1, int(0.99 * (len(lat) - 1)))] * 1000:.0f} ms")
+    for e in errors[:5]:
+        print("  error:", e)
+
+if __name__ == "__main__":
+    main()
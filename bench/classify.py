@@ -0,0 +1,92 @@
+# bench/classify.py
+"""Sentiment model throughput and peak RSS for batches of 1, 100 and 10k texts.
+
+    python bench/classify.py                       # synthetic training data
+    python bench/classify.py --csv reviews.csv     # real labeled reviews
+
+Trains a TF-IDF and a hashing model into a temp directory, then, for every
+(model, batch size) pair, starts a fresh process that loads the artifact and
+classifies `--texts` texts in batches of that size. Peak RSS is the child's
+VmHWM (Linux), so each row reflects only that model and batch size.
+"""
+import argparse, multiprocessing as mp, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import sentiment_model
+
+POS = "great excellent love perfect amazing sturdy fast recommend happy works".split()
+NEG = "broken terrible refund awful stopped returned cheap disappointed late bad".split()
+NEU = "okay average fine arrived package box color size expected normal".split()
+FILLER = ("the it this product battery screen charger cable case sound price quality "
+          "shipping seller phone speaker after week month day use".split())
+
+def synthetic(n, seed=1):
+    rnd = random.Random(seed)
+    texts, labels = [], []
+    for _ in range(n):
+        label = rnd.choice(sentiment_model.LABELS)
+        words = {"positive": POS, "negative": NEG, "neutral": NEU}[label]
+        toks = [rnd.choice(FILLER) for _ in range(rnd.randint(8, 30))]
+        for _ in range(rnd.randint(1, 3)):
+            toks.insert(rnd.randrange(len(toks)), rnd.choice(words))
+        # unique-ish tokens so the TF-IDF vocabulary keeps growing with the data
+        toks.append(f"sku{rnd.randrange(n)}")
+        texts.append(" ".join(toks))
+        labels.append(label)
+    return texts, labels
+
+def peak_rss_mib():
+    # VmHWM belongs to the process image; ru_maxrss would carry over the parent's peak across exec
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def measure(path, texts, batch, out):
+    t0 = time.perf_counter()
+    model = sentiment_model.SentimentModel(path)
+    load_s = time.perf_counter() - t0
+    lat = []
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), batch):
+        t1 = time.perf_counter()
+        model.predict(texts[i:i + batch])
+        lat.append(time.perf_counter() - t1)
+    wall = time.perf_counter() - t0
+    lat.sort()
+    out.put({
+        "load_ms": load_s * 1000,
+        "docs_per_sec": len(texts) / wall,
+        "p50_batch_ms": lat[len(lat) // 2] * 1000,
+        "peak_rss_mib": peak_rss_mib(),
+    })
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--csv", help="labeled CSV (reviewText, sentiment); synthetic data if omitted")
+    ap.add_argument("--train-rows", type=int, default=50_000, help="synthetic training rows")
+    ap.add_argument("--texts", type=int, default=20_000, help="texts classified per measurement")
+    ap.add_argument("--batches", default="1,100,10000")
+    a = ap.parse_args()
+
+    texts, labels = sentiment_model.read_labeled(a.csv) if a.csv else synthetic(a.train_rows)
+    probe = (texts * (a.texts // max(len(texts), 1) + 1))[:a.texts]
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as d:
+        for features in ("tfidf", "hashing"):
+            path = sentiment_model.train(texts, labels, features, out_dir=d)
+            size_mib = os.path.getsize(path) / 2 ** 20
+            for batch in map(int, a.batches.split(",")):
+                n = min(a.texts, 2_000) if batch == 1 else a.texts   # batch=1 is slow; fewer calls
+                q = ctx.Queue()
+                p = ctx.Process(target=measure, args=(path, probe[:n], batch, q))
+                p.start()
+                r = q.get()
+                p.join()
+                print(f"{features:8s} artifact {size_mib:6.1f} MiB  batch {batch:6d}  "
+                      f"{r['docs_per_sec']:10,.0f} docs/s  p50/batch {r['p50_batch_ms']:8.2f} ms  "
+                      f"load {r['load_ms']:7.1f} ms  peak RSS {r['peak_rss_mib']:7.1f} MiB")
+
+if __name__ == "__main__":
+    main()
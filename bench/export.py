@@ -0,0 +1,108 @@
+# bench/export.py
+"""Export throughput (MB/s) of GET /reviews/{product_id}/export.
+
+    python bench/export.py build --db /tmp/export/reviews.db --rows 5000000
+    (cd /tmp/export && uvicorn app:app --app-dir /path/to/repo --port 8000) &
+    python bench/export.py run --url http://127.0.0.1:8000 --format ndjson
+    python bench/export.py run --url http://127.0.0.1:8000 --format csv --sentiment negative
+
+`build` writes one product with `--rows` reviews (schema + indexes from
+init_db, rollup triggers skipped; they don't matter for an export). `run`
+streams the export over one connection, discards the body, and reports
+bytes, rows (lines), MB/s, time to first byte and the client's peak RSS, which
+should stay flat regardless of row count.
+"""
+import argparse, http.client, os, random, sqlite3, sys, time
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import init_db
+
+PRODUCT = "B00EXPORT0"
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+TEXTS = ["Stopped charging after a week.", "Great value, works as described.",
+         "Arrived late but fine, the box was dented and the manual missing.",
+         "Battery drains overnight, asking for a refund.",
+         'Sound is "okay", bass is weak; returned it.']
+SENTIMENTS = ("positive", "neutral", "negative")
+
+def build(db, rows, batch=100_000):
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    conn.execute(init_db.REVIEWS)
+    rnd = random.Random(7)
+    t_end = int(time.time())
+    t = t_end - rows            # about one review per second, ending now
+    t0 = time.perf_counter()
+    for i in range(0, rows, batch):
+        chunk = []
+        for j in range(i, min(rows, i + batch)):
+            t += rnd.randrange(2)
+            chunk.append((f"exp-{j}", PRODUCT, rnd.choice(TEXTS), rnd.choice(SENTIMENTS),
+                          '["battery", "refund"]', '["Amazon"]',
+                          time.strftime(ISO, time.gmtime(t)), t))
+        with conn:
+            conn.executemany("INSERT INTO reviews (review_id, product_id, review_text, sentiment, keywords, "
+                             "entities, ts_utc, ts_epoch) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", chunk)
+        print(f"[build] {min(rows, i + batch):,} rows")
+    # indexes after the load: one sorted build instead of per-row maintenance
+    for ddl in init_db.INDEXES.values():
+        conn.execute(ddl)
+    conn.commit()
+    conn.close()
+    print(f"[build] {rows:,} rows for {PRODUCT} in {time.perf_counter() - t0:.1f}s -> {db}")
+
+def peak_rss_mib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def run(base, product, fmt, sentiment, read_bytes=1 << 16):
+    u = urlsplit(base)
+    query = [("format", fmt)] + [("sentiment", s) for s in sentiment or ()]
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=600)
+    t0 = time.perf_counter()
+    conn.request("GET", f"/reviews/{product}/export?{urlencode(query)}")
+    resp = conn.getresponse()
+    if resp.status != 200:
+        sys.exit(f"{resp.status}: {resp.read()[:200]!r}")
+    total, lines, ttfb = 0, 0, None
+    while True:
+        data = resp.read1(read_bytes)
+        if not data:
+            break
+        if ttfb is None:
+            ttfb = time.perf_counter() - t0
+        total += len(data)
+        lines += data.count(b"\n")
+    wall = time.perf_counter() - t0
+    conn.close()
+    # CSV has a header line, and quoted review text may contain newlines
+    rows = lines - 1 if fmt == "csv" else lines
+    print(f"{fmt:6s} {rows:,} rows  {total / 2 ** 20:,.1f} MiB in {wall:.1f}s  "
+          f"{total / 2 ** 20 / wall:,.1f} MiB/s  {rows / wall:,.0f} rows/s  "
+          f"first byte {ttfb * 1000 if ttfb else float('nan'):.0f} ms  client peak RSS {peak_rss_mib():.0f} MiB")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="write a database with one large product")
+    b.add_argument("--db", default="reviews.db")
+    b.add_argument("--rows", type=int, default=5_000_000)
+    r = sub.add_parser("run", help="time one export against a running API")
+    r.add_argument("--url", default="http://127.0.0.1:8000")
+    r.add_argument("--product", default=PRODUCT)
+    r.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    r.add_argument("--sentiment", action="append", help="repeatable filter")
+    a = ap.parse_args()
+
+    if a.cmd == "build":
+        build(a.db, a.rows)
+    else:
+        run(a.url, a.product, a.format, a.sentiment)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# bench/loadtest_api.py
+"""Closed-loop HTTP load test: p50/p99 latency and requests/s per endpoint.
+
+Compare the asyncpg main.py with the previous psycopg2 one on the same local
+Postgres database:
+
+    git show <rev-before-asyncpg>:main.py > main_sync.py
+    uvicorn main_sync:app --port 8001 --workers 1 &
+    uvicorn main:app      --port 8000 --workers 1 &
+    python bench/loadtest_api.py --target sync=http://127.0.0.1:8001 \\
+                                 --target async=http://127.0.0.1:8000 \\
+                                 --products P001,P002 --concurrency 32 --duration 20
+
+Each worker thread keeps one HTTP/1.1 keep-alive connection and issues
+requests back to back, cycling through endpoints and products.
+"""
+import argparse, http.client, itertools, json, statistics, threading, time
+from urllib.parse import urlsplit
+
+ENDPOINTS = {
+    "reviews":         "/reviews/{p}?limit=50",
+    "sentiment_trend": "/sentiment_trend/{p}",
+    "keywords":        "/keywords/{p}",
+}
+
+def percentile(xs, q):
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+def worker(base, paths, deadline, out, errors):
+    u = urlsplit(base)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+    for name, path in paths:
+        if time.perf_counter() >= deadline:
+            break
+        t0 = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status < 400
+        except Exception:
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+        dt = time.perf_counter() - t0
+        if ok:
+            out.setdefault(name, []).append(dt)
+        else:
+            errors[name] = errors.get(name, 0) + 1
+    conn.close()
+
+def run(base, products, endpoints, concurrency, duration, warmup=2.0):
+    cycle = [(n, ENDPOINTS[n].format(p=p)) for n in endpoints for p in products]
+    # warm caches/pools before measuring
+    worker(base, itertools.islice(itertools.cycle(cycle), len(cycle) * 2),
+           time.perf_counter() + warmup, {}, {})
+
+    deadline = time.perf_counter() + duration
+    results = [({}, {}) for _ in range(concurrency)]
+    threads = []
+    t0 = time.perf_counter()
+    for i, (out, err) in enumerate(results):
+        paths = itertools.islice(itertools.cycle(cycle), i, None)
+        th = threading.Thread(target=worker, args=(base, paths, deadline, out, err), daemon=True)
+        th.start()
+        threads.append(th)
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+
+    report = {}
+    for name in endpoints:
+        lat = [x for out, _ in results for x in out.get(name, [])]
+        errs = sum(err.get(name, 0) for _, err in results)
+        report[name] = {
+            "requests": len(lat),
+            "errors": errs,
+            "rps": round(len(lat) / wall, 1),
+            "p50_ms": round(1000 * percentile(lat, 0.50), 2),
+            "p99_ms": round(1000 * percentile(lat, 0.99), 2),
+            "mean_ms": round(1000 * statistics.fmean(lat), 2) if lat else 0.0,
+        }
+    total = sum(r["requests"] for r in report.values())
+    report["_all"] = {"requests": total, "rps": round(total / wall, 1)}
+    return report
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--target", action="append", required=True, help="name=base_url (repeatable)")
+    ap.add_argument("--products", default="P001")
+    ap.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=15.0, help="seconds per target")
+    ap.add_argument("--json", help="write results to this file")
+    a = ap.parse_args()
+
+    products = a.products.split(",")
+    endpoints = a.endpoints.split(",")
+    results = {}
+    for t in a.target:
+        name, _, base = t.partition("=")
+        print(f"== {name} ({base}) c={a.concurrency} {a.duration:.0f}s")
+        results[name] = rep = run(base, products, endpoints, a.concurrency, a.duration)
+        for ep in endpoints:
+            r = rep[ep]
+            print(f"  {ep:16s} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:8.2f} ms  "
+                  f"p99 {r['p99_ms']:8.2f} ms  errors {r['errors']}")
+        print(f"  {'total':16s} {rep['_all']['rps']:8.1f} req/s")
+    if a.json:
+        with open(a.json, "w") as f:
+            json.dump({"concurrency": a.concurrency, "duration_s": a.duration, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# bench/replay.py
+"""Ingest-to-visible latency of a replayed review stream, per rate step.
+
+    uvicorn app:app --port 8000 &                  # API under test, serving reviews.db
+    python alert_worker.py --stream &              # optional, for --alerts
+    python bench/replay.py stream_output.csv --rate 50 --step-seconds 60
+    python bench/replay.py dump.json.gz --ramp 50:2000:6 --step-seconds 30 --alerts
+    python bench/replay.py stream_output.csv --burst 100:2000:20:2 --step-seconds 60
+
+Rows from the dump are replayed through ingest_worker.loop_from_csv into
+`--db` via one BatchWriter, paced to a fixed rate, a ramp of constant-rate
+steps, or bursts (`base:peak:period:burst` = `peak` rows/s for `burst` seconds
+of every `period`). Each step writes to a fresh product, and every row is
+stamped with its produce time. While a step runs (and until it drains),
+`--probes` threads poll /sentiment_trend/{product} on `--url`; one thread reads
+the dashboard's ReviewStore snapshot; with `--alerts` one polls the alerts table.
+Row k counts as visible at the first poll that sees at least k rows, so the
+latency is produce -> first poll showing it, and the poll interval bounds the
+resolution. The alert latency is measured from the negative that crossed
+the neg>=5_in_10m threshold to the first poll that finds the alert.
+
+A step is saturated when the producer fell more than 5% short of the target
+rate (writer backpressure), rows were still invisible after `--drain`
+seconds, or latency kept growing through the step (last-quarter p50 over
+twice the first-quarter p50). The saturation point is the first such step.
+"""
+import argparse, http.client, json, os, sqlite3, statistics, sys, threading, time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import alert_worker
+from ingest_worker import BatchWriter, loop_from_csv, read_rows
+from review_store import ReviewStore
+from storage import is_postgres
+
+def percentile(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))] if xs else float("nan")
+
+# ---------- rate schedules: elapsed seconds -> target rows/s ----------
+def fixed(rate):
+    return lambda t: rate
+
+def bursty(base, peak, period, burst):
+    return lambda t: peak if t % period < burst else base
+
+def schedule(a):
+    """[(label, mean target rows/s, rate function)], one entry per step."""
+    if a.ramp:
+        lo, hi, n = a.ramp.split(":")
+        lo, hi, n = float(lo), float(hi), int(n)
+        rates = [lo + (hi - lo) * k / max(n - 1, 1) for k in range(n)]
+        return [(f"{r:.0f}/s", r, fixed(r)) for r in rates]
+    if a.burst:
+        base, peak, period, burst = map(float, a.burst.split(":"))
+        mean = (peak * burst + base * (period - burst)) / period
+        return [(f"burst {base:.0f}/{peak:.0f}/s", mean, bursty(base, peak, period, burst))]
+    return [(f"{a.rate:.0f}/s", a.rate, fixed(a.rate))]
+
+# ---------- probes ----------
+def api_probe(url, path, stop, obs, errors, interval):
+    u = urlsplit(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+    while not stop.is_set():
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            body = resp.read()
+            if resp.status == 200:
+                obs.append((time.time(), sum(b["positive"] + b["neutral"] + b["negative"] for b in json.loads(body))))
+            else:
+                errors.append(resp.status)
+        except (OSError, http.client.HTTPException) as ex:
+            errors.append(str(ex))
+            conn.close()
+            conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+        stop.wait(interval)
+    conn.close()
+
+def dash_probe(store, product, stop, obs, interval):
+    # the same snapshot read the dashboard callback does
+    while not stop.is_set():
+        trend = store.read(product, 60, bucket_minutes=60)["trend"]
+        obs.append((time.time(), sum(p + u + n for _, p, u, n in trend)))
+        stop.wait(interval)
+
+def alert_probe(db, product, stop, seen, interval):
+    conn = sqlite3.connect(Path(db).resolve().as_uri() + "?mode=ro", uri=True)
+    conn.execute("PRAGMA busy_timeout=30000;")
+    while not stop.is_set() and seen[0] is None:
+        if conn.execute("SELECT 1 FROM alerts WHERE product_id = ? LIMIT 1", (product,)).fetchone():
+            seen[0] = time.time()
+        stop.wait(interval)
+    conn.close()
+
+def visibility(produced, obs):
+    """Per-row latency: produce time -> first observation counting at least that many rows."""
+    lat, k, best = [], 0, 0
+    for t, count in sorted(obs):
+        best = max(best, count)
+        while k < len(produced) and best > k:
+            lat.append(t - produced[k])
+            k += 1
+    return lat, len(produced) - k
+
+def threshold_crossing(negatives):
+    """Produce time of the negative that completes THRESHOLD within WINDOW_SEC, or None."""
+    n = alert_worker.THRESHOLD
+    for j in range(n - 1, len(negatives)):
+        if negatives[j] - negatives[j - n + 1] <= alert_worker.WINDOW_SEC:
+            return negatives[j]
+    return None
+
+def summarize(lat):
+    if not lat:
+        return {"n": 0}
+    return {"n": len(lat), "p50_ms": round(percentile(lat, 0.5) * 1000, 1),
+            "p99_ms": round(percentile(lat, 0.99) * 1000, 1), "max_ms": round(max(lat) * 1000, 1)}
+
+# ---------- one step ----------
+def run_step(a, rows, writer, product, label, target, rate):
+    produced, negatives = [], []
+
+    def stamp(r, t):
+        produced.append(t)
+        if r["sentiment"] == "negative":
+            negatives.append(t)
+
+    stop = threading.Event()
+    api_obs, api_err, dash_obs, alert_seen, depth = [], [], [], [None], [0]
+    path = f"/sentiment_trend/{product}?{a.trend_query}"
+    threads = [threading.Thread(target=api_probe, args=(a.url, path, stop, api_obs, api_err, a.poll))
+               for _ in range(a.probes)]
+    sqlite = not is_postgres(a.db)
+    if sqlite:
+        store = ReviewStore(a.db)
+        threads.append(threading.Thread(target=dash_probe, args=(store, product, stop, dash_obs, a.poll)))
+    if sqlite and a.alerts:
+        threads.append(threading.Thread(target=alert_probe, args=(a.db, product, stop, alert_seen, a.poll)))
+
+    def queue_depth():
+        while not stop.is_set():
+            depth[0] = max(depth[0], writer.q.qsize())
+            stop.wait(0.05)
+    threads.append(threading.Thread(target=queue_depth))
+    for th in threads:
+        th.daemon = True
+        th.start()
+
+    t0 = time.time()
+    loop_from_csv(product_id=product, writer=writer, rate=rate, duration=a.step_seconds, stamp=stamp, rows=rows)
+    elapsed = time.time() - t0
+
+    # drain: wait for the last row on every probe (and the alert, if one is due)
+    crossing = threshold_crossing(negatives) if a.alerts and sqlite else None
+    deadline = time.time() + a.drain
+    while time.time() < deadline:
+        seen_api = max((c for _, c in api_obs), default=0) >= len(produced)
+        seen_dash = not sqlite or max((c for _, c in dash_obs), default=0) >= len(produced)
+        if seen_api and seen_dash and (crossing is None or alert_seen[0] is not None):
+            break
+        time.sleep(a.poll)
+    stop.set()
+    for th in threads:
+        th.join()
+
+    api_lat, api_missing = visibility(produced, api_obs)
+    dash_lat, dash_missing = visibility(produced, dash_obs)
+    achieved = len(produced) / elapsed
+    q = max(len(api_lat) // 4, 1)
+    early, late = statistics.median(api_lat[:q]) if api_lat else 0, statistics.median(api_lat[-q:]) if api_lat else 0
+    reasons = []
+    if achieved < 0.95 * target:
+        reasons.append("producer behind")
+    if api_missing or dash_missing:
+        reasons.append("not drained")
+    if late > 2 * early and late - early > 0.25:
+        reasons.append("latency growing")
+    return {
+        "step": label, "product": product, "target_rows_per_s": round(target, 1),
+        "achieved_rows_per_s": round(achieved, 1), "rows": len(produced), "max_queue_depth": depth[0],
+        "api": {**summarize(api_lat), "not_visible": api_missing, "errors": len(api_err)},
+        "dashboard": {**summarize(dash_lat), "not_visible": dash_missing} if sqlite else None,
+        "alert_ms": round((alert_seen[0] - crossing) * 1000, 1) if crossing and alert_seen[0] else None,
+        "alert_expected": crossing is not None,
+        "saturated": bool(reasons), "why": reasons,
+    }
+
+def fmt(s):
+    api, dash = s["api"], s["dashboard"] or {}
+    alert = (f"{s['alert_ms']:8.0f}" if s["alert_ms"] is not None
+             else ("  missed" if s["alert_expected"] else "       -"))
+    return (f"{s['step']:>22s} {s['achieved_rows_per_s']:9.1f} {s['max_queue_depth']:7d} "
+            f"{api.get('p50_ms', float('nan')):9.1f} {api.get('p99_ms', float('nan')):9.1f} "
+            f"{dash.get('p50_ms', float('nan')):9.1f} {dash.get('p99_ms', float('nan')):9.1f} {alert}  "
+            f"{', '.join(s['why']) or 'ok'}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("dump", help="CSV, JSON array or JSON lines (.gz ok), as ingest_worker reads")
+    ap.add_argument("--db", default="reviews.db", help="database the API and dashboard read")
+    ap.add_argument("--url", default="http://127.0.0.1:8000", help="running API")
+    ap.add_argument("--trend-query", default="window_minutes=60&bucket_minutes=60",
+                    help="query string for /sentiment_trend (main.py: hours=1&bucket_minutes=60)")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--rate", type=float, default=50, help="fixed rows/s")
+    mode.add_argument("--ramp", help="start:end:steps rows/s, one constant-rate step each")
+    mode.add_argument("--burst", help="base:peak:period_s:burst_s")
+    ap.add_argument("--step-seconds", type=float, default=30)
+    ap.add_argument("--drain", type=float, default=30, help="max seconds to wait for a step to become visible")
+    ap.add_argument("--probes", type=int, default=4, help="concurrent API pollers")
+    ap.add_argument("--poll", type=float, default=0.05, help="seconds between polls per probe")
+    ap.add_argument("--alerts", action="store_true", help="also wait for and time the alert (needs alert_worker running)")
+    ap.add_argument("--model", action="store_true", help="label rows without a sentiment with the trained model")
+    ap.add_argument("--out", help="write the per-step results as JSON")
+    a = ap.parse_args()
+
+    rows = read_rows(a.dump, model=a.model)
+    if not rows:
+        sys.exit(f"no usable rows in {a.dump}")
+    run_id = int(time.time()) % 1_000_000
+    writer = BatchWriter(a.db, verbose=False).start()
+    print(f"{'step':>22s} {'rows/s':>9s} {'queue':>7s} {'api p50':>9s} {'api p99':>9s} "
+          f"{'dash p50':>9s} {'dash p99':>9s} {'alert':>8s}  (ms)")
+    results = []
+    try:
+        for k, (label, target, rate) in enumerate(schedule(a)):
+            s = run_step(a, rows, writer, f"RPL{run_id}-{k}", label, target, rate)
+            results.append(s)
+            print(fmt(s))
+    finally:
+        writer.close()
+
+    first = next((k for k, s in enumerate(results) if s["saturated"]), None)
+    if first is not None:
+        print(f"saturation at {results[first]['step']} ({', '.join(results[first]['why'])}); "
+              f"last healthy step: {results[first - 1]['step'] if first else 'none'}")
+    else:
+        print("no step saturated")
+    if a.out:
+        with open(a.out, "w") as f:
+            json.dump({"dump": a.dump, "steps": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# bench/search.py
+"""Full-text search (reviews_fts, GET /search) against the LIKE scans it replaces.
+
+    python bench/search.py build --db /tmp/search/reviews.db --rows 2000000 --products 500
+    python bench/search.py run --db /tmp/search/reviews.db
+    python bench/search.py run --db reviews.db --terms battery refund "stopped working" --product B00X4WHP5E
+    python bench/search.py run --db /tmp/search/reviews.db --sentiment negative --with-writer
+
+`build` writes `--rows` seeded reviews made of sentence fragments (so terms
+range from common to rare), loads them with the triggers off and indexes
+reviews_fts once at the end. `run` times, per term, the first page of
+app.SEARCH_SQL (bm25-ranked, snippets) and the LIKE query operations staff
+used to run (`review_text LIKE '%term%'`, newest first, same filters and
+limit), then the full match count each way. LIKE and the porter-stemmed FTS
+index don't match exactly the same rows ("batteries" is not LIKE
+'%battery%'), so both counts are printed.
+
+`--with-writer` keeps a BatchWriter inserting into the same file during the
+run and reports its commit times and the largest WAL seen, the stall a long
+LIKE scan causes: a reader holding its snapshot keeps the checkpoint from
+finishing and the WAL growing.
+"""
+import argparse, os, random, sqlite3, statistics, sys, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import init_db
+from app import SEARCH_SQL, search_match
+from ingest_worker import BatchWriter
+
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+SENTIMENTS = ("positive", "neutral", "negative")
+FRAGMENTS = {
+    "negative": ["the battery died after two days", "stopped working within a week", "asking for a refund",
+                 "the charger overheats", "screen cracked in the box", "customer service never replied",
+                 "returned it for a replacement", "the strap snapped", "bluetooth keeps disconnecting",
+                 "smells like burnt plastic"],
+    "neutral": ["arrived on time", "does what it says", "average build quality", "the manual is thin",
+                "packaging was plain", "took a while to set up", "fits as expected", "color is a bit off"],
+    "positive": ["battery life is excellent", "works great out of the box", "great value for the money",
+                 "sound quality is superb", "setup took two minutes", "sturdy and well made",
+                 "bought a second one as a gift", "the screen is bright and sharp"],
+}
+RARE = ["flux capacitor", "zeppelin", "quokka", "marzipan", "theremin"]
+DEFAULT_TERMS = ["battery", "refund", "stopped working", "bluetooth", "excellent", "zeppelin"]
+
+LIKE_SQL = """
+SELECT id, review_id, product_id, sentiment, ts_utc, substr(review_text, 1, 160) AS snippet
+FROM reviews
+WHERE review_text LIKE :like
+  AND (:product_id IS NULL OR product_id = :product_id)
+  AND ts_epoch BETWEEN :start AND :end
+  AND (:sentiments IS NULL OR instr(:sentiments, ',' || sentiment || ',') > 0)
+ORDER BY ts_epoch DESC
+LIMIT :limit
+"""
+
+LIKE_COUNT_SQL = "SELECT COUNT(*) FROM reviews WHERE review_text LIKE :like"
+FTS_COUNT_SQL = "SELECT COUNT(*) FROM reviews_fts WHERE reviews_fts MATCH :q"
+
+def text(rnd, sentiment):
+    parts = rnd.sample(FRAGMENTS[sentiment], rnd.randint(1, 3))
+    if rnd.random() < 0.001:
+        parts.append("like a " + rnd.choice(RARE))
+    return ". ".join(p.capitalize() for p in parts) + "."
+
+def build(db, rows, products, batch=100_000):
+    os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    conn.execute(init_db.REVIEWS)
+    conn.execute(init_db.REVIEWS_FTS)
+    rnd = random.Random(7)
+    pids = [f"B{i:09d}" for i in range(products)]
+    t = int(time.time()) - rows * 2
+    t0 = time.perf_counter()
+    for i in range(0, rows, batch):
+        chunk = []
+        for j in range(i, min(rows, i + batch)):
+            t += rnd.randrange(4)
+            s = rnd.choices(SENTIMENTS, (5, 2, 3))[0]
+            chunk.append((f"srch-{j}", rnd.choice(pids), text(rnd, s), s, time.strftime(ISO, time.gmtime(t)), t))
+        with conn:
+            conn.executemany("INSERT INTO reviews (review_id, product_id, review_text, sentiment, ts_utc, ts_epoch) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", chunk)
+        print(f"[build] {min(rows, i + batch):,} rows")
+    for ddl in init_db.INDEXES.values():
+        conn.execute(ddl)
+    conn.commit()
+    init_db.rebuild_fts(conn)
+    conn.close()
+    # triggers, rollups and the rest of the schema, as any writer would find it
+    conn = sqlite3.connect(db)
+    init_db.init(conn)
+    conn.close()
+    print(f"[build] {rows:,} rows over {products} products in {time.perf_counter() - t0:.1f}s -> {db}")
+
+def timed(conn, sql, params, repeat):
+    samples, rows = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        samples.append(time.perf_counter() - t0)
+    return samples, rows
+
+def ms(samples, q):
+    samples = sorted(samples)
+    return 1000 * samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def fts_query(term):
+    # the ops phrasing: a multi-word term is a phrase
+    return '"' + term.replace('"', '""') + '"'
+
+def writer_load(db, stop, commits):
+    w = BatchWriter(db, max_rows=500, max_delay=0.05, verbose=False).start()
+    rnd = random.Random(11)
+    i, seen = 0, 0
+    while not stop.is_set():
+        now = int(time.time())
+        w.put({"review_id": f"live-{i}", "product_id": "B000000000", "review_text": text(rnd, "negative"),
+               "sentiment": "negative", "keywords": None, "entities": None,
+               "ts_utc": time.strftime(ISO, time.gmtime(now)), "ts_epoch": now})
+        i += 1
+        if i % 100 == 0:
+            time.sleep(0.01)    # about 10k rows/s offered
+            if w.flushes != seen:
+                seen = w.flushes
+                commits.append(w.last_flush_ms / 1000)
+    w.close()
+    commits.append(w.rows_written)
+
+def run(a):
+    conn = sqlite3.connect(f"file:{os.path.abspath(a.db)}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout=30000;")
+    n = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+    print(f"{a.db}: {n:,} reviews")
+    base = {"product_id": a.product, "start": 0, "end": 2 ** 62, "limit": a.limit,
+            "sentiments": "," + ",".join(sorted(set(a.sentiment))) + "," if a.sentiment else None}
+
+    stop, commits, wal = threading.Event(), [], os.path.abspath(a.db) + "-wal"
+    if a.with_writer:
+        th = threading.Thread(target=writer_load, args=(a.db, stop, commits), daemon=True)
+        th.start()
+        time.sleep(1.0)
+    wal_max = 0
+
+    print(f"{'term':18s} {'fts matches':>12s} {'like matches':>12s}   {'fts p50/p99 ms':>17s}   "
+          f"{'like p50/p99 ms':>17s}   {'count fts/like ms':>19s}  speedup")
+    for term in a.terms:
+        fts = {**base, "q": search_match(fts_query(term), a.product), "tokens": 16, "c_score": float("-inf"), "c_id": 0}
+        like = {**base, "like": f"%{term}%"}
+        f_s, _ = timed(conn, SEARCH_SQL, fts, a.repeat)
+        l_s, _ = timed(conn, LIKE_SQL, like, a.repeat)
+        fc_s, fc = timed(conn, FTS_COUNT_SQL, {"q": search_match(fts_query(term), None)}, 1)
+        lc_s, lc = timed(conn, LIKE_COUNT_SQL, {"like": like["like"]}, 1)
+        if os.path.exists(wal):
+            wal_max = max(wal_max, os.path.getsize(wal))
+        print(f"{term[:18]:18s} {fc[0][0]:12,} {lc[0][0]:12,}   {ms(f_s, .5):8.2f}/{ms(f_s, .99):8.2f}   "
+              f"{ms(l_s, .5):8.2f}/{ms(l_s, .99):8.2f}   {1000 * fc_s[0]:9.1f}/{1000 * lc_s[0]:9.1f}  "
+              f"{statistics.median(l_s) / statistics.median(f_s):7.1f}x")
+    conn.close()
+
+    if a.with_writer:
+        stop.set()
+        th.join()
+        written, commits = commits[-1], commits[:-1] or [0.0]
+        print(f"writer during the run: {written:,} rows, commit p50 {ms(commits, .5):.1f} ms "
+              f"p99 {ms(commits, .99):.1f} ms max {1000 * max(commits):.1f} ms, largest WAL {wal_max / 2 ** 20:.1f} MiB")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--db", required=True)
+    b.add_argument("--rows", type=int, default=1_000_000)
+    b.add_argument("--products", type=int, default=500)
+    r = sub.add_parser("run")
+    r.add_argument("--db", default=init_db.DB)
+    r.add_argument("--terms", nargs="+", default=DEFAULT_TERMS)
+    r.add_argument("--product", default=None, help="product_id filter (default: all products)")
+    r.add_argument("--sentiment", action="append", choices=SENTIMENTS)
+    r.add_argument("--limit", type=int, default=50)
+    r.add_argument("--repeat", type=int, default=10)
+    r.add_argument("--with-writer", action="store_true", help="insert through a BatchWriter during the run")
+    a = ap.parse_args()
+    if a.cmd == "build":
+        build(a.db, a.rows, a.products)
+    else:
+        run(a)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+# bench/suite.py
+"""Scale benchmark: seeded synthetic reviews, then p50/p99 of every read/write path.
+
+    python bench/suite.py build --dir /tmp/bench-1m --reviews 1000000 --products 1000
+    python bench/suite.py build --dir /tmp/bench-50m --reviews 50000000 --products 100000 --seal
+    python bench/suite.py run --dir /tmp/bench-1m --out results.json --baseline bench/baseline-100k.json
+    python bench/suite.py compare results.json bench/baseline-100k.json
+
+`build` generates reviews from a seed (same arguments, same rows): product
+popularity is Zipf-distributed (a few products get most of the traffic), each
+product has its own sentiment mix, and keywords/entities are drawn from
+sentiment-dependent, Zipf-weighted vocabularies. Timestamps are spread over
+`--days` of history plus `--ahead-hours` past the build time, so windows
+relative to "now" stay populated if `run` happens a while after `build`. The
+SQLite database goes through storage.SQLiteStorage with triggers and indexes
+off, then rollups, indexes and the full-text index are rebuilt once;
+`--seal` also moves old weeks into partitions and the columnar archive.
+`--pg URL` loads the same rows into Postgres (pg_schema.sql) for main.py.
+
+`run` serves app.py (and main.py with `--pg`) with uvicorn in-process and
+times every GET endpoint over keep-alive HTTP, cycling through products drawn
+by popularity; calls the Dash callback cold (new snapshot) and warm; times
+alert_worker.check_once; and measures ingest rows/s through BatchWriter and
+POST /reviews/bulk into a scratch database. The response cache is off unless
+`--cache`, so the numbers are the query paths. Results go to `--out` as JSON.
+
+`compare` (and `run --baseline`) flags a latency metric whose p50 grew by more
+than `--tolerance` (p99: twice that), ignoring changes under `--min-ms`, and an
+ingest rate that dropped by more than `--tolerance`. Exit status 1 on any
+regression. Baselines only compare on the same data spec and machine.
+"""
+import argparse, contextlib, http.client, io, json, os, platform, socket, sqlite3, subprocess, sys
+import tempfile, threading, time
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+import init_db
+import storage
+
+META = "bench.json"
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+
+NEG_TERMS = ["refund", "broken", "battery", "return", "defective", "late", "cracked", "noisy", "overheats",
+             "missing parts", "leaks", "stopped working", "customer service", "warranty", "smell"]
+POS_TERMS = ["great value", "sturdy", "fast shipping", "easy setup", "quiet", "battery life", "comfortable",
+             "well made", "bright", "gift", "lightweight", "works great", "recommend", "sound quality"]
+SHARED_TERMS = ["price", "size", "color", "packaging", "instructions", "charger", "cable", "screen", "fit",
+                "app", "bluetooth", "remote", "strap", "lid", "handle"]
+BRANDS = ["Amazon", "Anker", "Samsung", "Apple", "Sony", "Logitech", "Philips", "Bose", "JBL", "Lenovo",
+          "Dell", "HP", "Xiaomi", "Belkin", "UGREEN", "Fitbit", "Garmin", "Canon", "Nikon", "Dyson"]
+SENTENCES = {
+    "negative": ["Stopped working after a week.", "Asking for a refund.", "Would not buy again.",
+                 "The box arrived damaged and parts were missing.", "Support never answered my emails."],
+    "neutral": ["It does what it says.", "Arrived on time.", "Nothing special for the price.",
+                "Average build, average performance.", "Took a while to set up."],
+    "positive": ["Works great, very happy.", "Exactly as described.", "Great value for the money.",
+                 "Bought a second one for my parents.", "Setup took two minutes."],
+}
+SENTIMENTS = ("negative", "neutral", "positive")
+
+# ---------- generator ----------
+def product_id(rank):
+    # rank 0 is the most reviewed product
+    return f"B{rank:07d}"
+
+def zipf_weights(n, s):
+    w = 1.0 / np.arange(1, n + 1) ** s
+    return w / w.sum()
+
+def spec_from(a):
+    end = int(time.time())
+    return {"reviews": a.reviews, "products": a.products, "seed": a.seed, "zipf": a.zipf,
+            "days": a.days, "ahead_hours": a.ahead_hours, "start": end - a.days * 86400,
+            "end": end + a.ahead_hours * 3600}
+
+def generate(spec, chunk=100_000):
+    """Yield lists of review tuples (INSERT column order) for `spec`, oldest first."""
+    rng = np.random.default_rng(spec["seed"])
+    n, P = spec["reviews"], spec["products"]
+    pop = zipf_weights(P, spec["zipf"])
+    # per-product sentiment mix: most products are fine, some are lemons
+    p_neg = rng.beta(2, 6, P)
+    p_pos = (1 - p_neg) * rng.beta(6, 3, P)
+    vocab = {"negative": np.array(NEG_TERMS + SHARED_TERMS, dtype=object),
+             "neutral": np.array(SHARED_TERMS, dtype=object),
+             "positive": np.array(POS_TERMS + SHARED_TERMS, dtype=object)}
+    vocab_w = {s: zipf_weights(len(v), 1.0) for s, v in vocab.items()}
+    brands, brand_w = np.array(BRANDS, dtype=object), zipf_weights(len(BRANDS), 1.2)
+    span = spec["end"] - spec["start"]
+    for lo in range(0, n, chunk):
+        hi = min(n, lo + chunk)
+        k = hi - lo
+        # each chunk covers its slice of the time range, so ids grow with time like a live feed
+        ts = np.sort(rng.integers(spec["start"] + span * lo // n, spec["start"] + span * hi // n + 1, k))
+        ts_utc = np.char.add(np.datetime_as_string(ts.astype("datetime64[s]")), "Z")
+        prod = rng.choice(P, k, p=pop)
+        u = rng.random(k)
+        sent = np.where(u < p_neg[prod], 0, np.where(u < p_neg[prod] + p_pos[prod], 2, 1))
+        n_kw = rng.integers(0, 4, k)
+        n_ent = rng.integers(0, 3, k)
+        n_sent = 1 + np.minimum(rng.geometric(0.45, k) - 1, 11)
+        kw_draw = {s: rng.choice(len(vocab[s]), (k, 3), p=vocab_w[s]) for s in SENTIMENTS}
+        ent_draw = rng.choice(len(brands), (k, 2), p=brand_w)
+        sent_draw = rng.integers(0, 5, (k, 12))
+        rows = []
+        for i in range(k):
+            s = SENTIMENTS[sent[i]]
+            kws = list(dict.fromkeys(vocab[s][kw_draw[s][i, :n_kw[i]]]))
+            ents = list(dict.fromkeys(brands[ent_draw[i, :n_ent[i]]]))
+            text = " ".join(SENTENCES[s][j] for j in sent_draw[i, :n_sent[i]])
+            if kws:
+                text += " Mentions: " + ", ".join(kws) + "."
+            rows.append((f"gen-{spec['seed']}-{lo + i}", product_id(prod[i]), text, s,
+                         json.dumps(kws), json.dumps(ents), str(ts_utc[i]), int(ts[i])))
+        yield rows
+
+def as_dicts(rows):
+    """Generator tuples -> the review dicts BatchWriter and /reviews/bulk take."""
+    return [{"review_id": r[0], "product_id": r[1], "review_text": r[2], "sentiment": r[3],
+             "keywords": json.loads(r[4]), "entities": json.loads(r[5]), "ts_utc": r[6], "ts_epoch": r[7]}
+            for r in rows]
+
+# ---------- build ----------
+def build_sqlite(db, spec):
+    store = storage.SQLiteStorage(db)
+    store.init()
+    conn = store.conn
+    # rollups are rebuilt once at the end instead of by trigger per row
+    triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER {name};")
+    # a fresh file: every index is built once at the end, not just the ones bulk_begin drops
+    for name in init_db.INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name};")
+    store.bulk_begin()
+    t0 = time.perf_counter()
+    done = 0
+    for rows in generate(spec):
+        done += store.insert_reviews(rows)
+        if done % 1_000_000 < len(rows):
+            print(f"[build] {done:,} rows ({done / (time.perf_counter() - t0):,.0f} rows/s)")
+    load_s = time.perf_counter() - t0
+    print("[build] rebuilding indexes ...")
+    for ddl in init_db.INDEXES.values():
+        conn.execute(ddl)
+    store.bulk_end()
+    print("[build] rebuilding rollups ...")
+    init_db.rebuild_rollups(conn)
+    print("[build] rebuilding full-text index ...")
+    init_db.rebuild_fts(conn)
+    with conn:
+        for _, ddl in triggers:
+            conn.execute(ddl)
+        conn.execute("INSERT OR IGNORE INTO product_watermark SELECT DISTINCT product_id, 1 FROM reviews;")
+    store.close()
+    return {"load_s": round(load_s, 1), "total_s": round(time.perf_counter() - t0, 1)}
+
+def build_pg(url, spec):
+    store = storage.PostgresStorage(url)
+    store.init()
+    store.bulk_begin()
+    t0 = time.perf_counter()
+    done = 0
+    for rows in generate(spec):
+        done += store.insert_reviews(rows)
+        if done % 1_000_000 < len(rows):
+            print(f"[build pg] {done:,} rows ({done / (time.perf_counter() - t0):,.0f} rows/s)")
+    store.bulk_end()
+    store.close()
+    return {"total_s": round(time.perf_counter() - t0, 1)}
+
+def build(a):
+    os.makedirs(a.dir, exist_ok=True)
+    db = os.path.join(a.dir, init_db.DB)
+    if os.path.exists(db):
+        sys.exit(f"{db} exists; build into an empty directory")
+    spec = spec_from(a)
+    meta = {"spec": spec, "built_at": time.strftime(ISO, time.gmtime()), "sqlite": build_sqlite(db, spec)}
+    if a.seal:
+        import partitions, archive
+        partitions.seal(db)
+        archive.build(db)
+    if a.pg:
+        meta["postgres"] = build_pg(a.pg, spec)
+    with open(os.path.join(a.dir, META), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"[build] {spec['reviews']:,} reviews, {spec['products']:,} products -> {db} {meta['sqlite']}")
+
+# ---------- timing ----------
+def percentile(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))] if xs else 0.0
+
+def latency(samples, errors=0):
+    return {"n": len(samples), "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "max_ms": round(max(samples, default=0) * 1000, 3), "errors": errors}
+
+def sample_products(spec, k=20, seed=1):
+    """`k` products drawn by popularity (the head shows up, so does the tail)."""
+    rng = np.random.default_rng(seed)
+    k = min(k, spec["products"])
+    return [product_id(r) for r in rng.choice(spec["products"], k, replace=False,
+                                               p=zipf_weights(spec["products"], spec["zipf"]))]
+
+@contextlib.contextmanager
+def serving(asgi_app):
+    """Run `asgi_app` with uvicorn on a free local port in a background thread."""
+    import uvicorn
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    th = threading.Thread(target=server.run, daemon=True)
+    th.start()
+    while not server.started:
+        if not th.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        th.join()
+
+def request(conn, method, path, body=None, headers=None):
+    t0 = time.perf_counter()
+    conn.request(method, path, body=body, headers=headers or {})
+    resp = conn.getresponse()
+    data = resp.read()
+    return time.perf_counter() - t0, resp.status, data
+
+def time_calls(fn, args_list):
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def time_endpoints(base, label, endpoints, products, iterations):
+    """GET each endpoint `iterations` times, cycling products; `follow` walks a page cursor deeper each call."""
+    u = urlsplit(base)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=600)
+    out = {}
+    for name, path, follow, every in endpoints:
+        samples, errors, cursors = [], 0, {}
+        for i in range(max(1, iterations // every) + 1):
+            p = products[i % len(products)]
+            url = path.format(p=p)
+            if follow and cursors.get(p):
+                url += ("&" if "?" in url else "?") + urlencode({"cursor": cursors[p]})
+            dt, status, data = request(conn, "GET", url)
+            if follow and status == 200:
+                cursors[p] = json.loads(data).get("next_cursor")
+            if i == 0:
+                continue    # warm-up
+            samples.append(dt)
+            errors += status >= 400
+        key = f"{label} GET {name}"
+        out[key] = latency(samples, errors)
+        print(f"  {key:52s} p50 {out[key]['p50_ms']:9.2f} ms  p99 {out[key]['p99_ms']:9.2f} ms  errors {errors}")
+    conn.close()
+    return out
+
+def time_post(base, key, path, bodies, headers):
+    u = urlsplit(base)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=600)
+    samples, errors = [], 0
+    for body in bodies:
+        dt, status, _ = request(conn, "POST", path, body=body, headers=headers)
+        samples.append(dt)
+        errors += status >= 400
+    conn.close()
+    out = latency(samples, errors)
+    print(f"  {key:52s} p50 {out['p50_ms']:9.2f} ms  p99 {out['p99_ms']:9.2f} ms  errors {errors}")
+    return out
+
+def q(**params):
+    return "?" + urlencode(params, doseq=True) if params else ""
+
+# (name, path template, follow next_cursor, run on every Nth iteration only)
+def app_endpoints():
+    day = time.strftime(ISO, time.gmtime(int(time.time()) - 86400))
+    return [
+        ("/healthz", "/healthz", False, 1),
+        ("/pool", "/pool", False, 1),
+        ("/cache", "/cache", False, 1),
+        ("/writer", "/writer", False, 1),
+        ("/partitions", "/partitions", False, 1),
+        ("/archive", "/archive", False, 1),
+        ("/reviews/{p}", "/reviews/{p}" + q(limit=50), False, 1),
+        ("/reviews/{p}/page", "/reviews/{p}/page" + q(limit=100), True, 1),
+        ("/reviews/{p}/page?sentiment=negative", "/reviews/{p}/page" + q(limit=100, sentiment="negative"), True, 1),
+        ("/reviews/{p}/export (last 24h)", "/reviews/{p}/export" + q(start_ts=day), False, 10),
+        ("/sentiment_trend/{p}", "/sentiment_trend/{p}" + q(window_minutes=1440, bucket_minutes=5), False, 1),
+        ("/keywords/{p}", "/keywords/{p}", False, 1),
+        ("/entities/{p}", "/entities/{p}", False, 1),
+        ("/alerts/{p}", "/alerts/{p}", False, 1),
+        ("/history/sentiment_trend", "/history/sentiment_trend?product_id={p}&freq=week", False, 1),
+        ("/history/keywords", "/history/keywords?product_id={p}", False, 1),
+        ("/history/sentiment_distribution", "/history/sentiment_distribution", False, 1),
+        ("/search?q=battery", "/search" + q(q="battery", limit=50), False, 1),
+        ("/search?q=\"stopped working\"&product_id={p}",
+         "/search" + q(q='"stopped working"', limit=50) + "&product_id={p}", True, 1),
+    ]
+
+def main_endpoints():
+    day = time.strftime(ISO, time.gmtime(int(time.time()) - 86400))
+    return [
+        ("/healthz", "/healthz", False, 1),
+        ("/pool", "/pool", False, 1),
+        ("/reviews/{p}", "/reviews/{p}" + q(limit=50), False, 1),
+        ("/reviews/{p}/page", "/reviews/{p}/page" + q(limit=100), True, 1),
+        ("/reviews/{p}/export (last 24h)", "/reviews/{p}/export" + q(start_ts=day), False, 10),
+        ("/sentiment_trend/{p}", "/sentiment_trend/{p}" + q(hours=24), False, 1),
+        ("/keywords/{p}", "/keywords/{p}" + q(hours=24), False, 1),
+    ]
+
+def pg_env(url):
+    """main.py reads PG_* variables; fill them from a postgresql:// URL unless already set."""
+    u = urlsplit(url)
+    host = u.hostname or parse_qs(u.query).get("host", ["127.0.0.1"])[0]
+    for k, v in (("PG_HOST", host), ("PG_DB", u.path.lstrip("/") or "postgres"),
+                 ("PG_USER", u.username or ""), ("PG_PASS", u.password or "")):
+        os.environ.setdefault(k, v)
+
+def ndjson(rows):
+    return "".join(json.dumps(r) + "\n" for r in as_dicts(rows)).encode()
+
+def run_ingest(spec, n, scratch):
+    """rows/s of the live write path into empty databases, so the benchmark data stays untouched."""
+    import ingest_worker
+    import app
+    out = {}
+    ingest = {**spec, "reviews": n, "seed": spec["seed"] + 1000, "start": spec["end"] - 3600}
+    rows = [r for chunk in generate(ingest, 5000) for r in chunk]
+
+    db = os.path.join(scratch, "batch_writer.db")
+    conn = sqlite3.connect(db)
+    init_db.init(conn)
+    conn.close()
+    dicts = as_dicts(rows)
+    w = ingest_worker.BatchWriter(db, verbose=False).start()
+    t0 = time.perf_counter()
+    w.put_many(dicts)
+    w.close()
+    wall = time.perf_counter() - t0
+    out["ingest BatchWriter"] = {"rows": w.rows_written, "rows_per_s": round(w.rows_written / wall, 1)}
+
+    # /reviews/bulk with the API's group-commit writer pointed at a second scratch database
+    db = os.path.join(scratch, "bulk.db")
+    conn = sqlite3.connect(db)
+    init_db.init(conn)
+    conn.close()
+    live, app.writer = app.writer, ingest_worker.BatchWriter(db, max_rows=2000, max_delay=0.1,
+                                                             max_queue=50_000, verbose=False).start()
+    try:
+        bodies = [ndjson(rows[i:i + 5000]) for i in range(0, len(rows), 5000)]
+        with serving(app.app) as base:
+            t0 = time.perf_counter()
+            out["app POST /reviews/bulk (5000 rows)"] = time_post(
+                base, "app POST /reviews/bulk (5000 rows)", "/reviews/bulk", bodies,
+                {"Content-Type": "application/x-ndjson"})
+            wall = time.perf_counter() - t0
+        written = app.writer.rows_written
+    finally:
+        app.writer.close()
+        app.writer = live
+    out["ingest POST /reviews/bulk"] = {"rows": written, "rows_per_s": round(written / wall, 1)}
+    for k in ("ingest BatchWriter", "ingest POST /reviews/bulk"):
+        print(f"  {k:52s} {out[k]['rows_per_s']:12,.0f} rows/s")
+    return out
+
+def run(a):
+    with open(os.path.join(a.dir, META)) as f:
+        meta = json.load(f)
+    spec = meta["spec"]
+    if time.time() > spec["end"]:
+        print(f"[run] warning: data ends {time.strftime(ISO, time.gmtime(spec['end']))}; "
+              "windows relative to now are emptier than at build time, rebuild for comparable numbers")
+    # app.py, dash_app.py and alert_worker.py all open ./reviews.db
+    os.chdir(a.dir)
+    if not a.cache:
+        os.environ["API_RESPONSE_CACHE_ENTRIES"] = "0"
+    products = sample_products(spec)
+    results = {}
+
+    import app
+    print("[run] app.py")
+    with serving(app.app) as base:
+        results.update(time_endpoints(base, "app", app_endpoints(), products, a.iterations))
+        try:
+            app.sentiment_model.get_model()
+        except FileNotFoundError as ex:
+            print(f"  skipping POST /classify: {ex}")
+        else:
+            texts = json.dumps({"texts": [r[2] for r in next(generate({**spec, "reviews": 100}))]})
+            results["app POST /classify (100 texts)"] = time_post(
+                base, "app POST /classify (100 texts)", "/classify", [texts] * a.iterations,
+                {"Content-Type": "application/json"})
+
+    if a.pg:
+        pg_env(a.pg)
+        import main
+        print("[run] main.py")
+        with serving(main.app) as base:
+            results.update(time_endpoints(base, "main", main_endpoints(), products, a.iterations))
+
+    print("[run] dash_app.update")
+    import dash_app
+    cold = time_calls(dash_app.update, [(p, 1440, 5, 0) for p in products])
+    warm = time_calls(dash_app.update, [(products[i % len(products)], 1440, 5, i) for i in range(a.iterations)])
+    results["dash update (cold)"], results["dash update (warm)"] = latency(cold), latency(warm)
+
+    print("[run] alert_worker.check_once")
+    import alert_worker
+    store = storage.SQLiteStorage(init_db.DB)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["alert check_once"] = latency(time_calls(alert_worker.check_once, [(store,)] * a.iterations))
+    store.close()
+    for k in ("dash update (cold)", "dash update (warm)", "alert check_once"):
+        print(f"  {k:52s} p50 {results[k]['p50_ms']:9.2f} ms  p99 {results[k]['p99_ms']:9.2f} ms")
+
+    print("[run] ingest")
+    with tempfile.TemporaryDirectory() as scratch:
+        results.update(run_ingest(spec, a.ingest_rows, scratch))
+
+    try:
+        rev = subprocess.run(["git", "-C", REPO, "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    doc = {"meta": {"spec": spec, "run_at": time.strftime(ISO, time.gmtime()), "iterations": a.iterations,
+                    "cache": a.cache, "git": rev, "python": platform.python_version(),
+                    "sqlite": sqlite3.sqlite_version, "machine": platform.machine(), "cpus": os.cpu_count()},
+           "results": results}
+    return doc
+
+# ---------- compare ----------
+def compare(cur, base, tolerance=0.25, min_ms=1.0):
+    """Print current vs baseline per metric; returns the names that regressed."""
+    keys = ("reviews", "products", "seed", "zipf", "days")
+    if any(cur["meta"]["spec"].get(k) != base["meta"]["spec"].get(k) for k in keys):
+        print("[compare] warning: data specs differ, the comparison is only indicative")
+    regressed = []
+    for name, b in base["results"].items():
+        c = cur["results"].get(name)
+        if c is None:
+            print(f"  {'missing':9s} {name:52s} not in the current run")
+            continue
+        if "rows_per_s" in b:
+            bad = c["rows_per_s"] < b["rows_per_s"] * (1 - tolerance)
+            line = f"{b['rows_per_s']:12,.0f} -> {c['rows_per_s']:12,.0f} rows/s"
+        else:
+            bad = any(c[k] > b[k] * (1 + tol) and c[k] - b[k] > min_ms
+                      for k, tol in (("p50_ms", tolerance), ("p99_ms", 2 * tolerance)))
+            bad = bad or c["errors"] > b["errors"]
+            line = f"p50 {b['p50_ms']:9.2f} -> {c['p50_ms']:9.2f} ms  p99 {b['p99_ms']:9.2f} -> {c['p99_ms']:9.2f} ms"
+        print(f"  {'REGRESSED' if bad else 'ok':9s} {name:52s} {line}")
+        if bad:
+            regressed.append(name)
+    return regressed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="generate a benchmark database")
+    b.add_argument("--dir", required=True, help="empty directory; reviews.db and bench.json go here")
+    b.add_argument("--reviews", type=int, default=100_000, help="100k to 50M")
+    b.add_argument("--products", type=int, default=100, help="10 to 100k")
+    b.add_argument("--seed", type=int, default=7)
+    b.add_argument("--zipf", type=float, default=1.1, help="product popularity skew")
+    b.add_argument("--days", type=int, default=30, help="history before the build time")
+    b.add_argument("--ahead-hours", type=int, default=24, help="data past the build time")
+    b.add_argument("--seal", action="store_true", help="seal old weeks into partitions and build the archive")
+    b.add_argument("--pg", help="also load the rows into this postgresql:// database")
+    r = sub.add_parser("run", help="measure against a built directory")
+    r.add_argument("--dir", required=True)
+    r.add_argument("--iterations", type=int, default=200, help="timed calls per endpoint")
+    r.add_argument("--ingest-rows", type=int, default=50_000)
+    r.add_argument("--cache", action="store_true", help="keep app.py's response cache on")
+    r.add_argument("--pg", help="postgresql:// database built with `build --pg`; also times main.py")
+    r.add_argument("--out", default="bench-results.json")
+    r.add_argument("--baseline", help="results JSON to compare against")
+    c = sub.add_parser("compare", help="compare two results files")
+    c.add_argument("current")
+    c.add_argument("baseline")
+    for p in (r, c):
+        p.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+        p.add_argument("--min-ms", type=float, default=1.0, help="ignore latency changes smaller than this")
+    a = ap.parse_args()
+
+    if a.cmd == "build":
+        build(a)
+        return 0
+    if a.cmd == "run":
+        out, baseline = os.path.abspath(a.out), a.baseline and os.path.abspath(a.baseline)
+        cur = run(a)
+        with open(out, "w") as f:
+            json.dump(cur, f, indent=2)
+        print(f"[run] results -> {out}")
+        if not baseline:
+            return 0
+    else:
+        with open(a.current) as f:
+            cur = json.load(f)
+        baseline = a.baseline
+    with open(baseline) as f:
+        base = json.load(f)
+    regressed = compare(cur, base, a.tolerance, a.min_ms)
+    print(f"[compare] {len(regressed)} regression(s) against {baseline}")
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
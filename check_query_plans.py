@@ -0,0 +1,105 @@
+# check_query_plans.py
+"""EXPLAIN QUERY PLAN check for the hot read paths.
+
+    python check_query_plans.py            # fresh schema in a temp DB
+    python check_query_plans.py reviews.db # plans against a real database
+
+Fails (exit 1) if any query scans a table instead of searching one of the
+epoch indexes, the rollup primary key or the full-text index, or sorts its
+rows in a temp B-tree where the index should hand them over in order.
+"""
+import os, sqlite3, sys, tempfile, time
+
+import init_db
+import alert_worker
+import storage
+import app
+import enrich
+import live
+import metrics
+import review_store
+
+NOW = int(time.time())
+DAY = 86400
+ALERT_PARAMS = {"rule": "neg>=5_in_10m", "threshold": 5, "start": NOW - 600, "end": NOW,
+                "window_start": "", "window_end": "", "cooldown": ""}
+TREND_PARAMS = {"b": 300, "product_id": "P001", "start": NOW - DAY, "end": NOW}
+REVIEWS_PARAMS = {"product_id": "P001", "start": NOW - DAY, "end": NOW, "limit": 50}
+PAGE_PARAMS = {"product_id": "P001", "start": 0, "end": NOW, "sentiments": ",negative,",
+               "c_ts": NOW, "c_id": 0, "limit": 100}
+RULE_PARAMS = {"start": NOW - 6 * 3600, "end": NOW, "width": 600}
+TERMS_PARAMS = {"product_id": "P001", "kind": "keyword", "start": NOW - DAY, "end": NOW, "topk": 20}
+SEARCH_PARAMS = {"q": app.search_match("battery", "P001"), "tokens": 16, "product_id": "P001",
+                 "start": 0, "end": NOW, "sentiments": ",negative,", "c_score": -1e308, "c_id": 0, "limit": 50}
+
+PRODUCT_IDX = ("idx_reviews_product_epoch_id",)
+ROLLUP_IDX = ("sentiment_minute USING PRIMARY KEY",)
+TERMS_IDX = ("term_minute USING PRIMARY KEY",)
+# after ANALYZE on a database with few products the planner may prefer a
+# skip-scan of the product index for the alert scan; both are fine
+ALERT_IDX = ("idx_reviews_sentiment_epoch", "idx_reviews_product_epoch_id")
+# "0:M" = the MATCH is answered by the FTS5 index (a plain scan of it has no M)
+FTS_IDX = ("reviews_fts VIRTUAL TABLE INDEX 0:M",)
+
+# the rule engine walks the (small) product list on purpose; the alert scan
+# walks its own per-product counts (subquery w), not a table; FTS5 lookups
+# show up as SCAN of the virtual table (see FTS_IDX)
+SCAN_OK = ("SCAN product_watermark", "SCAN w", "SCAN reviews_fts VIRTUAL TABLE")
+
+# these order by a computed value (a summed count, bm25), which no index can
+# provide; every other query must get its ORDER BY from the index it searches
+SORT_OK = {"api /keywords", "api /search"}
+
+# (label, sql, params, indexes of which one must appear in the plan)
+CHECKS = [
+    ("api /reviews",         app.REVIEWS_SQL,       REVIEWS_PARAMS,               PRODUCT_IDX),
+    ("api /reviews page",    app.PAGE_SQL,          PAGE_PARAMS,                  PRODUCT_IDX),
+    ("api /reviews export",  app.EXPORT_SQL,        PAGE_PARAMS,                  PRODUCT_IDX),
+    ("api /sentiment_trend", app.TREND_SQL,         TREND_PARAMS,                 ROLLUP_IDX),
+    ("api /keywords",        app.TERMS_SQL,         TERMS_PARAMS,                 TERMS_IDX),
+    ("api /search",          app.SEARCH_SQL,        SEARCH_PARAMS,                FTS_IDX),
+    ("store minutes",        review_store.LOAD_MINUTES_SQL, ("P001", NOW - DAY),  ROLLUP_IDX),
+    ("store terms",          review_store.LOAD_TERMS_SQL, ("P001", NOW - DAY),    TERMS_IDX),
+    ("store recent",         review_store.LOAD_RECENT_SQL, ("P001",),             PRODUCT_IDX),
+    ("store tail",           review_store.TAIL_SQL, (0, 5000),                    ("INTEGER PRIMARY KEY",)),
+    ("enrich pending",       enrich.PENDING_SQL,    (0, 1024),                    ("idx_reviews_unenriched",)),
+    ("alert scan",           storage.SQLITE_RAISE_ALERTS, ALERT_PARAMS,             ALERT_IDX),
+    ("alert stream rebuild", alert_worker.WINDOW_NEGATIVES, (NOW - 600, NOW),         ALERT_IDX),
+    ("alert stream tail",    alert_worker.TAIL,     (0, 5000),                    ("INTEGER PRIMARY KEY",)),
+    ("alert rule buckets",   alert_worker.BUCKETS_SQL, RULE_PARAMS,               ROLLUP_IDX),
+    ("alert rule keyword",   alert_worker.TERM_BUCKETS_SQL, {**RULE_PARAMS, "term": "refund"}, TERMS_IDX),
+    ("alert rule cooldown",  alert_worker.RECENT_RULE_ALERTS, (time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(NOW - 3600)),),
+                                                                                  ("idx_alerts_created",)),
+    ("metrics ingest lag",   metrics.LAG_SQL,       (),                           ("INTEGER PRIMARY KEY",)),
+    ("live alerts tail",     live.ALERTS_TAIL_SQL,  (0, 5000),                    ("INTEGER PRIMARY KEY",)),
+]
+
+def plan(conn, sql, params):
+    return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def check(conn):
+    failed = 0
+    for label, sql, params, indexes in CHECKS:
+        steps = plan(conn, sql, params)
+        full_scan = any(s.startswith("SCAN ") and not s.startswith(SCAN_OK) for s in steps)
+        sorted_ = label not in SORT_OK and any(s.startswith("USE TEMP B-TREE") and "ORDER BY" in s for s in steps)
+        ok = not full_scan and not sorted_ and any(ix in s for s in steps for ix in indexes)
+        failed += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {label}")
+        for s in steps:
+            print(f"      {s}")
+    return failed
+
+def main():
+    if len(sys.argv) > 1:
+        conn = sqlite3.connect(sys.argv[1])
+        return check(conn)
+    with tempfile.TemporaryDirectory() as d:
+        conn = sqlite3.connect(os.path.join(d, "plan_check.db"))
+        init_db.init(conn)
+        failed = check(conn)
+        conn.close()
+        return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -1,109 +1,48 @@
 # dash_app.py
-import json
 import sqlite3
 import os
-from datetime import datetime, timedelta
+import time
 
 import pandas as pd
-from dash import Dash, dcc, html
-from dash.dependencies import Input, Output, State
+from dash import Dash, dcc, html, no_update
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import plotly.express as px
-from flask import jsonify
+from flask import Response, g, jsonify, request, stream_with_context
+
+import live
+import metrics
+from review_store import ReviewStore
 
 # ---------- config ----------
 DB = os.path.abspath("reviews.db")
 ISO = "%Y-%m-%dT%H:%M:%SZ"
 
-# ---------- SQL helper ----------
-def q(sql: str, params=()):
-    # open/close per call; WAL + busy timeout for safety
-    conn = sqlite3.connect(DB)
-    try:
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA busy_timeout=30000;")
-        conn.row_factory = sqlite3.Row
-        df = pd.read_sql_query(sql, conn, params=params)
-        return df
-    finally:
-        conn.close()
-
 # ---------- data access ----------
 def get_products():
     # never fail the layout if DB happens to be missing/locked
     try:
         if not os.path.exists(DB):
             return ["P001"]
-        df = q("SELECT DISTINCT product_id FROM reviews ORDER BY product_id")
-        vals = df["product_id"].dropna().astype(str).tolist()
-        return vals or ["P001"]
+        conn = sqlite3.connect(f"file:{DB}?mode=ro", uri=True)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000;")
+            # one row per product, kept by the ingest triggers
+            rows = conn.execute("SELECT product_id FROM product_watermark ORDER BY product_id").fetchall()
+        finally:
+            conn.close()
+        return [str(r[0]) for r in rows if r[0] is not None] or ["P001"]
     except Exception:
         return ["P001"]
 
-def get_trend(product_id: str, window_minutes=120, bucket_minutes=5):
-    end_s = datetime.utcnow().strftime(ISO)
-    start_s = (datetime.utcnow() - timedelta(minutes=window_minutes)).strftime(ISO)
-
-    sql = """
-    SELECT ts_utc, sentiment
-    FROM reviews
-    WHERE product_id = ?
-      AND sentiment IN ('positive','neutral','negative')
-      AND ts_utc BETWEEN ? AND ?
-    """
-    df = q(sql, (product_id, start_s, end_s))
-    if df.empty:
-        return pd.DataFrame(columns=["bucket_utc","positive","neutral","negative"])
-
-    ts = pd.to_datetime(df["ts_utc"], utc=True, errors="coerce")
-    df = df.assign(ts=ts).dropna(subset=["ts"])
-    if df.empty:
-        return pd.DataFrame(columns=["bucket_utc","positive","neutral","negative"])
-
-    bucket = f"{int(bucket_minutes)}min"
-    df["bucket_utc"] = df["ts"].dt.floor(bucket).dt.strftime(ISO)
-
-    agg = (
-        df.groupby(["bucket_utc", "sentiment"])
-          .size()
-          .unstack(fill_value=0)
-          .reindex(columns=["positive","neutral","negative"], fill_value=0)
-          .reset_index()
-          .sort_values("bucket_utc")
-    )
-    return agg
-
-def get_keywords(product_id: str, since_minutes=1440, topk=20):
-    end_s = datetime.utcnow().strftime(ISO)
-    start_s = (datetime.utcnow() - timedelta(minutes=since_minutes)).strftime(ISO)
-
-    sql = """
-    SELECT keywords
-    FROM reviews
-    WHERE product_id = ? AND ts_utc BETWEEN ? AND ?
-    """
-    df = q(sql, (product_id, start_s, end_s))
-    freq = {}
-    for _, r in df.iterrows():
-        try:
-            arr = json.loads(r["keywords"] or "[]")
-        except Exception:
-            arr = []
-        for kw in arr:
-            k = str(kw).strip().lower()
-            if k:
-                freq[k] = freq.get(k, 0) + 1
-    return pd.DataFrame(sorted(freq.items(), key=lambda kv: (-kv[1], kv[0]))[:topk],
-                        columns=["keyword","count"])
-
-def get_recent_reviews(product_id: str, limit=50):
-    sql = """
-    SELECT ts_utc, sentiment, substr(review_text, 1, 160) AS snippet
-    FROM reviews
-    WHERE product_id = ?
-    ORDER BY ts_utc DESC
-    LIMIT ?
-    """
-    return q(sql, (product_id, limit))
+# callbacks read from the shared in-memory snapshots in review_store
+store = ReviewStore(DB)
+# new rows are pushed to open tabs (assets/live.js) from one shared id tail
+tailer = live.Tailer(DB, name="dash live")
+
+def trend_frame(rows):
+    df = pd.DataFrame(rows, columns=["bucket","positive","neutral","negative"])
+    df["bucket_utc"] = pd.to_datetime(df["bucket"], unit="s", utc=True).dt.strftime(ISO)
+    return df[["bucket_utc","positive","neutral","negative"]]
 
 # ---------- app ----------
 app = Dash(
@@ -121,6 +60,42 @@ def healthz():
     ok = os.path.exists(DB)
     return jsonify({"ok": ok, "db": DB})
 
+@server.route("/store")
+def store_stats():
+    return jsonify({**store.stats(), "live": tailer.stats()})
+
+# server-sent deltas for one product, from `since` (or Last-Event-ID on reconnect)
+@server.route("/live/<product_id>")
+def live_stream(product_id):
+    try:
+        sub = tailer.subscribe(product_id, live.resume_from(request.args.get("since"),
+                                                            request.headers.get("Last-Event-ID")))
+    except sqlite3.Error as ex:
+        return jsonify({"error": str(ex)}), 503
+    return Response(stream_with_context(live.sse(sub, tailer)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# request latency by Flask rule (/_dash-update-component, /metrics, ...)
+@server.before_request
+def start_timer():
+    g.t0 = time.perf_counter()
+
+@server.after_request
+def observe_request(resp):
+    if "t0" in g:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - g.t0, app="dash", method=request.method,
+                                     route=rule, status=resp.status_code)
+    return resp
+
+@server.route("/metrics")
+def metrics_text():
+    try:
+        store.update_ingest_lag()
+    except sqlite3.Error:
+        pass    # no database yet
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 products = get_products()
 
 app.layout = html.Div([
@@ -139,12 +114,17 @@ app.layout = html.Div([
                    marks={i: str(i) for i in range(1, 31, 5)},
                    id="bucket"),
     ], style={"maxWidth": "600px"}),
-    dcc.Interval(id="refresh", interval=30_000, n_intervals=0),
+    # updates are pushed (see /live); this only re-renders now and then to drop stale buckets
+    dcc.Interval(id="refresh", interval=600_000, n_intervals=0),
+    dcc.Store(id="live"),
+    html.Small(id="live_status"),
 
     dcc.Graph(id="trend_graph"),
     dcc.Graph(id="kw_graph"),
     html.H3("Recent reviews"),
     dcc.Loading(html.Div(id="table_div")),
+    html.H3("Alerts"),
+    html.Ul(id="alerts_list"),
 ])
 
 # ---------- callback ----------
@@ -152,6 +132,7 @@ app.layout = html.Div([
     Output("trend_graph", "figure"),
     Output("kw_graph", "figure"),
     Output("table_div", "children"),
+    Output("live", "data"),
     Input("product", "value"),
     Input("win", "value"),
     Input("bucket", "value"),
@@ -159,9 +140,9 @@ app.layout = html.Div([
 )
 def update(product_id, window_minutes, bucket_minutes, _n):
     try:
-        tdf = get_trend(product_id, window_minutes, bucket_minutes)
-        kdf = get_keywords(product_id, since_minutes=window_minutes)
-        rdf = get_recent_reviews(product_id, limit=50)
+        # one shared, incrementally refreshed snapshot per (product, window)
+        view = store.read(product_id, window_minutes, bucket_minutes=bucket_minutes, topk=20, limit=50)
+        tdf = trend_frame(view["trend"])
 
         # trend
         if tdf.empty:
@@ -174,24 +155,36 @@ def update(product_id, window_minutes, bucket_minutes, _n):
                             title="Sentiment Trend")
 
         # keywords
-        fig_k = px.bar(kdf, x="keyword", y="count",
-                       title="Top Keywords") if not kdf.empty else px.bar(title="Top Keywords (no data)")
+        kws = view["keywords"]
+        fig_k = px.bar(x=[k for k, _ in kws], y=[n for _, n in kws], labels={"x": "keyword", "y": "count"},
+                       title="Top Keywords") if kws else px.bar(title="Top Keywords (no data)")
 
         # table
         rows = [
-            html.Tr([html.Td(r["ts_utc"]), html.Td(r["sentiment"]), html.Td(r["snippet"])])
-            for _, r in rdf.iterrows()
+            html.Tr([html.Td(ts), html.Td(s), html.Td(snip)])
+            for ts, s, snip in view["recent"]
         ]
         table = html.Table(
             [html.Thead(html.Tr([html.Th("ts_utc"), html.Th("sentiment"), html.Th("snippet")]))] +
             [html.Tbody(rows)]
         )
 
-        return fig_t, fig_k, table
+        # the page now shows everything up to last_id; the stream carries on from there
+        cfg = {"product": product_id, "since": view["last_id"], "bucket": bucket_minutes,
+               "window": window_minutes, "topk": 20, "limit": 50, "recent": view["recent"],
+               "rendered_at": time.time()}
+        return fig_t, fig_k, table, cfg
 
     except Exception as ex:
         # render the error instead of hanging
-        return px.line(title="Error"), px.bar(title="Error"), html.Pre(str(ex))
+        return px.line(title="Error"), px.bar(title="Error"), html.Pre(str(ex)), no_update
+
+# open (or move) this tab's stream whenever a fresh view is rendered
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="connect"),
+    Output("live_status", "children"),
+    Input("live", "data"),
+)
 
 # ---------- main ----------
 if __name__ == "__main__":
@@ -0,0 +1,350 @@
+# enrich.py
+"""Batch NLP enrichment: fill sentiment, keywords and entities on stored reviews.
+
+    python enrich.py                         # follow new rows (Ctrl-C to stop)
+    python enrich.py --once --workers 4      # drain the backlog and exit
+    python enrich.py --keywords simple --entities caps   # no models needed
+
+A review is unenriched while `keywords IS NULL`. Rows are pulled in batches
+by id, split into chunks for a process pool (each worker loads its
+extractors once), and written back with one executemany per batch; the
+rollup triggers pick up the updates. Rows that arrived with a sentiment
+keep it.
+
+Each distinct text is computed once: results are looked up by content hash
+in enrich_cache.py first, so duplicates and recycled texts skip the NLP.
+
+Extractors are plain classes registered per stage. Each takes a list of
+texts and returns one result per text, so spaCy/RAKE can batch internally.
+The `simple`/`caps`/`rules` fallbacks are pure Python and always available.
+"""
+import argparse, json, os, re, sqlite3, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from enrich_cache import EnrichCache, text_key
+
+DB = "reviews.db"
+
+PENDING_SQL = """
+SELECT id, review_text, sentiment
+FROM reviews
+WHERE keywords IS NULL AND id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+UPDATE_SQL = """
+UPDATE reviews
+SET sentiment = COALESCE(sentiment, ?), keywords = ?, entities = ?
+WHERE id = ?
+"""
+
+STAGES = ("sentiment", "keywords", "entities")
+EXTRACTORS = {stage: {} for stage in STAGES}
+
+def register(stage, name):
+    def deco(cls):
+        EXTRACTORS[stage][name] = cls
+        return cls
+    return deco
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she should
+so some such than that the their theirs them themselves then there these they this those through to
+too under until up very was we were what when where which while who whom why will with would you
+your yours yourself yourselves also get got one really even still much many well
+""".split())
+
+# ---------- sentiment ----------
+@register("sentiment", "rules")
+class RuleSentiment:
+    """The notebook's keyword rule, vectorized only in the sense of taking a list."""
+    version = "rules-1"
+    NEGATIVE = ("bad", "not", "terrible", "awful", "disappointing")
+    POSITIVE = ("great", "good", "excellent", "amazing")
+
+    def __call__(self, texts):
+        out = []
+        for t in texts:
+            t = (t or "").lower()
+            if any(w in t for w in self.NEGATIVE):
+                out.append("negative")
+            elif any(w in t for w in self.POSITIVE):
+                out.append("positive")
+            else:
+                out.append("neutral")
+        return out
+
+@register("sentiment", "model")
+class ModelSentiment:
+    """The trained classifier from sentiment_model.py (one predict per chunk)."""
+
+    def __init__(self):
+        import sentiment_model
+        self.model = sentiment_model.get_model()
+        self.version = self.model.version
+
+    def __call__(self, texts):
+        return self.model.predict(texts)
+
+# ---------- keywords ----------
+_WORD = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+_SPLIT = re.compile(r"[.!?,;:\t\n\"()\[\]{}]+")
+
+@register("keywords", "simple")
+class SimpleRake:
+    """Pure-Python RAKE: phrases between stopwords/punctuation, scored by degree/frequency."""
+    version = "rake-py-1"
+
+    def __init__(self, topk=5, max_words=4):
+        self.topk = topk
+        self.max_words = max_words
+
+    def phrases(self, text):
+        out = []
+        for part in _SPLIT.split((text or "").lower()):
+            cur = []
+            for w in _WORD.findall(part):
+                if w in STOPWORDS:
+                    if cur:
+                        out.append(cur)
+                    cur = []
+                else:
+                    cur.append(w)
+            if cur:
+                out.append(cur)
+        return [p for p in out if len(p) <= self.max_words]
+
+    def one(self, text):
+        phrases = self.phrases(text)
+        freq, degree = Counter(), Counter()
+        for p in phrases:
+            for w in p:
+                freq[w] += 1
+                degree[w] += len(p)
+        scored = {}
+        for p in phrases:
+            key = " ".join(p)
+            scored[key] = sum(degree[w] / freq[w] for w in p)
+        return [k for k, _ in sorted(scored.items(), key=lambda kv: (-kv[1], kv[0]))[:self.topk]]
+
+    def __call__(self, texts):
+        return [self.one(t) for t in texts]
+
+@register("keywords", "rake")
+class NltkRake:
+    """rake_nltk, as in the notebook (needs the nltk stopwords/punkt data)."""
+    version = "rake-nltk-1"
+
+    def __init__(self, topk=5):
+        from rake_nltk import Rake
+        self.r = Rake()
+        self.topk = topk
+
+    def __call__(self, texts):
+        out = []
+        for t in texts:
+            if not isinstance(t, str) or not t.strip():
+                out.append([])
+                continue
+            self.r.extract_keywords_from_text(t)
+            out.append(self.r.get_ranked_phrases()[:self.topk])
+        return out
+
+# ---------- entities ----------
+ENTITY_LABELS = {"PRODUCT", "ORG", "GPE", "PERSON"}
+_CAPS = re.compile(r"\b[A-Z][\w&\-]*(?:\s+[A-Z][\w&\-]*)*")
+
+@register("entities", "caps")
+class CapsEntities:
+    """Runs of capitalized words that don't start a sentence; a rough stand-in for NER."""
+    version = "caps-1"
+
+    def one(self, text):
+        out = []
+        for m in _CAPS.finditer(text or ""):
+            before = text[:m.start()].rstrip()
+            if not before or before[-1] in ".!?":
+                continue        # sentence start, capitalized anyway
+            ent = m.group(0)
+            if ent.lower() not in STOPWORDS and ent not in out:
+                out.append(ent)
+        return out
+
+    def __call__(self, texts):
+        return [self.one(t) for t in texts]
+
+@register("entities", "spacy")
+class SpacyEntities:
+    version = "spacy-ner-1"
+
+    def __init__(self, model="en_core_web_sm", batch_size=128):
+        import spacy
+        # keep only NER to reduce overhead
+        self.nlp = spacy.load(model, disable=["tok2vec", "tagger", "attribute_ruler", "lemmatizer", "parser"])
+        self.batch_size = batch_size
+        self.version = f"spacy-{model}-{self.nlp.meta.get('version', '?')}"
+
+    def __call__(self, texts):
+        return [[e.text for e in doc.ents if e.label_ in ENTITY_LABELS]
+                for doc in self.nlp.pipe([t or "" for t in texts], batch_size=self.batch_size)]
+
+def load_extractor(stage, name):
+    """Build the named extractor, falling back to the pure-Python one if its models are missing."""
+    fallback = {"sentiment": "rules", "keywords": "simple", "entities": "caps"}[stage]
+    try:
+        return EXTRACTORS[stage][name]()
+    except Exception as e:
+        if name == fallback:
+            raise
+        print(f"[enrich] {stage} extractor '{name}' unavailable ({e}); using '{fallback}'")
+        return EXTRACTORS[stage][fallback]()
+
+# ---------- worker side ----------
+_stages = None
+
+def _init_worker(names):
+    global _stages
+    _stages = {stage: load_extractor(stage, names[stage]) for stage in STAGES}
+
+def stage_versions():
+    return {stage: getattr(ext, "version", "?") for stage, ext in _stages.items()}
+
+def enrich_chunk(texts):
+    """texts -> ([(sentiment, keywords_json, entities_json)], {stage: seconds})."""
+    texts = [t or "" for t in texts]
+    timings = {}
+    out = []
+    for stage in STAGES:
+        t0 = time.perf_counter()
+        out.append(_stages[stage](texts))
+        timings[stage] = time.perf_counter() - t0
+    sent, kws, ents = out
+    return [(s, json.dumps(k, ensure_ascii=False), json.dumps(e, ensure_ascii=False))
+            for s, k, e in zip(sent, kws, ents)], timings
+
+# ---------- driver ----------
+class Enricher:
+    def __init__(self, db=DB, batch=1024, workers=os.cpu_count() or 1, chunk=128,
+                 sentiment="rules", keywords="simple", entities="caps", cache_entries=100_000):
+        self.db = db
+        self.batch = batch
+        self.chunk = chunk
+        self.workers = workers
+        self.names = {"sentiment": sentiment, "keywords": keywords, "entities": entities}
+        self.cache_entries = cache_entries    # 0 disables the cache
+        self.cache = None
+        self.last_id = 0
+        self.totals = Counter()
+        self.docs = 0
+        self.computed = 0
+        self.dupes = 0
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.db)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA busy_timeout=30000;")
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.names,))
+            versions = self.pool.submit(stage_versions).result()
+        else:
+            self.pool = None
+            _init_worker(self.names)
+            versions = stage_versions()
+        # what the workers actually loaded (after any fallback), e.g. a new model artifact
+        self.version = ";".join(f"{k}={versions[k]}" for k in STAGES)
+        if self.cache_entries:
+            self.cache = EnrichCache(self.conn, self.version, self.cache_entries)
+        print(f"[enrich] extractors: {self.version}")
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool:
+            self.pool.shutdown()
+        self.conn.close()
+
+    def run_batch(self):
+        """Enrich up to `batch` pending rows; returns how many were written."""
+        t0 = time.perf_counter()
+        rows = self.conn.execute(PENDING_SQL, (self.last_id, self.batch)).fetchall()
+        if not rows:
+            return 0
+        # one computation per distinct text, cached ones none at all
+        keys = [text_key(t) for _, t, _ in rows]
+        texts = dict(zip(keys, (t for _, t, _ in rows)))
+        results = self.cache.get_many(list(texts)) if self.cache else {}
+        todo = [k for k in texts if k not in results]
+
+        stage_sec = Counter()
+        if todo:
+            chunks = [[texts[k] for k in todo[i:i + self.chunk]] for i in range(0, len(todo), self.chunk)]
+            done = self.pool.map(enrich_chunk, chunks) if self.pool else map(enrich_chunk, chunks)
+            fresh = {}
+            for out, timings in done:
+                fresh.update(zip(todo[len(fresh):len(fresh) + len(out)], out))
+                stage_sec.update(timings)
+            results.update(fresh)
+
+        t_write = time.perf_counter()
+        with self.conn:
+            if self.cache and todo:
+                self.cache.put_many(fresh)
+            self.conn.executemany(UPDATE_SQL, [(*results[k], rid) for k, (rid, _, _) in zip(keys, rows)])
+        stage_sec["write"] = time.perf_counter() - t_write
+        stage_sec["total"] = time.perf_counter() - t0
+        self.last_id = rows[-1][0]
+
+        self.docs += len(rows)
+        self.computed += len(todo)
+        self.dupes += len(rows) - len(texts)
+        self.totals.update(stage_sec)
+        # NLP stages: per worker-second over the texts actually computed; write/total: over all rows
+        rates = " ".join(f"{k}={(len(todo) if k in STAGES else len(rows)) / v:,.0f}"
+                         for k, v in stage_sec.items() if v > 0)
+        print(f"[enrich] {len(rows)} docs ({len(todo)} computed) up to id={self.last_id}  docs/s: {rates}")
+        return len(rows)
+
+    def run(self, once=False, idle_sleep=2.0):
+        try:
+            while True:
+                if self.run_batch():
+                    continue
+                if once:
+                    break
+                time.sleep(idle_sleep)
+        except KeyboardInterrupt:
+            pass
+        return self.summary()
+
+    def summary(self):
+        out = {"docs": self.docs, "computed": self.computed, "in_batch_duplicates": self.dupes}
+        for k, v in self.totals.items():
+            if v > 0:
+                out[f"{k}_docs_per_sec"] = round((self.computed if k in STAGES else self.docs) / v, 1)
+        if self.cache:
+            out["cache"] = self.cache.stats()
+        # time saved: rows served from the cache or a duplicate, at the measured cost per computed text
+        nlp_sec = sum(self.totals[k] for k in STAGES)
+        if self.computed:
+            out["nlp_seconds_saved"] = round((self.docs - self.computed) * nlp_sec / self.computed, 2)
+        return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Enrich reviews with sentiment, keywords and entities.")
+    ap.add_argument("--db", default=DB)
+    ap.add_argument("--once", action="store_true", help="exit when nothing is pending")
+    ap.add_argument("--batch", type=int, default=1024, help="rows read and written per batch")
+    ap.add_argument("--chunk", type=int, default=128, help="rows per worker task")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--sentiment", default="rules", choices=sorted(EXTRACTORS["sentiment"]))
+    ap.add_argument("--keywords", default="simple", choices=sorted(EXTRACTORS["keywords"]))
+    ap.add_argument("--entities", default="caps", choices=sorted(EXTRACTORS["entities"]))
+    ap.add_argument("--cache-entries", type=int, default=100_000, help="in-memory cache tier size; 0 disables caching")
+    a = ap.parse_args()
+    with Enricher(a.db, a.batch, a.workers, a.chunk, a.sentiment, a.keywords, a.entities,
+                  a.cache_entries) as e:
+        print("[enrich] done:", e.run(once=a.once))
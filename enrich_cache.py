@@ -0,0 +1,98 @@
+# enrich_cache.py
+"""Content-addressed cache of enrichment results (sentiment, keywords, entities).
+
+Keyed by a hash of the normalized review text (Unicode NFC, whitespace
+collapsed, trimmed; case is kept because entity extraction depends on it).
+Two tiers: a bounded in-process LRU in front of the `enrich_cache` table,
+which lives next to `reviews` so its writes share the enrichment transaction.
+
+Every entry records the extractor version string it was computed with.
+Opening the cache with a different version deletes the stale rows, so a new
+model or extractor never serves old results.
+"""
+import hashlib, re, unicodedata
+from collections import OrderedDict
+
+ENRICH_CACHE = """
+CREATE TABLE IF NOT EXISTS enrich_cache (
+  text_hash BLOB PRIMARY KEY,    -- blake2b-128 of the normalized text
+  version TEXT NOT NULL,         -- extractor versions that produced it
+  sentiment TEXT,
+  keywords TEXT NOT NULL,        -- JSON list
+  entities TEXT NOT NULL         -- JSON list
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO enrich_cache (text_hash, version, sentiment, keywords, entities)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(text_hash) DO UPDATE SET
+  version = excluded.version, sentiment = excluded.sentiment,
+  keywords = excluded.keywords, entities = excluded.entities;
+"""
+
+_WS = re.compile(r"\s+")
+
+def text_key(text):
+    norm = _WS.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+    return hashlib.blake2b(norm.encode("utf-8"), digest_size=16).digest()
+
+class EnrichCache:
+    def __init__(self, conn, version, max_entries=100_000, lookup_chunk=500):
+        self.conn = conn
+        self.version = version
+        self.max_entries = max_entries
+        self.lookup_chunk = lookup_chunk      # stays under SQLite's bound-parameter limit
+        self._lru = OrderedDict()             # text_hash -> (sentiment, keywords_json, entities_json)
+        self.lru_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        conn.execute(ENRICH_CACHE)
+        with conn:
+            stale = conn.execute("DELETE FROM enrich_cache WHERE version <> ?", (version,)).rowcount
+        if stale:
+            print(f"[enrich-cache] dropped {stale} entries from other extractor versions")
+
+    def get_many(self, keys):
+        """{key: (sentiment, keywords_json, entities_json)} for the keys that are cached."""
+        found, cold = {}, []
+        for k in keys:
+            v = self._lru.get(k)
+            if v is None:
+                cold.append(k)
+            else:
+                self._lru.move_to_end(k)
+                found[k] = v
+        self.lru_hits += len(found)
+        for i in range(0, len(cold), self.lookup_chunk):
+            part = cold[i:i + self.lookup_chunk]
+            sql = ("SELECT text_hash, sentiment, keywords, entities FROM enrich_cache "
+                   f"WHERE version = ? AND text_hash IN ({','.join('?' * len(part))})")
+            for k, s, kw, ents in self.conn.execute(sql, (self.version, *part)):
+                found[k] = (s, kw, ents)
+                self._remember(k, (s, kw, ents))
+                self.db_hits += 1
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Store {key: (sentiment, keywords_json, entities_json)}; the caller commits."""
+        self.conn.executemany(UPSERT, [(k, self.version, *v) for k, v in items.items()])
+        for k, v in items.items():
+            self._remember(k, v)
+
+    def _remember(self, k, v):
+        self._lru[k] = v
+        self._lru.move_to_end(k)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def stats(self):
+        lookups = self.lru_hits + self.db_hits + self.misses
+        return {
+            "entries_in_memory": len(self._lru),
+            "lru_hits": self.lru_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.lru_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -1,13 +1,15 @@
 # ingest_worker.py
-import csv, json, time, sqlite3, ast
-from datetime import datetime
+import csv, gzip, json, os, time, sqlite3, ast, queue, threading, calendar, argparse
+
+import metrics
+from storage import INSERT, is_postgres, open_storage
 
 DB = "reviews.db"
 ISO = "%Y-%m-%dT%H:%M:%SZ"
 ALLOWED = {"positive","neutral","negative"}
 
-def open_db():
-    c = sqlite3.connect(DB, check_same_thread=False)
+def open_db(db=DB):
+    c = sqlite3.connect(db, check_same_thread=False)
     c.execute("PRAGMA journal_mode=WAL;")
     c.execute("PRAGMA busy_timeout=30000;")
     return c
@@ -34,56 +36,382 @@ def norm_sentiment(s):
     s = (s or "").strip().lower()
     return s if s in ALLOWED else "neutral"
 
-def insert_review(c, r):
-    c.execute("""
-        INSERT INTO reviews (review_id, product_id, review_text, sentiment, keywords, entities, ts_utc)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
+def iso_to_epoch(ts_utc):
+    return calendar.timegm(time.strptime(ts_utc, ISO))
+
+def dump_list(v):
+    # None stays NULL: the row is left for enrich.py to fill in
+    return None if v is None else json.dumps(v, ensure_ascii=False)
+
+def review_params(r):
+    ts_epoch = r.get("ts_epoch")
+    if ts_epoch is None:
+        ts_epoch = iso_to_epoch(r["ts_utc"])
+    return (
         r["review_id"],
         r["product_id"],
         r["review_text"],
-        r["sentiment"],
-        json.dumps(r.get("keywords", []), ensure_ascii=False),
-        json.dumps(r.get("entities", []), ensure_ascii=False),
+        r.get("sentiment"),
+        dump_list(r.get("keywords", [])),
+        dump_list(r.get("entities", [])),
         r["ts_utc"],
-    ))
+        ts_epoch,
+    )
+
+def classify_missing(rows):
+    """Fill `sentiment` on rows that have none with the trained model, one batch predict."""
+    need = [r for r in rows if r.get("sentiment") not in ALLOWED]
+    if need:
+        from sentiment_model import classify
+        for r, label in zip(need, classify([r["review_text"] for r in need])):
+            r["sentiment"] = label
+    return rows
+
+def insert_review(c, r):
+    c.execute(INSERT, review_params(r))
     c.commit()
 
-def loop_from_csv(csv_path="stream_output.csv", product_id="P001", sleep_sec=5):
-    rows = []
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        rdr = csv.DictReader(f)
-        i = 0
-        for raw in rdr:
-            review_text = raw.get("reviewText") or raw.get("review_text") or ""
-            if not review_text:
+# ---------- group-commit writer ----------
+class Ticket:
+    """What became of the rows of one put_many call.
+
+    The writer thread adds to `written`/`failed` as batches land; `wait()`
+    returns True once every row is accounted for.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.written = 0
+        self.failed = 0
+        self._lock = threading.Lock()       # the writer thread and a failing put_many both settle
+        self._done = threading.Event()
+        if not rows:
+            self._done.set()
+
+    def _settle(self, written, failed):
+        with self._lock:
+            self.written += written
+            self.failed += failed
+            if self.written + self.failed >= self.rows:
+                self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+class BatchWriter:
+    """Queue reviews from any number of producers and write them from one thread.
+
+    `db` is a SQLite path or a postgresql:// URL (see storage.py). Rows are
+    flushed as one batch insert + commit once `max_rows` are
+    queued or the oldest queued row has waited `max_delay` seconds. `put`
+    blocks while the queue holds `max_queue` rows, so fast producers are
+    slowed down instead of growing memory. `close()` drains what is queued.
+    `put_many` returns a Ticket for callers that need their own rows' outcome.
+
+    The store is opened in `start()`, so a bad `db` fails there. If the writer
+    thread dies later, `error` is set: `put*` raise instead of queueing for
+    nobody and `flush()` returns False.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db=DB, max_rows=500, max_delay=0.2, max_queue=10_000, verbose=True):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.verbose = verbose
+        self.label = "postgres" if is_postgres(db) else os.path.basename(db)
+        self.q = queue.Queue(maxsize=max_queue)
+        self._cv = threading.Condition()
+        self._submitted = 0
+        self._done = 0
+        self._thread = None
+        self.error = None
+        # stats
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.last_flush_ms = 0.0
+        self.last_rows_per_sec = 0.0
+
+    def start(self):
+        if self._thread is None:
+            store = open_storage(self.db)     # raises here, not on a thread nobody watches
+            self.error = None
+            metrics.INGEST_QUEUE.set_function(self.q.qsize, writer=self.label)
+            self._thread = threading.Thread(target=self._run, args=(store,), name="batch-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def _enqueue(self, item, deadline):
+        # short waits, so a producer blocked on a full queue notices the writer dying
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f"batch writer stopped: {self.error}")
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                raise queue.Full
+            try:
+                self.q.put(item, timeout=0.5 if left is None else min(left, 0.5))
+                return
+            except queue.Full:
                 continue
-            row = {
-                "review_id": f"sim-{i}",
-                "product_id": product_id,
-                "review_text": review_text,
-                "sentiment": norm_sentiment(raw.get("sentiment")),
-                "keywords": parse_list(raw.get("keywords")),
-                "entities": parse_list(raw.get("entities")),
-            }
-            rows.append(row); i += 1
 
-    if not rows:
-        print("No usable rows in CSV. Exiting."); return
+    def put(self, r, timeout=None):
+        """Queue one review dict; blocks while the queue is full (backpressure)."""
+        self._enqueue((r, None), None if timeout is None else time.monotonic() + timeout)
+        with self._cv:
+            self._submitted += 1
 
-    c = open_db()
-    i = 0
-    while True:
-        r = rows[i % len(rows)].copy()
-        r["review_id"] = f"sim-{i}-{int(time.time())}"
-        r["ts_utc"] = datetime.utcnow().strftime(ISO)
+    def put_many(self, rows, timeout=None):
+        """Queue a list of review dicts (blocking per row while the queue is full); returns their Ticket.
+
+        `timeout` covers the whole list. On queue.Full (or a stopped writer) the
+        rows already queued are still written; the rest are failed on the Ticket.
+        """
+        ticket = Ticket(len(rows))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        n = 0
         try:
-            insert_review(c, r)
-            print(f"inserted {r['review_id']} {r['sentiment']}")
+            for r in rows:
+                self._enqueue((r, ticket), deadline)
+                n += 1
+        except BaseException:
+            ticket._settle(0, len(rows) - n)
+            raise
+        finally:
+            with self._cv:
+                self._submitted += n
+        return ticket
+
+    def flush(self, timeout=None):
+        """Wait until every row put before this call has been written or counted in rows_failed.
+
+        False on timeout, or if the writer thread died with rows still queued.
+        """
+        with self._cv:
+            target = self._submitted
+            return self._cv.wait_for(lambda: self._done >= target or self.error is not None,
+                                     timeout=timeout) and self._done >= target
+
+    def close(self):
+        if self._thread is None:
+            return
+        if self.error is None:
+            self.q.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        return {
+            "queue_depth": self.q.qsize(),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "last_rows_per_sec": round(self.last_rows_per_sec, 1),
+        }
+
+    def _run(self, store):
+        try:
+            stop = False
+            while not stop:
+                item = self.q.get()
+                if item is self._STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.max_delay
+                while len(batch) < self.max_rows:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    try:
+                        item = self.q.get(timeout=left)
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._write(store, batch)
+        except BaseException as e:
+            print("batch writer stopped:", e)
+            with self._cv:
+                self.error = e
+                self._cv.notify_all()
+            raise
+        finally:
+            store.close()
+
+    def _write(self, store, items):
+        t0 = time.perf_counter()
+        batch = [r for r, _ in items]
+        written = [False] * len(batch)
+        try:
+            try:
+                store.insert_reviews([review_params(r) for r in batch])
+                written = [True] * len(batch)
+            except Exception as e:
+                # isolate the bad rows so one malformed review doesn't drop the batch
+                print("batch insert error, retrying row by row:", e)
+                params, at = [], []
+                for i, r in enumerate(batch):
+                    try:
+                        params.append(review_params(r))
+                        at.append(i)
+                    except Exception as e:
+                        print("insert error:", r.get("review_id"), e)
+                for i, row_ok in zip(at, store.insert_reviews_each(params)):
+                    written[i] = row_ok
         except Exception as e:
-            print("insert error:", e)
-        i += 1
-        time.sleep(sleep_sec)
+            # the database itself failed (locked past the timeout, disk full, connection lost):
+            # count the batch as failed and keep the writer thread alive
+            print(f"batch of {len(batch)} rows dropped:", e)
+        finally:
+            ok = sum(written)
+            tickets = {}
+            for (_, t), row_ok in zip(items, written):
+                if t is not None:
+                    n = tickets.setdefault(t, [0, 0])
+                    n[0 if row_ok else 1] += 1
+            for t, (w, f) in tickets.items():
+                t._settle(w, f)
+            dt = time.perf_counter() - t0
+            self.flushes += 1
+            self.rows_written += ok
+            self.rows_failed += len(batch) - ok
+            self.last_flush_ms = dt * 1000
+            self.last_rows_per_sec = len(batch) / dt if dt > 0 else 0.0
+            # flush() waiters are released whatever happened to the rows
+            with self._cv:
+                self._done += len(batch)
+                self._cv.notify_all()
+        metrics.INGEST_COMMIT.observe(dt, writer=self.label)
+        metrics.INGEST_ROWS.inc(ok, writer=self.label, result="ok")
+        metrics.INGEST_ROWS.inc(len(batch) - ok, writer=self.label, result="failed")
+        newest = max((r.get("ts_epoch") or 0 for r in batch), default=0)
+        if newest:
+            metrics.INGEST_LAG.set(round(time.time() - newest, 3))
+        if self.verbose:
+            print(f"flushed {ok}/{len(batch)} rows in {self.last_flush_ms:.1f} ms "
+                  f"({self.last_rows_per_sec:.0f} rows/s, queue={self.q.qsize()})")
+
+def _open_text(path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, newline="", encoding="utf-8")
+
+def _raw_records(path):
+    """Dicts from a CSV export or a JSON dump (one array, or one object per line), plain or .gz."""
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open_text(path) as f:
+        if not name.endswith((".json", ".jsonl", ".ndjson")):
+            yield from csv.DictReader(f)
+            return
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        if not head:
+            return
+        if head == "[":
+            yield from json.loads(head + f.read())
+            return
+        yield json.loads(head + f.readline())
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_rows(path, product_id="P001", model=False):
+    """Replayable review dicts from a CSV or JSON dump; rows without text are skipped."""
+    rows = []
+    for raw in _raw_records(path):
+        review_text = raw.get("reviewText") or raw.get("review_text") or ""
+        if not review_text:
+            continue
+        sentiment = raw.get("sentiment")
+        if sentiment is None and raw.get("overall") is not None:
+            # raw Amazon dumps carry the star rating instead of a label
+            from amazon_reader import label_sentiment
+            sentiment = label_sentiment(float(raw["overall"]))
+        rows.append({
+            "review_id": f"sim-{len(rows)}",
+            "product_id": product_id,
+            "review_text": review_text,
+            "sentiment": (sentiment or "").strip().lower() if model else norm_sentiment(sentiment),
+            "keywords": parse_list(raw.get("keywords")),
+            "entities": parse_list(raw.get("entities")),
+        })
+    if model:
+        # labels missing/invalid in the dump come from the trained model instead of 'neutral'
+        classify_missing(rows)
+    return rows
+
+def loop_from_csv(csv_path="stream_output.csv", product_id="P001", sleep_sec=5, writer=None, model=False, db=DB,
+                  rate=None, duration=None, stamp=None, rows=None):
+    """Replay a CSV/JSON dump as a live stream, stamping each row with the time it is produced.
+
+    By default one row every `sleep_sec` until interrupted. With `rate`, a
+    callable giving the target rows/s at a number of seconds into the replay,
+    rows are paced to that schedule (catching up without sleeping when behind)
+    for `duration` seconds, and `stamp(row, produced_at)` is called as each row
+    is queued. `rows` reuses the output of read_rows instead of reading the file
+    again. Returns the number of rows queued.
+    """
+    if rows is None:
+        rows = read_rows(csv_path, product_id, model)
+    if not rows:
+        print("No usable rows in CSV. Exiting."); return 0
+
+    # share the caller's writer if given, otherwise own one for this loop
+    own = writer is None
+    w = (writer or BatchWriter(db)).start()
+    i = 0
+    t0 = time.time()
+    due = t0
+    try:
+        while duration is None or time.time() - t0 < duration:
+            r = rows[i % len(rows)].copy()
+            r["product_id"] = product_id
+            produced = time.time()
+            r["review_id"] = f"sim-{i}-{int(produced * 1000)}"
+            r["ts_utc"] = time.strftime(ISO, time.gmtime(produced))
+            r["ts_epoch"] = int(produced)
+            w.put(r)
+            if stamp:
+                stamp(r, produced)
+            i += 1
+            if rate is None:
+                print(f"queued {r['review_id']} {r['sentiment']}")
+                time.sleep(sleep_sec)
+                continue
+            due += 1.0 / max(rate(produced - t0), 1e-3)
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if own:
+            w.close()
+            print("writer drained:", w.stats())
+    return i
 
 if __name__ == "__main__":
-    loop_from_csv()
+    ap = argparse.ArgumentParser(description="Replay a review CSV or JSON dump as a live stream.")
+    ap.add_argument("csv", nargs="?", default="stream_output.csv", help="CSV, JSON array or JSON lines (.gz ok)")
+    ap.add_argument("--db", default=DB, help="SQLite path or postgresql:// URL")
+    ap.add_argument("--product", default="P001")
+    ap.add_argument("--sleep", type=float, default=5, help="seconds between reviews")
+    ap.add_argument("--rate", type=float, help="replay at this many rows/s instead of --sleep (see bench/replay.py)")
+    ap.add_argument("--duration", type=float, help="stop after this many seconds (with --rate)")
+    ap.add_argument("--model", action="store_true", help="label rows without a sentiment with the trained model")
+    ap.add_argument("--metrics-port", type=int, help="serve Prometheus /metrics on this port")
+    a = ap.parse_args()
+    if a.metrics_port:
+        metrics.serve(a.metrics_port)
+    rate = (lambda _t: a.rate) if a.rate else None
+    loop_from_csv(a.csv, a.product, a.sleep, model=a.model, db=a.db, rate=rate, duration=a.duration)
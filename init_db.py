@@ -1,15 +1,8 @@
-import sqlite3
+import argparse, sqlite3
 
 DB = "reviews.db"
-conn = sqlite3.connect(DB)
-cur = conn.cursor()
 
-cur.execute("PRAGMA journal_mode=WAL;")
-cur.execute("PRAGMA synchronous=NORMAL;")
-cur.execute("PRAGMA busy_timeout=30000;")
-cur.execute("PRAGMA foreign_keys=ON;")
-
-cur.execute("""
+REVIEWS = """
 CREATE TABLE IF NOT EXISTS reviews (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   review_id TEXT,
@@ -18,13 +11,12 @@ CREATE TABLE IF NOT EXISTS reviews (
   sentiment TEXT CHECK (sentiment IN ('positive','neutral','negative')),
   keywords TEXT,
   entities TEXT,
-  ts_utc TEXT NOT NULL    -- ISO8601 UTC, e.g. 2025-08-15T18:30:00Z
+  ts_utc TEXT NOT NULL,   -- ISO8601 UTC, e.g. 2025-08-15T18:30:00Z
+  ts_epoch INTEGER        -- same instant as unix seconds; range queries use this
 );
-""")
-cur.execute("CREATE INDEX IF NOT EXISTS idx_reviews_product_ts ON reviews(product_id, ts_utc);")
-cur.execute("CREATE INDEX IF NOT EXISTS idx_reviews_sentiment_ts ON reviews(sentiment, ts_utc);")
+"""
 
-cur.execute("""
+ALERTS = """
 CREATE TABLE IF NOT EXISTS alerts (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   product_id TEXT NOT NULL,
@@ -34,10 +26,388 @@ CREATE TABLE IF NOT EXISTS alerts (
   count INTEGER NOT NULL,
   created_at_utc TEXT NOT NULL
 );
-""")
+"""
+
+# secondary indexes on reviews; bulk loads drop and rebuild these
+INDEXES = {
+    "idx_reviews_product_ts": "CREATE INDEX IF NOT EXISTS idx_reviews_product_ts ON reviews(product_id, ts_utc);",
+    "idx_reviews_sentiment_ts": "CREATE INDEX IF NOT EXISTS idx_reviews_sentiment_ts ON reviews(sentiment, ts_utc);",
+    # the API/dashboard window queries: (ts_epoch, id) is the keyset order, so pages
+    # come out of the index already sorted; sentiment is filtered before the row is read
+    "idx_reviews_product_epoch_id": "CREATE INDEX IF NOT EXISTS idx_reviews_product_epoch_id "
+                                    "ON reviews(product_id, ts_epoch, id, sentiment);",
+    # covering for the alert scan (negatives in a time range, grouped by product)
+    "idx_reviews_sentiment_epoch": "CREATE INDEX IF NOT EXISTS idx_reviews_sentiment_epoch ON reviews(sentiment, ts_epoch, product_id);",
+    # rows still waiting for enrich.py; stays small, entries leave once keywords are set
+    "idx_reviews_unenriched": "CREATE INDEX IF NOT EXISTS idx_reviews_unenriched ON reviews(id) WHERE keywords IS NULL;",
+}
+
+# replaced by a differently shaped index above; init() drops them from existing databases
+RETIRED_INDEXES = ("idx_reviews_product_epoch",)   # (product_id, ts_epoch, sentiment): sorted pages by id
+
+# writers are expected to fill ts_epoch; this catches any that don't
+TS_EPOCH_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_reviews_ts_epoch AFTER INSERT ON reviews
+WHEN NEW.ts_epoch IS NULL
+BEGIN
+  UPDATE reviews SET ts_epoch = CAST(strftime('%s', NEW.ts_utc) AS INTEGER) WHERE id = NEW.id;
+END;
+"""
+
+# ---------- rollups ----------
+# per-minute sentiment counts, maintained by triggers so every writer keeps it
+# current; trend queries sum minute rows into the requested bucket width.
+# Deletes from reviews are not subtracted: the rollup is the long-horizon
+# history, and rebuild_rollups() recomputes it from raw rows when needed.
+SENTIMENT_MINUTE = """
+CREATE TABLE IF NOT EXISTS sentiment_minute (
+  product_id TEXT NOT NULL,
+  bucket INTEGER NOT NULL,       -- minute start, epoch seconds
+  positive INTEGER NOT NULL DEFAULT 0,
+  neutral INTEGER NOT NULL DEFAULT 0,
+  negative INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (product_id, bucket)
+) WITHOUT ROWID;
+"""
+
+def _minute(row):
+    return f"(COALESCE({row}.ts_epoch, CAST(strftime('%s', {row}.ts_utc) AS INTEGER)) / 60 * 60)"
+
+SENTIMENT_MINUTE_TRIGGERS = [
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_sentiment_minute_ins AFTER INSERT ON reviews
+WHEN NEW.sentiment IN ('positive','neutral','negative') AND {_minute("NEW")} IS NOT NULL
+BEGIN
+  INSERT INTO sentiment_minute (product_id, bucket, positive, neutral, negative)
+  VALUES (NEW.product_id, {_minute("NEW")},
+          NEW.sentiment = 'positive', NEW.sentiment = 'neutral', NEW.sentiment = 'negative')
+  ON CONFLICT(product_id, bucket) DO UPDATE SET
+    positive = positive + excluded.positive,
+    neutral = neutral + excluded.neutral,
+    negative = negative + excluded.negative;
+END;
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_sentiment_minute_upd AFTER UPDATE OF sentiment, product_id, ts_epoch, ts_utc ON reviews
+WHEN OLD.sentiment IS NOT NEW.sentiment OR OLD.product_id IS NOT NEW.product_id
+  OR {_minute("OLD")} IS NOT {_minute("NEW")}
+BEGIN
+  UPDATE sentiment_minute SET
+    positive = positive - (OLD.sentiment = 'positive'),
+    neutral = neutral - (OLD.sentiment = 'neutral'),
+    negative = negative - (OLD.sentiment = 'negative')
+  WHERE product_id = OLD.product_id AND bucket = {_minute("OLD")}
+    AND OLD.sentiment IN ('positive','neutral','negative');
+  INSERT INTO sentiment_minute (product_id, bucket, positive, neutral, negative)
+  SELECT NEW.product_id, {_minute("NEW")},
+         NEW.sentiment = 'positive', NEW.sentiment = 'neutral', NEW.sentiment = 'negative'
+  WHERE NEW.sentiment IN ('positive','neutral','negative') AND {_minute("NEW")} IS NOT NULL
+  ON CONFLICT(product_id, bucket) DO UPDATE SET
+    positive = positive + excluded.positive,
+    neutral = neutral + excluded.neutral,
+    negative = negative + excluded.negative;
+END;
+""",
+]
+
+# per-minute keyword/entity counts, normalized like the endpoints used to do it
+# in Python (trim + lowercase; SQLite's lower() only folds ASCII letters).
+# /keywords becomes one GROUP BY over this table instead of parsing JSON.
+TERM_MINUTE = """
+CREATE TABLE IF NOT EXISTS term_minute (
+  product_id TEXT NOT NULL,
+  kind TEXT NOT NULL,            -- 'keyword' | 'entity'
+  bucket INTEGER NOT NULL,       -- minute start, epoch seconds
+  term TEXT NOT NULL,
+  n INTEGER NOT NULL,
+  PRIMARY KEY (product_id, kind, bucket, term)
+) WITHOUT ROWID;
+"""
+
+TERM_COLUMNS = {"keyword": "keywords", "entity": "entities"}
+
+def _safe_list(expr):
+    # anything that isn't a JSON array counts as []
+    return f"CASE WHEN json_valid({expr}) AND json_type({expr}) = 'array' THEN {expr} ELSE '[]' END"
+
+def _norm(expr):
+    return f"lower(trim(CAST({expr} AS TEXT), char(32,9,10,11,12,13)))"
+
+def _terms(expr):
+    # normalized elements of a JSON list column
+    return f"SELECT {_norm('value')} AS t FROM json_each({_safe_list(expr)})"
+
+def _term_triggers(kind, col):
+    return [
+        f"""
+CREATE TRIGGER IF NOT EXISTS trg_term_minute_{kind}_ins AFTER INSERT ON reviews
+WHEN NEW.{col} IS NOT NULL AND {_minute("NEW")} IS NOT NULL
+BEGIN
+  INSERT INTO term_minute (product_id, kind, bucket, term, n)
+  SELECT NEW.product_id, '{kind}', {_minute("NEW")}, t, COUNT(*)
+  FROM ({_terms(f"NEW.{col}")}) WHERE t <> '' GROUP BY t
+  ON CONFLICT(product_id, kind, bucket, term) DO UPDATE SET n = n + excluded.n;
+END;
+""",
+        f"""
+CREATE TRIGGER IF NOT EXISTS trg_term_minute_{kind}_upd AFTER UPDATE OF {col}, product_id, ts_epoch, ts_utc ON reviews
+WHEN OLD.{col} IS NOT NEW.{col} OR OLD.product_id IS NOT NEW.product_id
+  OR {_minute("OLD")} IS NOT {_minute("NEW")}
+BEGIN
+  UPDATE term_minute
+  SET n = n - (SELECT COUNT(*) FROM ({_terms(f"OLD.{col}")}) WHERE t = term_minute.term)
+  WHERE product_id = OLD.product_id AND kind = '{kind}' AND bucket = {_minute("OLD")}
+    AND term IN ({_terms(f"OLD.{col}")});
+  INSERT INTO term_minute (product_id, kind, bucket, term, n)
+  SELECT NEW.product_id, '{kind}', {_minute("NEW")}, t, COUNT(*)
+  FROM ({_terms(f"NEW.{col}")}) WHERE t <> '' AND {_minute("NEW")} IS NOT NULL GROUP BY t
+  ON CONFLICT(product_id, kind, bucket, term) DO UPDATE SET n = n + excluded.n;
+END;
+""",
+    ]
+
+TERM_MINUTE_TRIGGERS = [ddl for kind, col in TERM_COLUMNS.items() for ddl in _term_triggers(kind, col)]
+
+# per-product change counter bumped on every write; the API response cache
+# compares it to decide whether a cached result is still current
+PRODUCT_WATERMARK = """
+CREATE TABLE IF NOT EXISTS product_watermark (
+  product_id TEXT PRIMARY KEY,
+  version INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+PRODUCT_WATERMARK_TRIGGERS = [
+    """
+CREATE TRIGGER IF NOT EXISTS trg_product_watermark_ins AFTER INSERT ON reviews
+BEGIN
+  INSERT INTO product_watermark (product_id, version) VALUES (NEW.product_id, 1)
+  ON CONFLICT(product_id) DO UPDATE SET version = version + 1;
+END;
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS trg_product_watermark_upd AFTER UPDATE ON reviews
+BEGIN
+  INSERT INTO product_watermark (product_id, version)
+  SELECT product_id, 1 FROM (SELECT NEW.product_id AS product_id UNION SELECT OLD.product_id) WHERE true
+  ON CONFLICT(product_id) DO UPDATE SET version = version + 1;
+END;
+""",
+]
+
+# ---------- full-text search ----------
+# external-content FTS5 index over reviews.review_text (the text is not stored
+# twice); kept in sync by trigger, so every writer maintains it. Porter
+# stemming: "batteries" finds "battery". product_id is indexed as a second
+# column so a product filter intersects posting lists instead of ranking every
+# match first. Sealed partitions have no index, so search covers the hot weeks
+# in this file.
+REVIEWS_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+  review_text, product_id, content='reviews', content_rowid='id', tokenize='porter unicode61'
+);
+"""
+
+REVIEWS_FTS_TRIGGERS = [
+    """
+CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_ins AFTER INSERT ON reviews
+BEGIN
+  INSERT INTO reviews_fts (rowid, review_text, product_id) VALUES (NEW.id, NEW.review_text, NEW.product_id);
+END;
+""",
+    # external content: removing a row means handing FTS5 the text it indexed
+    """
+CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_del AFTER DELETE ON reviews
+BEGIN
+  INSERT INTO reviews_fts (reviews_fts, rowid, review_text, product_id)
+  VALUES ('delete', OLD.id, OLD.review_text, OLD.product_id);
+END;
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_upd AFTER UPDATE OF review_text, product_id ON reviews
+BEGIN
+  INSERT INTO reviews_fts (reviews_fts, rowid, review_text, product_id)
+  VALUES ('delete', OLD.id, OLD.review_text, OLD.product_id);
+  INSERT INTO reviews_fts (rowid, review_text, product_id) VALUES (NEW.id, NEW.review_text, NEW.product_id);
+END;
+""",
+]
+
+# sealed weekly partitions (partitions.py): reviews/alerts with ts_epoch in
+# [start_epoch, end_epoch) were moved out of this file into `path`
+PARTITIONS = """
+CREATE TABLE IF NOT EXISTS partitions (
+  name TEXT PRIMARY KEY,          -- e.g. reviews-2025-W33
+  path TEXT NOT NULL,             -- relative to the directory holding reviews.db
+  start_epoch INTEGER NOT NULL,   -- Monday 00:00 UTC
+  end_epoch INTEGER NOT NULL,     -- exclusive
+  reviews INTEGER NOT NULL,
+  alerts INTEGER NOT NULL,
+  sealed_at_utc TEXT NOT NULL
+);
+"""
+
+# backfill_from_csv.py resume points, written in the same transaction as each batch
+BACKFILL_PROGRESS = """
+CREATE TABLE IF NOT EXISTS backfill_progress (
+  source TEXT PRIMARY KEY,
+  rows_done INTEGER NOT NULL,
+  base_ts_utc TEXT NOT NULL,   -- timestamps are derived from this, so a resumed load stays monotonic
+  updated_at_utc TEXT NOT NULL
+);
+"""
+
+def hot_from(conn):
+    """First ts_epoch not covered by a sealed partition (0 if nothing is sealed)."""
+    if "partitions" not in tables(conn):
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(end_epoch), 0) FROM partitions").fetchone()[0]
+
+def rebuild_rollups(conn):
+    """Recompute sentiment_minute and term_minute from the raw reviews.
+
+    Sealed weeks no longer have their raw rows here, so their rollup rows are
+    kept and only buckets from hot_from() on are rebuilt.
+    """
+    since = hot_from(conn)
+    with conn:
+        conn.execute("DELETE FROM sentiment_minute WHERE bucket >= ?;", (since,))
+        conn.execute("""
+            INSERT INTO sentiment_minute (product_id, bucket, positive, neutral, negative)
+            SELECT product_id, ts_epoch / 60 * 60,
+                   SUM(sentiment = 'positive'), SUM(sentiment = 'neutral'), SUM(sentiment = 'negative')
+            FROM reviews
+            WHERE sentiment IN ('positive','neutral','negative') AND ts_epoch >= ?
+            GROUP BY product_id, ts_epoch / 60
+        """, (since,))
+        conn.execute("DELETE FROM term_minute WHERE bucket >= ?;", (since,))
+        for kind, col in TERM_COLUMNS.items():
+            conn.execute(f"""
+                INSERT INTO term_minute (product_id, kind, bucket, term, n)
+                SELECT product_id, '{kind}', bucket, t, COUNT(*)
+                FROM (
+                  SELECT r.product_id, r.ts_epoch / 60 * 60 AS bucket,
+                         {_norm("j.value")} AS t
+                  FROM reviews r, json_each({_safe_list(f"r.{col}")}) j
+                  WHERE r.ts_epoch >= ?
+                )
+                WHERE t <> ''
+                GROUP BY product_id, bucket, t
+            """, (since,))
+    n = conn.execute("SELECT COUNT(*) FROM sentiment_minute").fetchone()[0]
+    m = conn.execute("SELECT COUNT(*) FROM term_minute").fetchone()[0]
+    print(f"Rebuilt sentiment_minute: {n} rows, term_minute: {m} rows")
+
+def rebuild_fts(conn, chunk=50_000):
+    """Re-index reviews_fts from reviews.review_text (existing databases, or after a bulk load without triggers).
+
+    Rows are indexed in id-range chunks, one short transaction each, so a live
+    writer isn't blocked behind the whole table; rows it inserts meanwhile are
+    indexed by the trigger (ids above the starting MAX(id)). Until the last
+    chunk commits, searches see a partial index. Don't run it alongside
+    `partitions.py seal`: deleting a row that isn't indexed yet would
+    corrupt the index.
+    """
+    with conn:
+        conn.execute("INSERT INTO reviews_fts (reviews_fts) VALUES ('delete-all');")
+        # read under the same write lock, so no insert falls between the wipe and `hi`
+        hi = conn.execute("SELECT COALESCE(MAX(id), 0) FROM reviews").fetchone()[0]
+    n = 0
+    for start in range(0, hi + 1, chunk):
+        with conn:
+            n += conn.execute("""
+                INSERT INTO reviews_fts (rowid, review_text, product_id)
+                SELECT id, review_text, product_id FROM reviews WHERE id >= ? AND id < ? AND id <= ?
+            """, (start, start + chunk, hi)).rowcount
+    with conn:
+        conn.execute("INSERT INTO reviews_fts (reviews_fts) VALUES ('optimize');")
+    print(f"Rebuilt reviews_fts: {n} rows")
+    return n
+
+def tables(conn):
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+def columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+
+def migrate_ts_epoch(conn, chunk=100_000):
+    """Add and backfill reviews.ts_epoch on databases created before it existed."""
+    if "ts_epoch" not in columns(conn, "reviews"):
+        conn.execute("ALTER TABLE reviews ADD COLUMN ts_epoch INTEGER;")
+        conn.commit()
+    lo, hi = conn.execute("SELECT MIN(id), MAX(id) FROM reviews WHERE ts_epoch IS NULL").fetchone()
+    if lo is None:
+        return 0
+    n = 0
+    # id-range chunks keep each write transaction short so live writers aren't starved
+    for start in range(lo, hi + 1, chunk):
+        cur = conn.execute("""
+            UPDATE reviews SET ts_epoch = CAST(strftime('%s', ts_utc) AS INTEGER)
+            WHERE id >= ? AND id < ? AND ts_epoch IS NULL
+        """, (start, start + chunk))
+        conn.commit()
+        n += cur.rowcount
+    print(f"Backfilled ts_epoch on {n} rows")
+    return n
+
+def init(conn):
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL;")
+    cur.execute("PRAGMA synchronous=NORMAL;")
+    cur.execute("PRAGMA busy_timeout=30000;")
+    cur.execute("PRAGMA foreign_keys=ON;")
+
+    cur.execute(REVIEWS)
+    migrate_ts_epoch(conn)
+    for ddl in INDEXES.values():
+        cur.execute(ddl)
+    for name in RETIRED_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name};")
+    cur.execute(TS_EPOCH_TRIGGER)
+
+    fresh_rollup = not {"sentiment_minute", "term_minute"} <= tables(conn)
+    cur.execute(SENTIMENT_MINUTE)
+    cur.execute(TERM_MINUTE)
+    for ddl in SENTIMENT_MINUTE_TRIGGERS + TERM_MINUTE_TRIGGERS:
+        cur.execute(ddl)
+    fresh_watermark = "product_watermark" not in tables(conn)
+    cur.execute(PRODUCT_WATERMARK)
+    for ddl in PRODUCT_WATERMARK_TRIGGERS:
+        cur.execute(ddl)
+    if fresh_watermark:
+        # it doubles as the product list (alert_worker rule engine), so seed it
+        cur.execute("INSERT OR IGNORE INTO product_watermark SELECT DISTINCT product_id, 1 FROM reviews;")
+    conn.commit()
+    if fresh_rollup and conn.execute("SELECT 1 FROM reviews LIMIT 1").fetchone():
+        rebuild_rollups(conn)
+
+    fresh_fts = "reviews_fts" not in tables(conn)
+    cur.execute(REVIEWS_FTS)
+    for ddl in REVIEWS_FTS_TRIGGERS:
+        cur.execute(ddl)
+    conn.commit()
+    if fresh_fts and conn.execute("SELECT 1 FROM reviews LIMIT 1").fetchone():
+        rebuild_fts(conn)
 
-# optional: prevent duplicate alerts for same product+window_end
-cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_alert ON alerts(product_id, rule, window_end_utc);")
+    cur.execute(ALERTS)
+    cur.execute(PARTITIONS)
+    # optional: prevent duplicate alerts for same product+window_end
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_alert ON alerts(product_id, rule, window_end_utc);")
+    # covering for the rule engine's cooldown lookup (alerts raised since a time, every cycle)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_created ON alerts(created_at_utc, product_id, rule);")
+    conn.commit()
 
-conn.commit(); conn.close()
-print("Created", DB)
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Create or migrate the reviews database.")
+    ap.add_argument("db", nargs="?", default=DB)
+    ap.add_argument("--rebuild-rollups", action="store_true", help="recompute rollup tables from raw reviews")
+    ap.add_argument("--rebuild-fts", action="store_true", help="re-index reviews_fts from raw reviews")
+    a = ap.parse_args()
+    conn = sqlite3.connect(a.db)
+    init(conn)
+    if a.rebuild_rollups:
+        rebuild_rollups(conn)
+    if a.rebuild_fts:
+        rebuild_fts(conn)
+    conn.close()
+    print("Created", a.db)
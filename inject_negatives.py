@@ -1,5 +1,5 @@
 # inject_negatives.py
-import sqlite3, datetime as dt, json, uuid
+import sqlite3, datetime as dt, json, uuid, calendar
 
 DB = "reviews.db"
 PRODUCT = "P001"   # must match DEFAULT_PRODUCT used in backfill
@@ -19,13 +19,14 @@ for i in range(N):
         json.dumps(["battery","refund","poor quality"]),
         "[]",
         ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        calendar.timegm(ts.timetuple()),
     ))
 
 conn = sqlite3.connect(DB)
 conn.execute("PRAGMA busy_timeout=30000;")
 conn.executemany("""
-INSERT INTO reviews (review_id, product_id, review_text, sentiment, keywords, entities, ts_utc)
-VALUES (?, ?, ?, ?, ?, ?, ?)
+INSERT INTO reviews (review_id, product_id, review_text, sentiment, keywords, entities, ts_utc, ts_epoch)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
 """, rows)
 conn.commit(); conn.close()
 print(f"Injected {N} negatives for product {PRODUCT}")
@@ -0,0 +1,314 @@
+# live.py
+"""Server-push of new reviews, trend deltas and alerts, from one tailer per process.
+
+    tailer = Tailer("reviews.db")
+    sub = tailer.subscribe("P001", since=last_id)      # last_id of the view the client already has
+    Response(sse(sub, tailer), mimetype="text/event-stream")              # Flask (dash_app.py)
+    StreamingResponse(sse_async(tailer.subscribe_async("P001", since), tailer), ...)   # FastAPI (app.py)
+
+One thread reads reviews (and alerts) with `id` above the last one it saw,
+every `interval` seconds, however many clients are connected, and fans the
+rows out per product. Each subscriber gets one `delta` event per tick in which
+its product changed:
+
+    {"last_id": 1234,
+     "reviews":  [[id, ts_utc, sentiment, snippet], ...],       # oldest first
+     "trend":    [[minute_epoch, positive, neutral, negative], ...],
+     "keywords": [[keyword, count], ...],
+     "alerts":   [{"id": .., "rule": .., "count": .., ...}, ...]}
+
+The SSE id is `last_id`, so a reconnecting EventSource resumes from where it
+stopped; a subscriber that resumes from before the in-memory backlog, or
+falls `max_pending` events behind, gets a `resync` event instead and should
+reload its view.
+"""
+import asyncio, json, queue, sqlite3, threading
+from collections import Counter, deque
+from pathlib import Path
+
+import metrics
+from review_store import TAIL_SQL, norm_terms
+
+ALERTS_TAIL_SQL = """
+SELECT id, product_id, rule, window_start_utc, window_end_utc, count, created_at_utc
+FROM alerts
+WHERE id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+HEARTBEAT_SEC = 15.0
+
+def delta(rows, alerts, last_id):
+    """One `delta` payload from TAIL_SQL rows and alert dicts of a single product."""
+    trend, keywords = {}, Counter()
+    for _, _, _, ts_epoch, sentiment, kws, _ in rows:
+        if ts_epoch is None:
+            continue
+        counts = trend.setdefault(ts_epoch // 60 * 60, [0, 0, 0])
+        if sentiment in ("positive", "neutral", "negative"):
+            counts[("positive", "neutral", "negative").index(sentiment)] += 1
+        keywords.update(norm_terms(kws))
+    return {
+        "last_id": last_id,
+        "reviews": [[rid, ts_utc, sentiment, snippet] for rid, _, ts_utc, _, sentiment, _, snippet in rows],
+        "trend": [[m, *c] for m, c in sorted(trend.items()) if any(c)],
+        "keywords": sorted(keywords.items(), key=lambda kv: (-kv[1], kv[0])),
+        "alerts": alerts,
+    }
+
+class Subscription:
+    """A bounded queue of events for one client; never blocks the tailer."""
+
+    def __init__(self, product_id, since, max_pending):
+        self.product_id = product_id
+        self.since = since              # rows at or below this id are already on the client
+        self.q = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def push(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.q.put_nowait(event)
+        except queue.Full:
+            # too slow to keep up: stop queueing, the stream ends with a resync
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, None on timeout (or overflow)."""
+        try:
+            return self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class AsyncSubscription(Subscription):
+    """Same, delivered into an asyncio.Queue on the subscribing event loop."""
+
+    def __init__(self, product_id, since, max_pending, loop):
+        super().__init__(product_id, since, max_pending)
+        self.loop = loop
+        self.aq = asyncio.Queue(maxsize=max_pending)
+
+    def push(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            self.overflowed = True      # the loop is gone
+
+    def _put(self, event):
+        # on the event loop, so the queue is only ever touched from one thread
+        try:
+            self.aq.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.aq.get_nowait()
+            self.aq.put_nowait(None)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.aq.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class Tailer:
+    """Reads new rows by id on one thread and fans them out to every Subscription.
+
+    Keeps the last `backlog` reviews in memory so a client whose view is a few
+    seconds old (the page render, a reconnect) gets the rows it missed without
+    another query.
+    """
+
+    def __init__(self, db, interval=0.5, batch=5000, backlog=20_000, max_pending=256, name="live"):
+        self.uri = Path(db).resolve().as_uri() + "?mode=ro"
+        self.interval = interval
+        self.batch = batch
+        self.max_pending = max_pending
+        self.name = name
+        self.last_id = 0
+        self.last_alert_id = 0
+        self.covered_from = 0           # backlog holds every review with id > covered_from
+        self._backlog = deque()
+        self._backlog_max = backlog
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._conn = None
+        self._thread = None
+        self.ticks = 0
+        self.rows_read = 0
+        self.events_sent = 0
+
+    def _db(self):
+        if self._conn is None:
+            c = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            c.execute("PRAGMA busy_timeout=30000;")
+            c.execute("PRAGMA query_only=ON;")
+            self._conn = c
+        return self._conn
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            conn = self._db()
+            top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM reviews").fetchone()[0]
+            # prefill the backlog, so views rendered before the first subscriber can still resume
+            self.covered_from = max(top - self._backlog_max, 0)
+            self._backlog = deque(metrics.fetchall(conn, f"{self.name} tail", TAIL_SQL,
+                                                   (self.covered_from, self._backlog_max)))
+            self.last_id = self._backlog[-1][0] if self._backlog else top
+            self.last_alert_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM alerts").fetchone()[0]
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-tailer", daemon=True)
+            self._thread.start()
+        metrics.LIVE_SUBSCRIBERS.set_function(lambda: len(self._subs), tailer=self.name)
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ---------- subscribers ----------
+    def subscribe(self, product_id, since=None):
+        return self._add(Subscription(product_id, since, self.max_pending))
+
+    def subscribe_async(self, product_id, since=None, loop=None):
+        # pass `loop` when calling from a worker thread (start() and the backlog scan block)
+        loop = loop or asyncio.get_running_loop()
+        return self._add(AsyncSubscription(product_id, since, self.max_pending, loop))
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def _add(self, sub):
+        self.start()
+        with self._lock:
+            if sub.since is None or sub.since >= self.last_id:
+                sub.since = self.last_id if sub.since is None else sub.since
+            elif sub.since < self.covered_from:
+                sub.overflowed = True   # missed rows are no longer in memory
+            else:
+                rows = [r for r in self._backlog if r[0] > sub.since and r[1] == sub.product_id]
+                if rows:
+                    sub.push(delta(rows, [], self.last_id))
+            self._subs.add(sub)
+        return sub
+
+    # ---------- tail ----------
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._tick()
+            except sqlite3.Error as ex:
+                print(f"[{self.name}] tail error:", ex)
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+
+    def _tick(self):
+        conn = self._db()
+        rows, since = [], self.last_id
+        while True:
+            page = metrics.fetchall(conn, f"{self.name} tail", TAIL_SQL, (since, self.batch))
+            rows += page
+            if len(page) < self.batch:
+                break
+            since = page[-1][0]
+        alerts = metrics.fetchall(conn, f"{self.name} alerts", ALERTS_TAIL_SQL, (self.last_alert_id, self.batch))
+        self.ticks += 1
+        if not rows and not alerts:
+            return
+
+        by_product, alerts_by_product = {}, {}
+        for r in rows:
+            by_product.setdefault(r[1], []).append(r)
+        for a in alerts:
+            alerts_by_product.setdefault(a[1], []).append(
+                {"id": a[0], "rule": a[2], "window_start_utc": a[3], "window_end_utc": a[4],
+                 "count": a[5], "created_at_utc": a[6]})
+        with self._lock:
+            if rows:
+                self.last_id = rows[-1][0]
+                self._backlog.extend(rows)
+                while len(self._backlog) > self._backlog_max:
+                    self.covered_from = self._backlog.popleft()[0]
+            if alerts:
+                self.last_alert_id = alerts[-1][0]
+            self.rows_read += len(rows)
+            shared = {}
+            for sub in self._subs:
+                p = sub.product_id
+                mine, fired = by_product.get(p, []), alerts_by_product.get(p, [])
+                if mine and mine[0][0] <= sub.since:
+                    # the client's view is newer than where this tick started: skip what it has
+                    mine = [r for r in mine if r[0] > sub.since]
+                    event = delta(mine, fired, self.last_id) if mine or fired else None
+                elif mine or fired:
+                    # the common case: every viewer of a product shares one payload
+                    if p not in shared:
+                        shared[p] = delta(mine, fired, self.last_id)
+                    event = shared[p]
+                else:
+                    event = None
+                if event is not None:
+                    sub.push(event)
+                    self.events_sent += 1
+                sub.since = max(sub.since, self.last_id)
+            # overflowed streams end on their own; also drops ones whose body never started
+            self._subs = {s for s in self._subs if not s.overflowed}
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subs), "last_id": self.last_id, "ticks": self.ticks,
+                    "rows_read": self.rows_read, "events_sent": self.events_sent,
+                    "backlog": len(self._backlog)}
+
+# ---------- text/event-stream ----------
+def _event(event):
+    if event is None:
+        return "event: resync\ndata: {}\n\n"
+    return f"id: {event['last_id']}\nevent: delta\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+def resume_from(query_since, last_event_id):
+    """The newer of ?since= and the Last-Event-ID header EventSource sends on reconnect."""
+    ids = []
+    for v in (query_since, last_event_id):
+        try:
+            ids.append(int(v))
+        except (TypeError, ValueError):
+            pass
+    return max(ids) if ids else None
+
+def sse(sub, tailer, heartbeat=HEARTBEAT_SEC):
+    """Blocking generator of SSE chunks for `sub`; unsubscribes when the client goes away."""
+    try:
+        yield "retry: 2000\n\n"
+        while not sub.overflowed:
+            event = sub.get(heartbeat)
+            if not sub.overflowed:
+                yield _event(event) if event is not None else ": ping\n\n"
+        yield _event(None)
+    finally:
+        tailer.unsubscribe(sub)
+
+async def sse_async(sub, tailer, heartbeat=HEARTBEAT_SEC):
+    try:
+        yield "retry: 2000\n\n"
+        while not sub.overflowed:
+            event = await sub.get(heartbeat)
+            if not sub.overflowed:
+                yield _event(event) if event is not None else ": ping\n\n"
+        yield _event(None)
+    finally:
+        tailer.unsubscribe(sub)
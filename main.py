@@ -1,14 +1,24 @@
 import os
+import io
+import csv
+import json
+import time
+import base64
+import asyncio
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from psycopg2.pool import SimpleConnectionPool
-import psycopg2.extras
+import asyncpg
 
 from pathlib import Path
 from dotenv import load_dotenv
 
+import metrics
+
 
 load_dotenv(dotenv_path=Path(__file__).with_name(".env"))
 
@@ -18,13 +28,35 @@ PG_USER = os.getenv("PG_USER", "sgunnam")
 PG_PASS = os.getenv("PG_PASS", "sushi")
 PG_MIN  = int(os.getenv("PG_MIN_CONN", "1"))
 PG_MAX  = int(os.getenv("PG_MAX_CONN", "5"))
+PG_ACQUIRE_TIMEOUT = float(os.getenv("PG_ACQUIRE_TIMEOUT", "5"))    # seconds queued for a connection
+PG_COMMAND_TIMEOUT = float(os.getenv("PG_COMMAND_TIMEOUT", "30"))   # seconds per statement
+PG_STMT_CACHE      = int(os.getenv("PG_STMT_CACHE", "256"))         # prepared statements kept per connection
+PG_PREFETCH        = int(os.getenv("PG_PREFETCH", "1000"))          # rows per server-side cursor fetch
+
+pool: Optional[asyncpg.Pool] = None
+
+async def init_conn(conn):
+    # return jsonb columns as Python lists/dicts, like psycopg2 did
+    await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
 
-pool = SimpleConnectionPool(
-    PG_MIN, PG_MAX,
-    host=PG_HOST, dbname=PG_DB, user=PG_USER, password=PG_PASS
-)
+@asynccontextmanager
+async def lifespan(_app):
+    global pool
+    pool = await asyncpg.create_pool(
+        host=PG_HOST, database=PG_DB, user=PG_USER, password=PG_PASS,
+        min_size=PG_MIN, max_size=PG_MAX,
+        command_timeout=PG_COMMAND_TIMEOUT,
+        statement_cache_size=PG_STMT_CACHE,
+        init=init_conn,
+    )
+    metrics.POOL_IN_USE.set_function(lambda: pool.get_size() - pool.get_idle_size(), pool="pg")
+    try:
+        yield
+    finally:
+        await pool.close()
 
-app = FastAPI(title="Review Analytics API", version="1.0.0")
+app = FastAPI(title="Review Analytics API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(metrics.ASGIMetrics, app_name="main")
 
 class Review(BaseModel):
     id: int
@@ -36,6 +68,10 @@ class Review(BaseModel):
     entities: Optional[list]
     ts_utc: datetime
 
+class ReviewPage(BaseModel):
+    items: List[Review]
+    next_cursor: Optional[str] = None
+
 class TrendPoint(BaseModel):
     bucket_utc: datetime
     positive: int
@@ -46,28 +82,128 @@ class KeywordStat(BaseModel):
     keyword: str
     count: int
 
-def fetchall(sql: str, params: tuple = ()):
-    conn = pool.getconn()
+# ---------- DB helpers ----------
+# asyncpg's pool queues callers until a connection frees up (up to
+# PG_ACQUIRE_TIMEOUT) and prepares each query once per connection, reusing it
+# from the statement cache on later calls.
+async def acquire() -> asyncpg.Connection:
+    t0 = time.perf_counter()
+    try:
+        return await pool.acquire(timeout=PG_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="database pool exhausted, try again")
+    finally:
+        metrics.POOL_ACQUIRE.observe(time.perf_counter() - t0, pool="pg")
+
+async def observe(conn, name: str, sql: str, args, seconds: float, rows: int) -> None:
+    # a slow query's plan is read here, on the same connection, before it goes back to the pool
+    plan = []
+    if seconds * 1000 >= metrics.SLOW_QUERY_MS:
+        try:
+            plan = [r[0] for r in await conn.fetch("EXPLAIN " + sql, *args)]
+        except asyncpg.PostgresError as ex:
+            plan = [f"(no plan: {ex})"]
+    metrics.observe_query(name, seconds, rows, lambda: plan)
+
+async def fetchall(sql: str, *args, name: str = "sql"):
+    conn = await acquire()
     try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            return [dict(r) for r in rows]
+        t0 = time.perf_counter()
+        rows = await conn.fetch(sql, *args)
+        await observe(conn, name, sql, args, time.perf_counter() - t0, len(rows))
+        return [dict(r) for r in rows]
     finally:
-        pool.putconn(conn)
+        await pool.release(conn)
+
+def _json_default(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    raise TypeError(f"not JSON serializable: {type(v).__name__}")
+
+async def stream_cursor(sql: str, *args, name: str, encode, head: bytes = b"", sep: bytes = b"", tail: bytes = b"",
+                        media_type: str = "application/json", chunk_bytes: int = 64 * 1024,
+                        headers: Optional[dict] = None) -> StreamingResponse:
+    """Stream a result set through a server-side cursor, `encode(record) -> bytes` per row.
+
+    The connection is checked out before the response starts, so pool
+    exhaustion is still a clean 503; rows are fetched PG_PREFETCH at a time and
+    never held in memory all at once.
+    """
+    conn = await acquire()
+    released = False
+
+    async def release():
+        # runs from the generator's finally and as a background task, whichever
+        # comes first (the generator never starts if the client goes away early)
+        nonlocal released
+        if not released:
+            released = True
+            await pool.release(conn)
+
+    async def body():
+        try:
+            # server-side cursors only live inside a transaction
+            async with conn.transaction(readonly=True):
+                buf, s, n = bytearray(head), b"", 0
+                t0 = time.perf_counter()
+                async for r in conn.cursor(sql, *args, prefetch=PG_PREFETCH):
+                    buf += s + encode(r)
+                    s = sep
+                    n += 1
+                    if len(buf) >= chunk_bytes:
+                        yield bytes(buf)
+                        buf.clear()
+                # includes the time the client took to read the chunks
+                await observe(conn, name, sql, args, time.perf_counter() - t0, n)
+                buf += tail
+                yield bytes(buf)
+        finally:
+            await release()
+
+    return StreamingResponse(body(), media_type=media_type, headers=headers,
+                             background=BackgroundTask(release))
 
 @app.get("/")
-def root():
+async def root():
     return {"status": "ok"}
 
 
 @app.get("/healthz")
-def healthz():
-    rows = fetchall("SELECT 1 AS ok;")
+async def healthz():
+    rows = await fetchall("SELECT 1 AS ok;", name="main healthz")
     return {"ok": rows[0]["ok"] == 1}
 
+# newest review within a day: partition pruning + brin_reviews_ts, no full max() scan
+LAG_SQL = """
+SELECT extract(epoch FROM now() - max(ts_utc))::float8 AS lag
+FROM reviews
+WHERE ts_utc >= now() - interval '1 day';
+"""
+
+@app.get("/metrics")
+async def metrics_text():
+    # Prometheus text: request/SQL/pool histograms for this process
+    rows = await fetchall(LAG_SQL, name="main ingest lag")
+    if rows[0]["lag"] is not None:
+        metrics.INGEST_LAG.set(round(rows[0]["lag"], 3))
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/slow_queries")
+async def slow_queries():
+    # recent queries over SLOW_QUERY_MS with their EXPLAIN plan
+    return metrics.slow_queries()
+
+@app.get("/pool")
+async def pool_stats():
+    return {
+        "size": pool.get_size(),
+        "idle": pool.get_idle_size(),
+        "min": pool.get_min_size(),
+        "max": pool.get_max_size(),
+    }
+
 @app.get("/reviews/{product_id}", response_model=List[Review])
-def latest_reviews(
+async def latest_reviews(
     product_id: str,
     limit: int = Query(20, ge=1, le=200)
 ):
@@ -77,46 +213,36 @@ def latest_reviews(
            COALESCE(entities, '[]'::jsonb) AS entities,
            ts_utc
     FROM reviews
-    WHERE product_id = %s
+    WHERE product_id = $1
     ORDER BY ts_utc DESC
-    LIMIT %s;
+    LIMIT $2;
     """
-    return fetchall(sql, (product_id, limit))
+    return await fetchall(sql, product_id, limit, name="main reviews")
 
 @app.get("/sentiment_trend/{product_id}", response_model=List[TrendPoint])
-def sentiment_trend(
+async def sentiment_trend(
     product_id: str,
     hours: int = Query(24, ge=1, le=168),           # last N hours
     bucket_minutes: int = Query(10, ge=1, le=60)    # bucket width
 ):
-    # Use time buckets; count per sentiment per bucket
-    # Build dynamic interval safely
-    sql = f"""
-    WITH base AS (
-      SELECT
-        to_timestamp(floor(extract(epoch from ts_utc)/(%s*60))*(%s*60))::timestamptz AS bucket_utc,
-        sentiment
-      FROM reviews
-      WHERE product_id = %s
-        AND ts_utc >= now() - (%s || ' hours')::interval
-        AND sentiment IN ('positive','neutral','negative')
-    ),
-    agg AS (
-      SELECT bucket_utc,
-             sum( (sentiment='positive')::int ) AS positive,
-             sum( (sentiment='neutral')::int )  AS neutral,
-             sum( (sentiment='negative')::int ) AS negative
-      FROM base
-      GROUP BY bucket_utc
-    )
-    SELECT bucket_utc, positive, neutral, negative
-    FROM agg
-    ORDER BY bucket_utc;
+    # Sum the per-minute rollup (pg_schema.sql) into bucket_minutes-wide buckets:
+    # at most 168h / 1 minute = 10,080 small rows, returned through TrendPoint
+    sql = """
+    SELECT
+      to_timestamp(floor(extract(epoch from bucket)/($1::int*60))*($1::int*60))::timestamptz AS bucket_utc,
+      sum(positive)::int AS positive,
+      sum(neutral)::int  AS neutral,
+      sum(negative)::int AS negative
+    FROM sentiment_minute
+    WHERE product_id = $2
+      AND bucket >= date_trunc('minute', now() - make_interval(hours => $3))
+    GROUP BY 1
+    ORDER BY 1;
     """
-    return fetchall(sql, (bucket_minutes, bucket_minutes, product_id, str(hours)))
+    return await fetchall(sql, bucket_minutes, product_id, hours, name="main trend")
 
 @app.get("/keywords/{product_id}", response_model=List[KeywordStat])
-def recent_keywords(
+async def recent_keywords(
     product_id: str,
     hours: int = Query(24, ge=1, le=168),
     limit: int = Query(25, ge=1, le=200)
@@ -124,18 +250,108 @@ def recent_keywords(
     # Explode keywords jsonb array and aggregate
     sql = """
     WITH exploded AS (
-      SELECT lower(trim(k::text, '\"')) AS kw
+      SELECT lower(trim(k)) AS kw
       FROM reviews
-      WHERE product_id = %s
-        AND ts_utc >= now() - (%s || ' hours')::interval
-        AND keywords IS NOT NULL
       CROSS JOIN LATERAL jsonb_array_elements_text(keywords) AS k
+      WHERE product_id = $1
+        AND ts_utc >= now() - make_interval(hours => $2)
+        AND keywords IS NOT NULL
     )
     SELECT kw AS keyword, count(*)::int AS count
     FROM exploded
     WHERE kw <> ''
     GROUP BY kw
     ORDER BY count DESC, kw
-    LIMIT %s;
+    LIMIT $3;
     """
-    return fetchall(sql, (product_id, str(hours), limit))
+    return await fetchall(sql, product_id, hours, limit, name="main keywords")
+
+# ---------- keyset pagination / export ----------
+# (ts_utc, id) keyset over idx_reviews_product_ts_id (pg_schema.sql): every page
+# is an index seek from the cursor, unlike OFFSET which re-reads skipped rows
+REVIEW_COLUMNS = """
+    id, review_id, product_id, review_text, sentiment,
+    COALESCE(keywords, '[]'::jsonb) AS keywords,
+    COALESCE(entities, '[]'::jsonb) AS entities,
+    ts_utc
+"""
+
+PAGE_SQL = f"""
+SELECT {REVIEW_COLUMNS}
+FROM reviews
+WHERE product_id = $1
+  AND ts_utc BETWEEN $2 AND $3
+  AND ($4::text[] IS NULL OR sentiment = ANY($4::text[]))
+  AND (ts_utc, id) < ($5, $6)
+ORDER BY ts_utc DESC, id DESC
+LIMIT $7;
+"""
+
+EXPORT_SQL = f"""
+SELECT {REVIEW_COLUMNS}
+FROM reviews
+WHERE product_id = $1
+  AND ts_utc BETWEEN $2 AND $3
+  AND ($4::text[] IS NULL OR sentiment = ANY($4::text[]))
+ORDER BY ts_utc, id;
+"""
+
+TS_MIN = datetime(1970, 1, 1, tzinfo=timezone.utc)
+TS_MAX = datetime(9999, 12, 31, tzinfo=timezone.utc)
+SENTIMENTS = {"positive", "neutral", "negative"}
+EXPORT_COLUMNS = ["id", "review_id", "product_id", "ts_utc", "sentiment", "keywords", "entities", "review_text"]
+
+def encode_cursor(ts: datetime, rid: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{rid}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        ts, rid = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|")
+        return datetime.fromisoformat(ts), int(rid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def filters(start_ts: Optional[datetime], end_ts: Optional[datetime], sentiment: Optional[List[str]]):
+    if sentiment and not set(sentiment) <= SENTIMENTS:
+        raise HTTPException(status_code=400, detail="sentiment must be positive, neutral or negative")
+    return start_ts or TS_MIN, end_ts or TS_MAX, sorted(set(sentiment)) if sentiment else None
+
+@app.get("/reviews/{product_id}/page", response_model=ReviewPage)
+async def reviews_page(
+    product_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start_ts: Optional[datetime] = None,
+    end_ts: Optional[datetime] = None,
+    sentiment: Optional[List[str]] = Query(None),
+):
+    start, end, sents = filters(start_ts, end_ts, sentiment)
+    c_ts, c_id = decode_cursor(cursor) if cursor else (TS_MAX, 0)
+    rows = await fetchall(PAGE_SQL, product_id, start, end, sents, c_ts, c_id, limit, name="main reviews page")
+    nxt = encode_cursor(rows[-1]["ts_utc"], rows[-1]["id"]) if len(rows) == limit else None
+    return {"items": rows, "next_cursor": nxt}
+
+def _csv_line(r) -> bytes:
+    out = io.StringIO()
+    csv.writer(out).writerow([r["id"], r["review_id"], r["product_id"], r["ts_utc"].isoformat(), r["sentiment"],
+                              json.dumps(r["keywords"]), json.dumps(r["entities"]), r["review_text"]])
+    return out.getvalue().encode()
+
+@app.get("/reviews/{product_id}/export")
+async def export_reviews(
+    product_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_ts: Optional[datetime] = None,
+    end_ts: Optional[datetime] = None,
+    sentiment: Optional[List[str]] = Query(None),
+):
+    # one server-side cursor for the whole export; memory stays at one prefetch batch
+    start, end, sents = filters(start_ts, end_ts, sentiment)
+    headers = {"Content-Disposition": f'attachment; filename="reviews_{product_id}.{format}"'}
+    if format == "csv":
+        head = ",".join(EXPORT_COLUMNS).encode() + b"\r\n"
+        return await stream_cursor(EXPORT_SQL, product_id, start, end, sents, name="main export", encode=_csv_line,
+                                   head=head, media_type="text/csv", headers=headers)
+    return await stream_cursor(EXPORT_SQL, product_id, start, end, sents, name="main export",
+                               encode=lambda r: json.dumps(dict(r), default=_json_default).encode() + b"\n",
+                               media_type="application/x-ndjson", headers=headers)
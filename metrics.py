@@ -0,0 +1,250 @@
+# metrics.py
+"""Process-local timing metrics in the Prometheus text format, plus a slow-query log.
+
+    rows = metrics.fetchall(conn, "api trend", TREND_SQL, params)   # timed, counted, slow-logged
+    with metrics.ALERT_CYCLE.time(mode="periodic"): ...
+    metrics.render()        # body for GET /metrics (app.py, main.py, dash_app.py)
+    metrics.serve(9101)     # /metrics for alert_worker / ingest_worker, which have no web server
+
+No client library: counters, gauges and histograms with labels are dicts
+behind one lock each. Every process exposes its own numbers; scrape each of
+them. Gauges registered with set_function (pool and queue depth) are read at
+scrape time.
+
+A SQL query slower than SLOW_QUERY_MS (env, default 200) is printed with its
+EXPLAIN QUERY PLAN (EXPLAIN on Postgres) and kept among the last
+SLOW_QUERY_KEEP for slow_queries().
+"""
+import collections, math, os, sqlite3, threading, time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "100"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; covers a cached API hit (sub-ms) up to a full export or backfill batch
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = []
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)] + [f'{k}="{v}"' for k, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _num(v):
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            out.extend(self._lines(key, v))
+        return out
+
+    def _lines(self, key, v):
+        return [f"{self.name}{_labels(self.labels, key)} {_num(v)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, n=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, v, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = v
+
+    def set_function(self, fn, **labels):
+        """Read `fn()` at every scrape instead of storing a value."""
+        with self._lock:
+            self._values[self._key(labels)] = fn
+
+    def _lines(self, key, v):
+        if callable(v):
+            try:
+                v = v()
+            except Exception:
+                return []
+        return super()._lines(key, v)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, v, **labels):
+        key = self._key(labels)
+        i = next(i for i, b in enumerate(self.buckets) if v <= b)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            counts[i] += 1
+            self._values[key] = (counts, total + v)
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _lines(self, key, v):
+        counts, total = v
+        out, acc = [], 0
+        for b, c in zip(self.buckets, counts):
+            acc += c
+            out.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', _num(b))])} {acc}")
+        out.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(total)}")
+        out.append(f"{self.name}_count{_labels(self.labels, key)} {acc}")
+        return out
+
+# ---------- the shared metrics ----------
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route template.",
+                         ("app", "method", "route", "status"))
+SQL_LATENCY = Histogram("sql_query_duration_seconds", "Hot-path SQL time including fetching the rows.", ("query",))
+SQL_ROWS = Counter("sql_rows_returned_total", "Rows returned by hot-path SQL.", ("query",))
+SQL_SLOW = Counter("sql_slow_queries_total", f"Queries over SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms).", ("query",))
+POOL_ACQUIRE = Histogram("db_pool_acquire_seconds", "Time waiting for a pooled connection.", ("pool",))
+POOL_IN_USE = Gauge("db_pool_in_use", "Connections checked out.", ("pool",))
+INGEST_QUEUE = Gauge("ingest_queue_depth", "Reviews queued in a BatchWriter.", ("writer",))
+INGEST_COMMIT = Histogram("ingest_commit_seconds", "BatchWriter batch insert + commit time.", ("writer",))
+INGEST_ROWS = Counter("ingest_rows_total", "Reviews written by a BatchWriter.", ("writer", "result"))
+INGEST_LAG = Gauge("ingest_lag_seconds", "Now minus the newest ts_utc written (writer) or stored (readers).")
+ALERT_CYCLE = Histogram("alert_cycle_seconds", "One alert_worker pass.", ("mode",))
+LIVE_SUBSCRIBERS = Gauge("live_subscribers", "Open server-push streams (live.py).", ("tailer",))
+
+def render():
+    lines = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+# ---------- SQL ----------
+_slow = collections.deque(maxlen=SLOW_QUERY_KEEP)
+
+def explain(conn, sql, params=()):
+    try:
+        return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    except sqlite3.Error as ex:
+        return [f"(no plan: {ex})"]
+
+def observe_query(name, seconds, rows, plan=None):
+    """Record one query; `plan()` (lines) is only called when the query was slow."""
+    SQL_LATENCY.observe(seconds, query=name)
+    SQL_ROWS.inc(rows, query=name)
+    if seconds * 1000 < SLOW_QUERY_MS:
+        return
+    SQL_SLOW.inc(query=name)
+    lines = plan() if plan else []
+    _slow.append({"query": name, "ms": round(seconds * 1000, 1), "rows": rows, "plan": lines,
+                  "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+    print(f"[slow-query] {name} {seconds * 1000:.1f} ms rows={rows}")
+    for line in lines:
+        print(f"    {line}")
+
+def fetchall(conn, name, sql, params=()):
+    """conn.execute(sql, params).fetchall(), timed under `name`."""
+    t0 = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    observe_query(name, time.perf_counter() - t0, len(rows), lambda: explain(conn, sql, params))
+    return rows
+
+def slow_queries():
+    return list(_slow)
+
+# cheap freshness probe: the newest rows by id, so a rowid range seek instead of a scan
+LAG_SQL = """
+SELECT MAX(ts_epoch) FROM reviews
+WHERE id > (SELECT MAX(id) FROM reviews) - 1000
+"""
+
+def update_ingest_lag(conn):
+    try:
+        newest = conn.execute(LAG_SQL).fetchone()[0]
+    except sqlite3.Error:
+        return
+    if newest is not None:
+        INGEST_LAG.set(round(time.time() - newest, 3))
+
+# ---------- HTTP ----------
+class ASGIMetrics:
+    """ASGI middleware timing every HTTP request into HTTP_LATENCY.
+
+    The route label is the matched path template (/reviews/{product_id}, set
+    on the scope by Starlette's router), so product ids don't explode the
+    label set; requests no route matched are "unmatched".
+    """
+
+    def __init__(self, app, app_name):
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - t0, app=self.app_name, method=scope["method"],
+                                 route=route, status=status[0])
+
+# ---------- standalone endpoint ----------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port, host="0.0.0.0"):
+    """Expose /metrics from a background thread (worker processes)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[metrics] serving /metrics on {host}:{port}")
+    return server
@@ -0,0 +1,352 @@
+# partitions.py
+"""Weekly time partitions for reviews and alerts, with file-level retention.
+
+    python partitions.py seal                      # move complete weeks older than --hot-weeks out of reviews.db
+    python partitions.py seal --hot-weeks 4 --vacuum   # one-off migration of a big reviews.db
+    python partitions.py retain --keep-weeks 52    # drop whole partitions older than a year
+    python partitions.py list
+
+reviews.db keeps the hot tail: the current week plus `--hot-weeks` complete
+weeks, where ingest, enrichment, the streaming alerter and the rollup
+triggers live. `seal` copies each older week (Monday 00:00 UTC to the next)
+into partitions/reviews-<ISO year>-W<week>.db, records it in the
+`partitions` table, then deletes the copied rows from reviews.db in short
+id-chunk transactions, so the writer is never blocked for long. Running it on
+an existing database is the migration; rows that arrive late for a sealed
+week land in reviews.db and are folded in by the next `seal`.
+
+`retain` unlinks whole partition files: no DELETE, no index maintenance, no
+writer lock. The per-minute rollups are not partitioned; they keep history
+for the trend/keyword views (`--rollups` trims them to the same horizon).
+
+Readers go through Router: a range query runs against reviews.db alone when
+its window starts after the last sealed week (always the case for the
+dashboard and the alert worker), otherwise once per overlapping partition,
+attached read-only for that query only, in time order.
+"""
+import argparse, os, sqlite3, time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import init_db
+import metrics
+
+DB = init_db.DB
+PART_DIR = "partitions"
+WEEK = 7 * 86400
+MONDAY = 4 * 86400      # 1970-01-01 was a Thursday; weeks start on Monday 00:00 UTC
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+
+REVIEW_COLUMNS = "id, review_id, product_id, review_text, sentiment, keywords, entities, ts_utc, ts_epoch"
+ALERT_COLUMNS = "id, product_id, rule, window_start_utc, window_end_utc, count, created_at_utc"
+# the epoch indexes the routed range queries use; sealed rows are never enriched again
+PARTITION_INDEXES = ("idx_reviews_product_epoch_id", "idx_reviews_sentiment_epoch")
+
+Partition = namedtuple("Partition", "name path start_epoch end_epoch")
+
+def week_start(ts):
+    return ts - (ts - MONDAY) % WEEK
+
+def week_name(start):
+    y, w, _ = datetime.fromtimestamp(start, tz=timezone.utc).isocalendar()
+    return f"reviews-{y}-W{w:02d}"
+
+def iso_epoch(ts_utc):
+    return int(datetime.strptime(ts_utc, ISO).replace(tzinfo=timezone.utc).timestamp())
+
+def part_dir(db):
+    return os.path.join(os.path.dirname(os.path.abspath(db)), PART_DIR)
+
+def open_partition(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(init_db.REVIEWS)
+    conn.execute(init_db.ALERTS)
+    return conn
+
+def finish_partition(conn):
+    # indexes after the bulk copy: one sorted build instead of per-row maintenance
+    for name in PARTITION_INDEXES:
+        conn.execute(init_db.INDEXES[name])
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_alert ON alerts(product_id, rule, window_end_utc);")
+    conn.commit()
+    return (conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0],
+            conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0])
+
+class _Writers:
+    """Open partition files by week, at most `max_open` at a time."""
+
+    def __init__(self, root, max_open=32):
+        self.root = root
+        self.max_open = max_open
+        self._open = OrderedDict()     # week start -> connection
+        self.touched = {}              # week start -> {"reviews": [lo_id, hi_id], "alerts": [...]}
+
+    def get(self, week):
+        conn = self._open.get(week)
+        if conn is None:
+            conn = open_partition(os.path.join(self.root, week_name(week) + ".db"))
+            self._open[week] = conn
+            while len(self._open) > self.max_open:
+                _, old = self._open.popitem(last=False)
+                old.commit()
+                old.close()
+        self._open.move_to_end(week)
+        return conn
+
+    def write(self, table, columns, rows_by_week):
+        marks = ",".join("?" * len(columns.split(",")))
+        for week, rows in rows_by_week.items():
+            conn = self.get(week)
+            conn.executemany(f"INSERT OR IGNORE INTO {table} ({columns}) VALUES ({marks})", rows)
+            conn.commit()
+            span = self.touched.setdefault(week, {}).setdefault(table, [rows[0][0], rows[0][0]])
+            span[0] = min(span[0], min(r[0] for r in rows))
+            span[1] = max(span[1], max(r[0] for r in rows))
+
+    def close(self):
+        for conn in self._open.values():
+            conn.commit()
+            conn.close()
+        self._open.clear()
+
+def _copy(conn, writers, sql, params, week_of, table, columns, batch):
+    cur = conn.execute(sql, params)
+    n = 0
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            return n
+        by_week = {}
+        for r in rows:
+            by_week.setdefault(week_of(r), []).append(tuple(r))
+        writers.write(table, columns, by_week)
+        n += len(rows)
+
+def _delete_copied(conn, part_path, table, lo, hi, batch):
+    """Delete rows now in the partition file from reviews.db, one short transaction per chunk."""
+    src = sqlite3.connect(part_path)
+    n, last = 0, lo - 1
+    try:
+        while True:
+            ids = [r[0] for r in src.execute(f"SELECT id FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                                             (last, hi, batch))]
+            if not ids:
+                return n
+            with conn:
+                n += conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in ids]).rowcount
+            last = ids[-1]
+    finally:
+        src.close()
+
+def seal(db=DB, hot_weeks=2, batch=10_000, now=None, vacuum=False):
+    """Move every complete week older than `hot_weeks` into its partition file."""
+    if hot_weeks < 1:
+        raise ValueError("hot_weeks must be >= 1 so live windows never straddle a seal")
+    now = int(now or time.time())
+    cutoff = week_start(now) - hot_weeks * WEEK
+    root = part_dir(db)
+    os.makedirs(root, exist_ok=True)
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA busy_timeout=30000;")
+    conn.execute(init_db.PARTITIONS)
+    conn.commit()
+
+    t0 = time.perf_counter()
+    writers = _Writers(root)
+    try:
+        # one sequential pass each, rows fanned out to their week's file
+        n_rev = _copy(conn, writers, f"SELECT {REVIEW_COLUMNS} FROM reviews WHERE ts_epoch < ?", (cutoff,),
+                      lambda r: week_start(r[8]), "reviews", REVIEW_COLUMNS, batch)
+        n_al = _copy(conn, writers, f"SELECT {ALERT_COLUMNS} FROM alerts WHERE window_end_utc < ?",
+                     (time.strftime(ISO, time.gmtime(cutoff)),),
+                     lambda r: week_start(iso_epoch(r[4])), "alerts", ALERT_COLUMNS, batch)
+    finally:
+        writers.close()
+    print(f"[seal] copied {n_rev:,} reviews and {n_al:,} alerts into {len(writers.touched)} weeks "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+    deleted = 0
+    for week in sorted(writers.touched):
+        name = week_name(week)
+        path = os.path.join(root, name + ".db")
+        pconn = sqlite3.connect(path)
+        try:
+            n_reviews, n_alerts = finish_partition(pconn)
+        finally:
+            pconn.close()
+        # catalog first: until the delete finishes a routed read may see a row twice, never zero times
+        with conn:
+            conn.execute("""
+                INSERT INTO partitions (name, path, start_epoch, end_epoch, reviews, alerts, sealed_at_utc)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET reviews = excluded.reviews, alerts = excluded.alerts,
+                                                sealed_at_utc = excluded.sealed_at_utc
+            """, (name, os.path.join(PART_DIR, name + ".db"), week, week + WEEK, n_reviews, n_alerts,
+                  time.strftime(ISO, time.gmtime())))
+        for table, (lo, hi) in writers.touched[week].items():
+            deleted += _delete_copied(conn, path, table, lo, hi, batch)
+        print(f"[seal] {name}: {n_reviews:,} reviews, {n_alerts:,} alerts")
+    if vacuum:
+        # deleted pages are reused by new inserts anyway; VACUUM returns them to the OS once
+        conn.execute("VACUUM;")
+    conn.close()
+    print(f"[seal] done: {deleted:,} rows removed from {db} in {time.perf_counter() - t0:.1f}s")
+    return len(writers.touched)
+
+def trim_rollups(conn, before, batch=500):
+    """Drop rollup rows older than `before`, a product's PK range at a time."""
+    products = [r[0] for r in conn.execute("SELECT product_id FROM product_watermark")]
+    n = 0
+    for i in range(0, len(products), batch):
+        with conn:
+            for pid in products[i:i + batch]:
+                n += conn.execute("DELETE FROM sentiment_minute WHERE product_id = ? AND bucket < ?",
+                                  (pid, before)).rowcount
+                for kind in init_db.TERM_COLUMNS:
+                    n += conn.execute("DELETE FROM term_minute WHERE product_id = ? AND kind = ? AND bucket < ?",
+                                      (pid, kind, before)).rowcount
+    return n
+
+def retain(db=DB, keep_weeks=52, now=None, rollups=False):
+    """Unlink every partition that ended more than `keep_weeks` weeks ago."""
+    now = int(now or time.time())
+    before = week_start(now) - keep_weeks * WEEK
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA busy_timeout=30000;")
+    conn.execute(init_db.PARTITIONS)
+    expired = conn.execute("SELECT name, path, reviews FROM partitions WHERE end_epoch <= ? ORDER BY start_epoch",
+                           (before,)).fetchall()
+    base = os.path.dirname(os.path.abspath(db))
+    for name, path, n in expired:
+        # out of the catalog first, so routers stop attaching it before the file goes
+        with conn:
+            conn.execute("DELETE FROM partitions WHERE name = ?", (name,))
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            try:
+                os.unlink(os.path.join(base, path + suffix))
+            except FileNotFoundError:
+                pass
+        print(f"[retain] dropped {name} ({n:,} reviews)")
+    if rollups:
+        print(f"[retain] trimmed {trim_rollups(conn, before):,} rollup rows")
+    conn.close()
+    return len(expired)
+
+class Router:
+    """Runs a reviews range query against reviews.db and the sealed weeks it overlaps.
+
+    The SQL must read `FROM reviews` with the window in :start/:end (inclusive
+    epochs) and, if it has one, the row limit in :limit. Partitions are
+    visited in time order (newest first for `desc`), each attached read-only
+    for its own query and UNION ALL'ed with reviews.db so late rows are kept,
+    and the walk stops once :limit rows are in.
+    """
+
+    def __init__(self, db=DB, refresh=5.0):
+        self.base = os.path.dirname(os.path.abspath(db))
+        self.refresh = refresh          # seconds between catalog reads
+        self._catalog = ()
+        self._read_at = -refresh
+        self.routed = 0
+        self.attaches = 0
+
+    def catalog(self, conn):
+        if time.monotonic() - self._read_at >= self.refresh:
+            try:
+                self._catalog = tuple(Partition(*r) for r in conn.execute(
+                    "SELECT name, path, start_epoch, end_epoch FROM partitions ORDER BY start_epoch"))
+            except sqlite3.OperationalError:
+                self._catalog = ()      # database from before partitions existed
+            self._read_at = time.monotonic()
+        return self._catalog
+
+    def spans(self, conn, start, end):
+        """[(lo, hi, Partition or None)] covering start..end, oldest first."""
+        out, t = [], start
+        for p in self.catalog(conn):
+            if p.end_epoch <= start or p.start_epoch > end:
+                continue
+            if p.start_epoch > t:
+                out.append((t, p.start_epoch - 1, None))
+            out.append((max(t, p.start_epoch), min(end, p.end_epoch - 1), p))
+            t = p.end_epoch
+        if t <= end:
+            out.append((t, end, None))
+        return out
+
+    @contextmanager
+    def attached(self, conn, p):
+        uri = Path(self.base, p.path).resolve().as_uri() + "?mode=ro"
+        try:
+            conn.execute("ATTACH DATABASE ? AS sealed", (uri,))
+        except sqlite3.OperationalError:
+            yield None                  # dropped by retain since the catalog was read
+            return
+        self.attaches += 1
+        try:
+            yield (f"(SELECT {REVIEW_COLUMNS} FROM main.reviews UNION ALL "
+                   f"SELECT {REVIEW_COLUMNS} FROM sealed.reviews)")
+        finally:
+            conn.execute("DETACH DATABASE sealed")
+
+    def fetch(self, conn, sql, params, desc=True, name="reviews range"):
+        """Rows of `sql` over every span, timed as one query `name` (see metrics.py)."""
+        spans = self.spans(conn, params["start"], params["end"]) if params["start"] <= params["end"] else []
+        if len(spans) <= 1 and (not spans or spans[0][2] is None):
+            return metrics.fetchall(conn, name, sql, params)
+        t0 = time.perf_counter()
+        self.routed += 1
+        limit = params.get("limit")
+        rows = []
+        for lo, hi, p in (reversed(spans) if desc else spans):
+            q = {**params, "start": lo, "end": hi}
+            if limit is not None:
+                q["limit"] = limit - len(rows)
+            if p is None:
+                rows += conn.execute(sql, q).fetchall()
+            else:
+                with self.attached(conn, p) as src:
+                    routed = sql.replace("FROM reviews", f"FROM {src} AS reviews", 1) if src else sql
+                    rows += conn.execute(routed, q).fetchall()
+            if limit is not None and len(rows) >= limit:
+                break
+        # the plan of the hot-database part; each sealed week runs the same shape
+        metrics.observe_query(name, time.perf_counter() - t0, len(rows), lambda: metrics.explain(conn, sql, params))
+        return rows
+
+    def stats(self):
+        return {"partitions": len(self._catalog), "routed_queries": self.routed, "attaches": self.attaches}
+
+def list_partitions(db=DB):
+    conn = sqlite3.connect(db)
+    conn.execute(init_db.PARTITIONS)
+    print(f"hot from {time.strftime(ISO, time.gmtime(init_db.hot_from(conn)))}")
+    for name, start, n_rev, n_al, sealed in conn.execute(
+            "SELECT name, start_epoch, reviews, alerts, sealed_at_utc FROM partitions ORDER BY start_epoch"):
+        print(f"{name}  {time.strftime('%Y-%m-%d', time.gmtime(start))}  {n_rev:>10,} reviews  "
+              f"{n_al:>6,} alerts  sealed {sealed}")
+    conn.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Seal, drop and list weekly review partitions.")
+    ap.add_argument("--db", default=DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("seal", help="move complete old weeks out of reviews.db (also the migration)")
+    s.add_argument("--hot-weeks", type=int, default=2, help="complete weeks kept in reviews.db")
+    s.add_argument("--batch", type=int, default=10_000, help="rows per copy/delete transaction")
+    s.add_argument("--vacuum", action="store_true", help="shrink reviews.db afterwards")
+    r = sub.add_parser("retain", help="unlink partitions older than --keep-weeks")
+    r.add_argument("--keep-weeks", type=int, default=52)
+    r.add_argument("--rollups", action="store_true", help="also trim rollup rows to the same horizon")
+    sub.add_parser("list")
+    a = ap.parse_args()
+
+    if a.cmd == "seal":
+        seal(a.db, a.hot_weeks, a.batch, vacuum=a.vacuum)
+    elif a.cmd == "retain":
+        retain(a.db, a.keep_weeks, rollups=a.rollups)
+    else:
+        list_partitions(a.db)
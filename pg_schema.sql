@@ -0,0 +1,147 @@
+-- pg_schema.sql: Postgres objects used by main.py and the storage.py writers
+-- apply with: psql -d reviews -f pg_schema.sql   (or: python storage.py init postgresql://...)
+
+-- ---------- reviews, range-partitioned by month on ts_utc ----------
+-- storage.py calls ensure_review_partitions() before each batch, so there is
+-- no default partition; old months go with drop_review_partitions(), a
+-- metadata-only DROP TABLE instead of a DELETE.
+-- An existing unpartitioned reviews table is left alone; to migrate:
+--   ALTER TABLE reviews RENAME TO reviews_old;  \i pg_schema.sql
+--   SELECT ensure_review_partitions(min(ts_utc), max(ts_utc)) FROM reviews_old;
+--   INSERT INTO reviews SELECT id, review_id, product_id, review_text, sentiment, keywords, entities, ts_utc FROM reviews_old;
+--   SELECT setval('reviews_id_seq', (SELECT max(id) FROM reviews));
+CREATE TABLE IF NOT EXISTS reviews (
+  id          bigserial,
+  review_id   text,
+  product_id  text        NOT NULL,
+  review_text text        NOT NULL,
+  sentiment   text CHECK (sentiment IN ('positive','neutral','negative')),
+  keywords    jsonb,
+  entities    jsonb,
+  ts_utc      timestamptz NOT NULL,
+  PRIMARY KEY (id, ts_utc)
+) PARTITION BY RANGE (ts_utc);
+
+CREATE OR REPLACE FUNCTION ensure_review_partitions(lo timestamptz, hi timestamptz) RETURNS int
+LANGUAGE plpgsql AS $$
+DECLARE
+  m    timestamp := date_trunc('month', lo AT TIME ZONE 'UTC');
+  made int := 0;
+  part text;
+BEGIN
+  -- concurrent writers may need the same month
+  PERFORM pg_advisory_xact_lock(hashtext('ensure_review_partitions'));
+  WHILE m <= hi AT TIME ZONE 'UTC' LOOP
+    part := 'reviews_' || to_char(m, 'YYYY_MM');
+    IF to_regclass(part) IS NULL THEN
+      EXECUTE format('CREATE TABLE %I PARTITION OF reviews FOR VALUES FROM (%L) TO (%L)',
+                     part, m AT TIME ZONE 'UTC', (m + interval '1 month') AT TIME ZONE 'UTC');
+      made := made + 1;
+    END IF;
+    m := m + interval '1 month';
+  END LOOP;
+  RETURN made;
+END $$;
+
+-- retention: SELECT drop_review_partitions(now() - interval '1 year');
+CREATE OR REPLACE FUNCTION drop_review_partitions(before timestamptz) RETURNS int
+LANGUAGE plpgsql AS $$
+DECLARE
+  r record;
+  dropped int := 0;
+BEGIN
+  FOR r IN SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'reviews'::regclass AND c.relname ~ '^reviews_[0-9]{4}_[0-9]{2}$'
+  LOOP
+    IF ((to_date(substr(r.relname, 9), 'YYYY_MM') + interval '1 month') AT TIME ZONE 'UTC') <= before THEN
+      EXECUTE format('DROP TABLE %I', r.relname);
+      dropped := dropped + 1;
+    END IF;
+  END LOOP;
+  RETURN dropped;
+END $$;
+
+-- time-range scans across products (backfills, exports by date): a BRIN index
+-- is a few pages per partition since rows arrive roughly in time order
+CREATE INDEX IF NOT EXISTS brin_reviews_ts ON reviews USING brin (ts_utc) WITH (pages_per_range = 32);
+
+CREATE TABLE IF NOT EXISTS alerts (
+  id               bigserial PRIMARY KEY,
+  product_id       text        NOT NULL,
+  rule             text        NOT NULL,
+  window_start_utc timestamptz NOT NULL,
+  window_end_utc   timestamptz NOT NULL,
+  count            int         NOT NULL,
+  created_at_utc   timestamptz NOT NULL DEFAULT now(),
+  UNIQUE (product_id, rule, window_end_utc)
+);
+
+-- backfill_from_csv.py resume points, written in the same transaction as each batch
+CREATE TABLE IF NOT EXISTS backfill_progress (
+  source         text PRIMARY KEY,
+  rows_done      bigint NOT NULL,
+  base_ts_utc    text   NOT NULL,
+  updated_at_utc text   NOT NULL
+);
+
+-- ---------- keyset pagination ----------
+-- /reviews/{product_id}/page and /export walk (ts_utc, id) per product
+CREATE INDEX IF NOT EXISTS idx_reviews_product_ts_id ON reviews (product_id, ts_utc, id);
+
+-- ---------- per-minute sentiment rollup ----------
+-- maintained by trigger on every write; /sentiment_trend sums minute rows
+-- into the requested bucket width instead of re-reading raw reviews
+CREATE TABLE IF NOT EXISTS sentiment_minute (
+  product_id text        NOT NULL,
+  bucket     timestamptz NOT NULL,   -- minute start
+  positive   int         NOT NULL DEFAULT 0,
+  neutral    int         NOT NULL DEFAULT 0,
+  negative   int         NOT NULL DEFAULT 0,
+  PRIMARY KEY (product_id, bucket)
+);
+
+CREATE OR REPLACE FUNCTION sentiment_minute_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' AND OLD.sentiment IN ('positive','neutral','negative') THEN
+    UPDATE sentiment_minute SET
+      positive = positive - (OLD.sentiment = 'positive')::int,
+      neutral  = neutral  - (OLD.sentiment = 'neutral')::int,
+      negative = negative - (OLD.sentiment = 'negative')::int
+    WHERE product_id = OLD.product_id
+      AND bucket = date_trunc('minute', OLD.ts_utc);
+  END IF;
+  IF NEW.sentiment IN ('positive','neutral','negative') THEN
+    INSERT INTO sentiment_minute (product_id, bucket, positive, neutral, negative)
+    VALUES (NEW.product_id, date_trunc('minute', NEW.ts_utc),
+            (NEW.sentiment = 'positive')::int,
+            (NEW.sentiment = 'neutral')::int,
+            (NEW.sentiment = 'negative')::int)
+    ON CONFLICT (product_id, bucket) DO UPDATE SET
+      positive = sentiment_minute.positive + EXCLUDED.positive,
+      neutral  = sentiment_minute.neutral  + EXCLUDED.neutral,
+      negative = sentiment_minute.negative + EXCLUDED.negative;
+  END IF;
+  RETURN NULL;
+END $$;
+
+-- alert_worker's set-based rule reads every product's last minutes at once
+CREATE INDEX IF NOT EXISTS brin_sentiment_minute_bucket ON sentiment_minute USING brin (bucket);
+
+DROP TRIGGER IF EXISTS trg_sentiment_minute ON reviews;
+CREATE TRIGGER trg_sentiment_minute
+AFTER INSERT OR UPDATE OF sentiment, product_id, ts_utc ON reviews
+FOR EACH ROW EXECUTE FUNCTION sentiment_minute_apply();
+
+-- rebuild from raw data (run once after creating, or to repair):
+--   BEGIN;
+--   TRUNCATE sentiment_minute;
+--   INSERT INTO sentiment_minute (product_id, bucket, positive, neutral, negative)
+--   SELECT product_id, date_trunc('minute', ts_utc),
+--          count(*) FILTER (WHERE sentiment = 'positive'),
+--          count(*) FILTER (WHERE sentiment = 'neutral'),
+--          count(*) FILTER (WHERE sentiment = 'negative')
+--   FROM reviews
+--   WHERE sentiment IN ('positive','neutral','negative')
+--   GROUP BY 1, 2;
+--   COMMIT;
@@ -0,0 +1,225 @@
+# review_store.py
+"""In-memory, incrementally refreshed view of recent reviews for the dashboard.
+
+One ReviewStore per process holds one read-only connection and a snapshot per
+(product, window). A snapshot is loaded once from the rollup tables, then
+every refresh reads only reviews with `id` above the last one seen and folds
+them into per-minute sentiment counts, keyword counts and the recent-review
+list. Snapshots are shared, so any number of browser sessions watching the
+same product cost one tail query per refresh interval.
+"""
+import heapq, json, sqlite3, threading, time
+from collections import Counter
+from pathlib import Path
+
+import metrics
+
+SENTIMENTS = ("positive", "neutral", "negative")
+RECENT_LIMIT = 50
+SNIPPET_CHARS = 160
+
+LOAD_MINUTES_SQL = """
+SELECT bucket, positive, neutral, negative
+FROM sentiment_minute
+WHERE product_id = ? AND bucket >= ?
+"""
+
+LOAD_TERMS_SQL = """
+SELECT bucket, term, n
+FROM term_minute
+WHERE product_id = ? AND kind = 'keyword' AND bucket >= ? AND n > 0
+"""
+
+LOAD_RECENT_SQL = f"""
+SELECT id, ts_utc, ts_epoch, sentiment, substr(review_text, 1, {SNIPPET_CHARS}) AS snippet
+FROM reviews
+WHERE product_id = ?
+ORDER BY ts_epoch DESC
+LIMIT {RECENT_LIMIT}
+"""
+
+TAIL_SQL = f"""
+SELECT id, product_id, ts_utc, ts_epoch, sentiment, keywords,
+       substr(review_text, 1, {SNIPPET_CHARS}) AS snippet
+FROM reviews
+WHERE id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+def norm_terms(txt):
+    # same rules the endpoints use: JSON list, trimmed, lowercased, non-empty
+    try:
+        v = json.loads(txt or "[]")
+    except Exception:
+        return []
+    if not isinstance(v, list):
+        return []
+    return [k for k in (str(x).strip().lower() for x in v) if k]
+
+class Snapshot:
+    """Trend, keyword and recent-review state for one product and window."""
+
+    def __init__(self, product_id, window_minutes):
+        self.product_id = product_id
+        self.window = int(window_minutes) * 60
+        self.last_id = 0
+        self.loaded_at = 0.0
+        self.last_read = time.monotonic()
+        self.minutes = {}          # minute -> [positive, neutral, negative]
+        self.terms = {}            # minute -> Counter(keyword)
+        self.kw_total = Counter()
+        self.recent = []           # newest first: (ts_epoch, id, ts_utc, sentiment, snippet)
+
+    def load(self, conn, now):
+        start = (now - self.window) // 60 * 60
+        # one read transaction, so MAX(id) and the rollups describe the same rows
+        conn.execute("BEGIN")
+        try:
+            self.last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM reviews").fetchone()[0]
+            self.minutes = {b: [p, u, n] for b, p, u, n in
+                            metrics.fetchall(conn, "dash load minutes", LOAD_MINUTES_SQL, (self.product_id, start))}
+            self.terms = {}
+            for b, term, n in metrics.fetchall(conn, "dash load terms", LOAD_TERMS_SQL, (self.product_id, start)):
+                self.terms.setdefault(b, Counter())[term] += n
+            self.recent = [(e or 0, i, ts, s, snip) for i, ts, e, s, snip in
+                           metrics.fetchall(conn, "dash load recent", LOAD_RECENT_SQL, (self.product_id,))]
+        finally:
+            conn.execute("COMMIT")
+        self.kw_total = Counter()
+        for c in self.terms.values():
+            self.kw_total.update(c)
+        self.loaded_at = time.monotonic()
+
+    def apply(self, row):
+        rid, _, ts_utc, ts_epoch, sentiment, keywords, snippet = row
+        if rid <= self.last_id:
+            return
+        self.last_id = rid
+        if ts_epoch is None:
+            return
+        minute = ts_epoch // 60 * 60
+        if sentiment in SENTIMENTS:
+            self.minutes.setdefault(minute, [0, 0, 0])[SENTIMENTS.index(sentiment)] += 1
+        kws = norm_terms(keywords)
+        if kws:
+            self.terms.setdefault(minute, Counter()).update(kws)
+            self.kw_total.update(kws)
+        if len(self.recent) < RECENT_LIMIT or (ts_epoch, rid) > self.recent[-1][:2]:
+            self.recent.append((ts_epoch, rid, ts_utc, sentiment, snippet))
+            self.recent.sort(reverse=True)
+            del self.recent[RECENT_LIMIT:]
+
+    def evict(self, now):
+        start = (now - self.window) // 60 * 60
+        for m in [m for m in self.minutes if m < start]:
+            del self.minutes[m]
+        for m in [m for m in self.terms if m < start]:
+            self.kw_total.subtract(self.terms.pop(m))
+        self.kw_total = +self.kw_total   # drop zero counts
+
+    # ---------- views ----------
+    def trend(self, bucket_minutes):
+        """[(bucket_start_epoch, positive, neutral, negative)] for non-empty buckets."""
+        b = int(bucket_minutes) * 60
+        out = {}
+        for m, counts in self.minutes.items():
+            acc = out.setdefault(m // b * b, [0, 0, 0])
+            for i in range(3):
+                acc[i] += counts[i]
+        return [(k, *v) for k, v in sorted(out.items()) if any(v)]
+
+    def keywords(self, topk=20):
+        """[(keyword, count)] by count desc, then alphabetically."""
+        return heapq.nsmallest(topk, self.kw_total.items(), key=lambda kv: (-kv[1], kv[0]))
+
+    def recent_reviews(self, limit=RECENT_LIMIT):
+        """[(ts_utc, sentiment, snippet)] newest first."""
+        return [(ts, s, snip) for _, _, ts, s, snip in self.recent[:limit]]
+
+class ReviewStore:
+    def __init__(self, db, min_interval=1.0, resync_every=600.0, idle_ttl=900.0, tail_batch=5000):
+        self.uri = Path(db).resolve().as_uri() + "?mode=ro"
+        self.min_interval = min_interval      # refreshes closer together than this are shared
+        self.resync_every = resync_every      # periodic reload picks up in-place updates (enrichment)
+        self.idle_ttl = idle_ttl              # drop snapshots nobody has looked at for this long
+        self.tail_batch = tail_batch
+        self._conn = None
+        self._lock = threading.RLock()
+        self._snaps = {}
+        self._last_tick = 0.0
+        self.tail_queries = 0
+        self.rows_applied = 0
+
+    def _db(self):
+        if self._conn is None:
+            c = sqlite3.connect(self.uri, uri=True, check_same_thread=False, isolation_level=None)
+            c.execute("PRAGMA busy_timeout=30000;")
+            c.execute("PRAGMA query_only=ON;")
+            self._conn = c
+        return self._conn
+
+    def snapshot(self, product_id, window_minutes):
+        """Return the up-to-date snapshot, refreshing at most once per min_interval."""
+        key = (product_id, int(window_minutes))
+        with self._lock:
+            now_m = time.monotonic()
+            snap = self._snaps.get(key)
+            if snap is None or now_m - snap.loaded_at > self.resync_every:
+                snap = Snapshot(product_id, window_minutes)
+                snap.load(self._db(), int(time.time()))
+                self._snaps[key] = snap
+            elif now_m - self._last_tick >= self.min_interval:
+                self._tick()
+            snap.last_read = now_m
+            return snap
+
+    def read(self, product_id, window_minutes, bucket_minutes=5, topk=20, limit=RECENT_LIMIT):
+        """Refresh if due and return plain trend/keywords/recent lists for rendering, and the tail id."""
+        with self._lock:
+            snap = self.snapshot(product_id, window_minutes)
+            return {
+                "trend": snap.trend(bucket_minutes),
+                "keywords": snap.keywords(topk),
+                "recent": snap.recent_reviews(limit),
+                "last_id": snap.last_id,    # where a live.py stream picks up from
+            }
+
+    def _tick(self):
+        now = int(time.time())
+        self._last_tick = time.monotonic()
+        for key in [k for k, s in self._snaps.items() if self._last_tick - s.last_read > self.idle_ttl]:
+            del self._snaps[key]
+        if not self._snaps:
+            return
+        by_product = {}
+        for s in self._snaps.values():
+            by_product.setdefault(s.product_id, []).append(s)
+        since = min(s.last_id for s in self._snaps.values())
+        conn = self._db()
+        while True:
+            rows = metrics.fetchall(conn, "dash tail", TAIL_SQL, (since, self.tail_batch))
+            self.tail_queries += 1
+            for row in rows:
+                for s in by_product.get(row[1], ()):
+                    s.apply(row)
+            self.rows_applied += len(rows)
+            if len(rows) < self.tail_batch:
+                break
+            since = rows[-1][0]
+        # every snapshot has now seen everything up to the tail position
+        top = rows[-1][0] if rows else since
+        for s in self._snaps.values():
+            s.last_id = max(s.last_id, top)
+        for s in self._snaps.values():
+            s.evict(now)
+
+    def update_ingest_lag(self):
+        """Set metrics.INGEST_LAG from the newest stored review, on this store's connection."""
+        with self._lock:
+            metrics.update_ingest_lag(self._db())
+
+    def stats(self):
+        with self._lock:
+            return {"snapshots": len(self._snaps), "tail_queries": self.tail_queries,
+                    "rows_applied": self.rows_applied}
@@ -0,0 +1,136 @@
+# sentiment_model.py
+"""Trained sentiment classifier: train once, save a versioned artifact, batch-predict.
+
+    python sentiment_model.py train reviews.csv                  # TF-IDF, like the notebook
+    python sentiment_model.py train reviews.csv --features hashing
+    python sentiment_model.py predict "great sound" "stopped working"
+
+The pipeline is the notebook's TfidfVectorizer(ngram_range=(1,2)) +
+LogisticRegression. `--features hashing` swaps the vocabulary for a
+HashingVectorizer (+ TfidfTransformer) so the model's memory is fixed by
+`n_features` no matter how many distinct n-grams the training data has.
+
+Artifacts are written as models/sentiment-<features>-<UTC timestamp>.joblib
+with a .json sidecar (version, labels, accuracy, library versions). The
+newest one is used unless SENTIMENT_MODEL points at a specific file.
+"""
+import argparse, csv, glob, json, os, threading, time
+
+MODEL_DIR = os.getenv("SENTIMENT_MODEL_DIR", "models")
+LABELS = ("negative", "neutral", "positive")
+HASH_FEATURES = 2 ** 20
+
+def build_pipeline(features="tfidf", n_features=HASH_FEATURES):
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    if features == "tfidf":
+        steps = [("tfidf", TfidfVectorizer(ngram_range=(1, 2), stop_words="english"))]
+    elif features == "hashing":
+        steps = [("hash", HashingVectorizer(ngram_range=(1, 2), stop_words="english",
+                                            n_features=n_features, alternate_sign=False, norm=None)),
+                 ("tfidf", TfidfTransformer())]
+    else:
+        raise ValueError(f"unknown feature mode: {features}")
+    return Pipeline(steps + [("clf", LogisticRegression(max_iter=1000))])
+
+def read_labeled(csv_path, text_col="reviewText", label_col="sentiment"):
+    texts, labels = [], []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = row.get(text_col) or row.get("review_text") or ""
+            label = (row.get(label_col) or "").strip().lower()
+            if text.strip() and label in LABELS:
+                texts.append(text)
+                labels.append(label)
+    return texts, labels
+
+def train(texts, labels, features="tfidf", out_dir=MODEL_DIR, test_size=0.2):
+    """Fit, score on a stratified hold-out, save; returns the artifact path."""
+    import joblib, sklearn
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+
+    x_train, x_test, y_train, y_test = train_test_split(
+        texts, labels, stratify=labels, test_size=test_size, random_state=42)
+    model = build_pipeline(features)
+    t0 = time.perf_counter()
+    model.fit(x_train, y_train)
+    fit_s = time.perf_counter() - t0
+    accuracy = accuracy_score(y_test, model.predict(x_test))
+
+    os.makedirs(out_dir, exist_ok=True)
+    version = f"sentiment-{features}-{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}"
+    path = os.path.join(out_dir, version + ".joblib")
+    joblib.dump(model, path)
+    meta = {"version": version, "features": features, "labels": list(model.classes_),
+            "accuracy": round(accuracy, 4), "train_rows": len(x_train), "fit_seconds": round(fit_s, 2),
+            "sklearn": sklearn.__version__}
+    with open(path[:-len(".joblib")] + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"saved {path} (accuracy {accuracy:.4f} on {len(x_test)} held-out rows)")
+    return path
+
+def latest_artifact(model_dir=MODEL_DIR):
+    paths = sorted(glob.glob(os.path.join(model_dir, "sentiment-*.joblib")), key=os.path.getmtime)
+    return paths[-1] if paths else None
+
+class SentimentModel:
+    def __init__(self, path):
+        import joblib
+        self.path = path
+        self.pipeline = joblib.load(path)
+        self.version = os.path.basename(path)[:-len(".joblib")]
+
+    def predict(self, texts):
+        """Labels for a whole batch in one vectorized transform + predict."""
+        if not texts:
+            return []
+        return self.pipeline.predict([t or "" for t in texts]).tolist()
+
+    def predict_proba(self, texts):
+        if not texts:
+            return []
+        classes = list(self.pipeline.classes_)
+        return [dict(zip(classes, map(float, p))) for p in self.pipeline.predict_proba([t or "" for t in texts])]
+
+_model = None
+_lock = threading.Lock()
+
+def get_model(path=None):
+    """Load the model on first use (or the explicit path) and keep it for the process."""
+    global _model
+    if _model is None or (path and _model.path != path):
+        with _lock:
+            if _model is None or (path and _model.path != path):
+                path = path or os.getenv("SENTIMENT_MODEL") or latest_artifact()
+                if not path:
+                    raise FileNotFoundError(f"no sentiment model in {MODEL_DIR}/; run: python sentiment_model.py train <csv>")
+                _model = SentimentModel(path)
+    return _model
+
+def classify(texts):
+    """Batch entry point for the ingest worker / enrichment: list of texts -> list of labels."""
+    return get_model().predict(list(texts))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Train or run the sentiment model.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train")
+    t.add_argument("csv")
+    t.add_argument("--features", choices=("tfidf", "hashing"), default="tfidf")
+    t.add_argument("--text-col", default="reviewText")
+    t.add_argument("--label-col", default="sentiment")
+    t.add_argument("--out-dir", default=MODEL_DIR)
+    p = sub.add_parser("predict")
+    p.add_argument("texts", nargs="+")
+    a = ap.parse_args()
+
+    if a.cmd == "train":
+        texts, labels = read_labeled(a.csv, a.text_col, a.label_col)
+        train(texts, labels, a.features, a.out_dir)
+    else:
+        m = get_model()
+        for text, label in zip(a.texts, m.predict(a.texts)):
+            print(f"{label:8s} {text}")
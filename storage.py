@@ -0,0 +1,301 @@
+# storage.py
+"""One write interface for the review store, backed by SQLite or Postgres.
+
+    store = open_storage("reviews.db")                           # SQLite file
+    store = open_storage("postgresql://user:pw@host/reviews")    # Postgres
+    python storage.py init postgresql://user:pw@host/reviews     # apply pg_schema.sql
+
+The writers (ingest_worker.BatchWriter, backfill_from_csv, alert_worker's
+periodic rule) only call the methods below, so each of them takes either a
+SQLite path or a postgres:// URL as --db. Review rows are parameter tuples
+in INSERT column order, as built by ingest_worker.review_params.
+
+On Postgres every batch is a single COPY FROM STDIN. `reviews` is
+range-partitioned by month on ts_utc, and the month partitions a batch needs are
+created before it lands. The neg>=5_in_10m rule is one set-based
+INSERT ... SELECT over the sentiment_minute rollup. Postgres allows any number
+of concurrent writers; SQLite serializes them on its write lock.
+"""
+import argparse, io, os, sqlite3, time
+from datetime import datetime, timezone
+
+import init_db
+import metrics
+
+DB = init_db.DB
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+PG_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pg_schema.sql")
+
+# the ts_utc indexes nothing on the hot path reads; the epoch indexes serve the
+# API and dashboard and stay in place while a backfill runs
+BULK_DROP_INDEXES = ("idx_reviews_product_ts", "idx_reviews_sentiment_ts")
+
+REVIEW_COLUMNS = ("review_id", "product_id", "review_text", "sentiment", "keywords", "entities", "ts_utc", "ts_epoch")
+
+INSERT = f"""
+INSERT INTO reviews ({", ".join(REVIEW_COLUMNS)})
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+PROGRESS_UPSERT = """
+INSERT INTO backfill_progress (source, rows_done, base_ts_utc, updated_at_utc)
+VALUES (?, ?, ?, ?)
+ON CONFLICT(source) DO UPDATE SET rows_done = excluded.rows_done,
+                                  updated_at_utc = excluded.updated_at_utc
+"""
+
+# periodic negative-burst rule: count, cooldown and insert in one statement
+SQLITE_RAISE_ALERTS = """
+INSERT OR IGNORE INTO alerts (product_id, rule, window_start_utc, window_end_utc, count, created_at_utc)
+SELECT w.product_id, :rule, :window_start, :window_end, w.c, :window_end
+FROM (
+  SELECT product_id, COUNT(*) AS c
+  FROM reviews
+  WHERE sentiment = 'negative' AND ts_epoch BETWEEN :start AND :end
+  GROUP BY product_id
+) AS w
+WHERE w.c >= :threshold
+  AND NOT EXISTS (SELECT 1 FROM alerts
+                  WHERE alerts.product_id = w.product_id AND alerts.rule = :rule
+                    AND alerts.created_at_utc >= :cooldown)
+RETURNING product_id, count;
+"""
+
+# ts_epoch is SQLite-only; Postgres keeps the instant in ts_utc (timestamptz)
+PG_COPY_REVIEWS = f"COPY reviews ({', '.join(REVIEW_COLUMNS[:-1])}) FROM STDIN"
+
+PG_INSERT = f"""
+INSERT INTO reviews ({", ".join(REVIEW_COLUMNS[:-1])})
+VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+PG_PROGRESS_UPSERT = PROGRESS_UPSERT.replace("?", "%s")
+
+# minute resolution: the rollup row holding the window start counts as inside
+PG_RAISE_ALERTS = """
+INSERT INTO alerts (product_id, rule, window_start_utc, window_end_utc, count, created_at_utc)
+SELECT w.product_id, %(rule)s, to_timestamp(%(start)s), to_timestamp(%(end)s), w.c, to_timestamp(%(end)s)
+FROM (
+  SELECT product_id, sum(negative)::int AS c
+  FROM sentiment_minute
+  WHERE bucket >= date_trunc('minute', to_timestamp(%(start)s)) AND bucket <= to_timestamp(%(end)s)
+  GROUP BY product_id
+) AS w
+WHERE w.c >= %(threshold)s
+  AND NOT EXISTS (SELECT 1 FROM alerts
+                  WHERE alerts.product_id = w.product_id AND alerts.rule = %(rule)s
+                    AND alerts.created_at_utc >= to_timestamp(%(cooldown)s))
+ON CONFLICT (product_id, rule, window_end_utc) DO NOTHING
+RETURNING product_id, count;
+"""
+
+def iso(epoch):
+    return time.strftime(ISO, time.gmtime(epoch))
+
+class SQLiteStorage:
+    backend = "sqlite"
+
+    def __init__(self, db=DB):
+        self.db = db
+        self.conn = sqlite3.connect(db, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA busy_timeout=30000;")
+
+    def init(self):
+        init_db.init(self.conn)
+
+    def insert_reviews(self, rows, progress=None):
+        """Insert review tuples (and optionally a backfill checkpoint) in one transaction."""
+        with self.conn:
+            self.conn.executemany(INSERT, rows)
+            if progress:
+                self.conn.execute(PROGRESS_UPSERT, (*progress, iso(time.time())))
+        return len(rows)
+
+    def insert_reviews_each(self, rows):
+        """Row-by-row fallback: skips (and reports) the rows that fail, keeps the rest.
+
+        Returns one bool per row, True where the row went in.
+        """
+        written = []
+        with self.conn:
+            for r in rows:
+                try:
+                    self.conn.execute(INSERT, r)
+                    written.append(True)
+                except sqlite3.Error as e:
+                    print("insert error:", r[0], e)
+                    written.append(False)
+        return written
+
+    def load_progress(self, source):
+        self.conn.execute(init_db.BACKFILL_PROGRESS)
+        return self.conn.execute("SELECT rows_done, base_ts_utc FROM backfill_progress WHERE source = ?",
+                                 (source,)).fetchone()
+
+    def clear_progress(self, source):
+        self.conn.execute(init_db.BACKFILL_PROGRESS)
+        with self.conn:
+            self.conn.execute("DELETE FROM backfill_progress WHERE source = ?", (source,))
+
+    def bulk_begin(self):
+        """Load-time settings: no fsync, big cache, the ts_utc indexes dropped."""
+        self.conn.execute("PRAGMA synchronous=OFF;")
+        self.conn.execute("PRAGMA cache_size=-262144;")     # 256 MiB page cache
+        self.conn.execute("PRAGMA temp_store=MEMORY;")
+        self.conn.execute("PRAGMA wal_autocheckpoint=0;")   # one checkpoint at the end instead of many
+        for name in BULK_DROP_INDEXES:
+            self.conn.execute(f"DROP INDEX IF EXISTS {name};")
+
+    def bulk_end(self, rebuild=True):
+        """Rebuild the indexes dropped by bulk_begin (unless interrupted) and restore settings."""
+        if rebuild:
+            for name in BULK_DROP_INDEXES:
+                self.conn.execute(init_db.INDEXES[name])
+            self.conn.execute("ANALYZE;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute("PRAGMA wal_autocheckpoint=1000;")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+    def raise_alerts(self, rule, threshold, start, end, cooldown_start):
+        """Insert `rule` alerts for products with >= threshold negatives in [start, end]; returns them."""
+        with self.conn:
+            return metrics.fetchall(self.conn, "alert raise", SQLITE_RAISE_ALERTS, {
+                "rule": rule, "threshold": threshold, "start": start, "end": end,
+                "window_start": iso(start), "window_end": iso(end), "cooldown": iso(cooldown_start),
+            })
+
+    def close(self):
+        self.conn.close()
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\x00": ""})
+
+def _copy_field(v):
+    # COPY text format; Postgres text can't hold NUL, so it is dropped
+    return "\\N" if v is None else str(v).translate(_COPY_ESCAPES)
+
+def _month(epoch):
+    d = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    return d.year * 12 + d.month - 1
+
+class PostgresStorage:
+    backend = "postgres"
+
+    def __init__(self, dsn):
+        import psycopg2
+        self.dsn = dsn
+        self.conn = psycopg2.connect(dsn)
+        self._months = set()       # month partitions known to exist (year * 12 + month - 1)
+
+    def init(self, schema=PG_SCHEMA):
+        with open(schema) as f, self.conn, self.conn.cursor() as cur:
+            cur.execute(f.read())
+
+    def _ensure_partitions(self, rows):
+        # ts_epoch is the last tuple field; review_params always fills it
+        epochs = [r[-1] for r in rows if r[-1] is not None]
+        if not epochs:
+            return
+        lo, hi = min(epochs), max(epochs)
+        if set(range(_month(lo), _month(hi) + 1)) <= self._months:
+            return
+        # own short transaction: the advisory lock inside isn't held for the COPY
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SELECT ensure_review_partitions(to_timestamp(%s), to_timestamp(%s))", (lo, hi))
+        self._months.update(range(_month(lo), _month(hi) + 1))
+
+    def insert_reviews(self, rows, progress=None):
+        """COPY review tuples (and optionally a backfill checkpoint) in one transaction."""
+        self._ensure_partitions(rows)
+        buf = io.StringIO()
+        for r in rows:
+            buf.write("\t".join(map(_copy_field, r[:-1])))
+            buf.write("\n")
+        buf.seek(0)
+        with self.conn, self.conn.cursor() as cur:
+            cur.copy_expert(PG_COPY_REVIEWS, buf)
+            if progress:
+                cur.execute(PG_PROGRESS_UPSERT, (*progress, iso(time.time())))
+        return len(rows)
+
+    def insert_reviews_each(self, rows):
+        """Row-by-row fallback; a savepoint per row keeps one failure from aborting the batch."""
+        self._ensure_partitions(rows)
+        written = []
+        with self.conn, self.conn.cursor() as cur:
+            for r in rows:
+                cur.execute("SAVEPOINT one_row")
+                try:
+                    cur.execute(PG_INSERT, tuple(v.replace("\x00", "") if isinstance(v, str) else v
+                                                 for v in r[:-1]))
+                    cur.execute("RELEASE SAVEPOINT one_row")
+                    written.append(True)
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT one_row")
+                    print("insert error:", r[0], e)
+                    written.append(False)
+        return written
+
+    def load_progress(self, source):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SELECT rows_done, base_ts_utc FROM backfill_progress WHERE source = %s", (source,))
+            return cur.fetchone()
+
+    def clear_progress(self, source):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("DELETE FROM backfill_progress WHERE source = %s", (source,))
+
+    def bulk_begin(self):
+        # a crash loses at most the last few commits, which the checkpoint replays
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = off")
+
+    def bulk_end(self, rebuild=True):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = on")
+        if rebuild:
+            self.conn.autocommit = True
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute("ANALYZE reviews")
+            finally:
+                self.conn.autocommit = False
+
+    def raise_alerts(self, rule, threshold, start, end, cooldown_start):
+        """Insert `rule` alerts for products with >= threshold negatives in [start, end]; returns them."""
+        params = {"rule": rule, "threshold": threshold, "start": start, "end": end, "cooldown": cooldown_start}
+        with self.conn, self.conn.cursor() as cur:
+            t0 = time.perf_counter()
+            cur.execute(PG_RAISE_ALERTS, params)
+            rows = cur.fetchall()
+            metrics.observe_query("alert raise", time.perf_counter() - t0, len(rows),
+                                  lambda: self._explain(cur, PG_RAISE_ALERTS, params))
+            return rows
+
+    @staticmethod
+    def _explain(cur, sql, params):
+        # plain EXPLAIN: the plan without running the insert a second time
+        cur.execute("EXPLAIN " + sql, params)
+        return [r[0] for r in cur.fetchall()]
+
+    def close(self):
+        self.conn.close()
+
+def is_postgres(target):
+    return str(target).startswith(("postgres://", "postgresql://"))
+
+def open_storage(target=DB):
+    """SQLite for a file path, Postgres for a postgres:// or postgresql:// URL."""
+    return PostgresStorage(target) if is_postgres(target) else SQLiteStorage(target)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Create the review schema on SQLite or Postgres.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    i = sub.add_parser("init", help="init_db for SQLite, pg_schema.sql for Postgres")
+    i.add_argument("db", nargs="?", default=DB)
+    a = ap.parse_args()
+
+    store = open_storage(a.db)
+    store.init()
+    store.close()
+    print(f"Initialized {store.backend} schema")